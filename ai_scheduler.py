@@ -0,0 +1,160 @@
+"""
+重型 AI 分析调度
+取代散落各处的固定隔帧规则 (main.py 的每 3 帧、HSEmotion 的 frame_counter % 5、分析器的 every_n_frames)：
+每帧按人、按阶段决定要不要跑
+- 新出现的人 (该阶段从未分析过) 立即分析
+- 新轨迹在前 young_frames 帧内按基础间隔分析，让年龄/情绪平滑尽快收敛
+- 与上次分析时相比移动明显的人按基础间隔分析
+- 静止的人只在结果过期 (基础间隔 × static_factor) 时重新分析
+- 分析阶段耗时超出帧预算时，所有间隔按超出比例拉长 (新来的人不受影响)
+决策通过 profiler 计数器输出: scheduler.<阶段>.<原因> / scheduler.skip_<阶段>
+"""
+
+from profiler import profiler
+
+# 各阶段的基础间隔 (帧)
+DEFAULT_INTERVALS = {
+    'face': 3,      # 年龄 (InsightFace)
+    'emotion': 10,  # 情绪 (HSEmotion)
+    'body': 10,     # 体型 / 服装 / 颜色
+}
+
+
+class AnalysisScheduler:
+    """按人、按阶段的分析调度器"""
+
+    def __init__(self, intervals=None, static_factor=4, motion_threshold=0.1, young_frames=30,
+                 frame_budget_ms=None, max_load_scale=4.0, smoothing=0.1):
+        """
+        Args:
+            intervals: {阶段: 基础间隔帧数}
+            static_factor: 静止的人间隔放大倍数
+            motion_threshold: bbox 中心位移 (或高度变化) 超过 bbox 高度的该比例视为移动
+            young_frames: 新轨迹按基础间隔分析的帧数
+            frame_budget_ms: 分析阶段每帧耗时预算 (None = 不按负载调整)
+            max_load_scale: 超预算时间隔最多放大的倍数
+            smoothing: 帧耗时指数平均系数
+        """
+        self.intervals = dict(DEFAULT_INTERVALS)
+        self.intervals.update(intervals or {})
+        self.static_factor = static_factor
+        self.motion_threshold = motion_threshold
+        self.young_frames = young_frames
+        self.frame_budget_ms = frame_budget_ms
+        self.max_load_scale = max_load_scale
+        self.smoothing = smoothing
+
+        self.frame = 0
+        self.load_scale = 1.0
+        self._avg_frame_time = None
+        self._first_seen = {}   # key -> 第一次出现的帧号
+        self._last_run = {}     # (阶段, key) -> (帧号, cx, cy, h)
+
+    def configure(self, intervals=None, static_factor=None, motion_threshold=None, young_frames=None,
+                  frame_budget_ms=None, max_load_scale=None, smoothing=None):
+        """运行时调整参数 (None 表示不变；frame_budget_ms=0 关闭负载调整)"""
+        if intervals:
+            self.intervals.update(intervals)
+        if static_factor is not None:
+            self.static_factor = static_factor
+        if motion_threshold is not None:
+            self.motion_threshold = motion_threshold
+        if young_frames is not None:
+            self.young_frames = young_frames
+        if frame_budget_ms is not None:
+            self.frame_budget_ms = frame_budget_ms
+        if max_load_scale is not None:
+            self.max_load_scale = max_load_scale
+        if smoothing is not None:
+            self.smoothing = smoothing
+        return self
+
+    # ------------------------------------------------------------
+    # 帧边界
+    # ------------------------------------------------------------
+    def begin_frame(self):
+        self.frame += 1
+
+    def end_frame(self, elapsed):
+        """记录本帧分析耗时 (秒)，更新负载系数"""
+        if self._avg_frame_time is None:
+            self._avg_frame_time = elapsed
+        else:
+            self._avg_frame_time += self.smoothing * (elapsed - self._avg_frame_time)
+        if self.frame_budget_ms:
+            ratio = self._avg_frame_time * 1000.0 / self.frame_budget_ms
+            self.load_scale = max(1.0, min(self.max_load_scale, ratio))
+        else:
+            self.load_scale = 1.0
+
+    # ------------------------------------------------------------
+    # 决策
+    # ------------------------------------------------------------
+    def should_run(self, stage, key, bbox=None):
+        """
+        本帧是否对该人运行该阶段；返回 True 时视为本帧已运行 (记录时间和位置)
+        key: 人物的稳定标识 (track_id)；bbox: (x1, y1, x2, y2)，用于判断是否移动
+        """
+        first = self._first_seen.setdefault(key, self.frame)
+        last = self._last_run.get((stage, key))
+        reason = None
+        if last is None:
+            reason = 'new'
+        else:
+            elapsed = self.frame - last[0]
+            interval = self.intervals.get(stage, 1) * self.load_scale
+            if elapsed >= interval * self.static_factor:
+                reason = 'stale'
+            elif elapsed >= interval:
+                if self.frame - first < self.young_frames:
+                    reason = 'young'
+                elif self._moved(last, bbox):
+                    reason = 'motion'
+
+        if reason is None:
+            profiler.incr(f'scheduler.skip_{stage}')
+            return False
+        profiler.incr(f'scheduler.{stage}.{reason}')
+        self._last_run[(stage, key)] = (self.frame,) + self._geometry(bbox)
+        return True
+
+    @staticmethod
+    def _geometry(bbox):
+        if not bbox:
+            return (0.0, 0.0, 0.0)
+        x1, y1, x2, y2 = bbox[:4]
+        return ((x1 + x2) / 2.0, (y1 + y2) / 2.0, float(y2 - y1))
+
+    def _moved(self, last, bbox):
+        if not bbox:
+            return False
+        cx, cy, h = self._geometry(bbox)
+        _, lx, ly, lh = last
+        scale = max(1.0, lh, h)
+        shift = max(abs(cx - lx), abs(cy - ly), abs(h - lh))
+        return shift > self.motion_threshold * scale
+
+    # ------------------------------------------------------------
+    # 清理 / 统计
+    # ------------------------------------------------------------
+    def forget(self, keys):
+        """删除已消失人物的调度状态"""
+        keys = set(keys)
+        for key in keys:
+            self._first_seen.pop(key, None)
+        self._last_run = {k: v for k, v in self._last_run.items() if k[1] not in keys}
+
+    def reset(self):
+        self.frame = 0
+        self.load_scale = 1.0
+        self._avg_frame_time = None
+        self._first_seen.clear()
+        self._last_run.clear()
+
+    def stats(self):
+        return {
+            'frame': self.frame,
+            'load_scale': self.load_scale,
+            'avg_frame_ms': (self._avg_frame_time or 0.0) * 1000.0,
+            'tracked': len(self._first_seen),
+        }
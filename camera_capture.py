@@ -0,0 +1,197 @@
+"""
+摄像头后台采集
+- 独立线程持续抓帧 (grab/retrieve)，镜像翻转后写入预分配的环形缓冲区，并记录时间戳和序号
+- 主循环始终取最新一帧；来不及取走就被新帧覆盖的帧计入丢帧统计
+- 把 30 FPS 的 MJPG 采集和 10-15 FPS 的分析循环解耦，避免读到 USB 缓冲里的旧帧
+"""
+
+import threading
+import time
+
+import cv2
+import numpy as np
+
+
+class ThreadedCamera:
+    """后台线程采集 + 最新帧环形缓冲"""
+
+    def __init__(self, camera_id=0, width=1920, height=1080, flip=True,
+                 ring_size=3, use_mjpg=True, buffer_size=1):
+        """
+        Args:
+            camera_id: 摄像头设备ID
+            width, height: 请求的分辨率（摄像头不支持时会回退）
+            flip: 是否水平镜像（与原来主循环里的 cv2.flip(frame, 1) 一致）
+            ring_size: 环形缓冲槽位数，至少 3 (写入中 / 最新 / 主线程使用中)
+            use_mjpg: 强制 MJPG 格式以解锁 1080p 高帧率
+            buffer_size: 驱动层缓冲帧数
+        """
+        self.flip = flip
+        self.cap = cv2.VideoCapture(camera_id)
+
+        if use_mjpg:
+            # 许多 USB 摄像头在 1080p 下默认 YUY2，受 USB 带宽限制只有 5 FPS，MJPG 可以到 30 FPS
+            self.cap.set(cv2.CAP_PROP_FOURCC, cv2.VideoWriter_fourcc('M', 'J', 'P', 'G'))
+        self.cap.set(cv2.CAP_PROP_FRAME_WIDTH, width)
+        self.cap.set(cv2.CAP_PROP_FRAME_HEIGHT, height)
+        self.cap.set(cv2.CAP_PROP_BUFFERSIZE, buffer_size)
+
+        # 实际分辨率（有些摄像头不支持会回退），第一帧到达时还会再校正一次
+        self.width = int(self.cap.get(cv2.CAP_PROP_FRAME_WIDTH)) or width
+        self.height = int(self.cap.get(cv2.CAP_PROP_FRAME_HEIGHT)) or height
+
+        # 预分配环形缓冲
+        self.ring_size = max(3, int(ring_size))
+        self._buffers = [np.zeros((self.height, self.width, 3), dtype=np.uint8)
+                         for _ in range(self.ring_size)]
+        self._timestamps = [0.0] * self.ring_size
+        self._seqs = [-1] * self.ring_size
+
+        self._lock = threading.Lock()
+        self._new_frame = threading.Condition(self._lock)
+        self._write_idx = 0
+        self._latest = -1           # 最新完整帧所在槽位
+        self._reading = -1          # 主线程正在使用的槽位（写线程不会覆盖）
+        self._latest_consumed = True
+
+        # 统计
+        self.frames_captured = 0
+        self.frames_read = 0
+        self.frames_dropped = 0     # 写入后从未被取走就被新帧覆盖
+        self.read_failures = 0
+        self.capture_fps = 0.0
+        self.last_read_latency = 0.0  # 上一次 read() 时该帧已经“老”了多久 (秒)
+        self._seq = 0
+        self._fps_window_start = time.time()
+        self._fps_window_count = 0
+
+        self.running = False
+        self._thread = None
+
+    def isOpened(self):
+        return self.cap.isOpened()
+
+    def get(self, prop_id):
+        return self.cap.get(prop_id)
+
+    def start(self):
+        """启动采集线程"""
+        if self.running:
+            return self
+        self.running = True
+        self._thread = threading.Thread(target=self._capture_loop, daemon=True)
+        self._thread.start()
+        return self
+
+    def _next_write_slot(self):
+        """选择一个既不是最新帧、也不是主线程正在用的槽位（需持有锁）"""
+        for i in range(1, self.ring_size + 1):
+            slot = (self._write_idx + i) % self.ring_size
+            if slot != self._latest and slot != self._reading:
+                return slot
+        return self._write_idx
+
+    def _capture_loop(self):
+        """后台采集线程"""
+        consecutive_failures = 0
+        while self.running:
+            if not self.cap.grab():
+                consecutive_failures += 1
+                self.read_failures += 1
+                # 连续失败太多次，视为摄像头断开，通知主线程退出
+                if consecutive_failures > 50:
+                    print("✗ 摄像头连续读取失败，采集线程退出")
+                    with self._new_frame:
+                        self.running = False
+                        self._new_frame.notify_all()
+                    break
+                time.sleep(0.01)
+                continue
+
+            timestamp = time.time()
+            ret, raw = self.cap.retrieve()
+            if not ret or raw is None:
+                self.read_failures += 1
+                continue
+            consecutive_failures = 0
+
+            with self._lock:
+                # 摄像头回退到其他分辨率时，重新分配缓冲区（主线程持有的旧数组不受影响）
+                if raw.shape[:2] != (self.height, self.width):
+                    self.height, self.width = raw.shape[:2]
+                    self._buffers = [np.zeros((self.height, self.width, 3), dtype=np.uint8)
+                                     for _ in range(self.ring_size)]
+                    self._latest = -1
+                    self._latest_consumed = True
+                slot = self._next_write_slot()
+                buf = self._buffers[slot]
+
+            # 直接写入预分配缓冲，不产生新的帧数组
+            if self.flip:
+                cv2.flip(raw, 1, dst=buf)
+            else:
+                np.copyto(buf, raw)
+
+            with self._new_frame:
+                if not self._latest_consumed:
+                    self.frames_dropped += 1
+                self._write_idx = slot
+                self._timestamps[slot] = timestamp
+                self._seqs[slot] = self._seq
+                self._seq += 1
+                self._latest = slot
+                self._latest_consumed = False
+                self.frames_captured += 1
+                self._new_frame.notify_all()
+
+            # 采集帧率
+            self._fps_window_count += 1
+            elapsed = timestamp - self._fps_window_start
+            if elapsed > 1.0:
+                self.capture_fps = self._fps_window_count / elapsed
+                self._fps_window_count = 0
+                self._fps_window_start = timestamp
+
+    def read(self, timeout=1.0):
+        """
+        取最新一帧（如果还没有新帧，最多等待 timeout 秒）
+        返回: (ret, frame, timestamp, seq)
+        注意: frame 是环形缓冲里的数组，在下一次 read() 之前有效，需要修改时请自行 copy
+        """
+        deadline = time.time() + timeout
+        with self._new_frame:
+            while self._latest_consumed:
+                if not self.running:
+                    return False, None, 0.0, -1
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    return False, None, 0.0, -1
+                self._new_frame.wait(remaining)
+
+            slot = self._latest
+            self._reading = slot
+            self._latest_consumed = True
+            self.frames_read += 1
+            timestamp = self._timestamps[slot]
+            self.last_read_latency = time.time() - timestamp
+            return True, self._buffers[slot], timestamp, self._seqs[slot]
+
+    def get_stats(self):
+        """采集统计（供调试/叠加显示）"""
+        return {
+            'captured': self.frames_captured,
+            'read': self.frames_read,
+            'dropped': self.frames_dropped,
+            'failures': self.read_failures,
+            'capture_fps': self.capture_fps,
+            'latency_ms': self.last_read_latency * 1000.0,
+        }
+
+    def release(self):
+        """停止采集线程并释放摄像头"""
+        with self._new_frame:
+            self.running = False
+            self._new_frame.notify_all()
+        if self._thread is not None and self._thread.is_alive():
+            self._thread.join(timeout=1.0)
+        self.cap.release()
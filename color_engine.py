@@ -0,0 +1,216 @@
+"""
+服装主色提取
+- 'mean'      : 掩码内像素均值 + 离散度 (等价于原来的 KMeans(n_clusters=1)，但不需要 sklearn 的拟合开销)
+- 'histogram' : 直方图量化的多簇模式，条纹/拼色衣服取占比最大的颜色簇
+- 'kmeans'    : 原 sklearn KMeans 路径 (保留用于对比测试)
+
+一帧内所有人的上/下半身 ROI 可以通过 dominant_colors_batch 一次向量化计算
+"""
+
+import cv2
+import numpy as np
+
+# sklearn 只在 'kmeans' 对比模式下需要
+try:
+    from sklearn.cluster import KMeans
+    SKLEARN_AVAILABLE = True
+except ImportError:
+    SKLEARN_AVAILABLE = False
+
+COLOR_MODES = ('mean', 'histogram', 'kmeans')
+
+# 与原 get_color 保持一致的预处理参数
+TARGET_SIZE = (64, 64)
+MIN_MASK_PIXELS = 50
+
+
+def classify_hsv(h_val, s_val, v_val):
+    """
+    HSV 颜色分类规则 (12 种标签)
+    OpenCV HSV ranges: H: 0-179, S: 0-255, V: 0-255
+    """
+    # 1. Achromatic Colors (Black, White, Gray)
+    # Black: Very low value (dark)
+    if v_val < 40:
+        return 'Black'
+
+    # White: Very low saturation AND high value (bright)
+    if s_val < 30 and v_val > 200:
+        return 'White'
+
+    # Gray: Low saturation, medium value
+    if s_val < 40:
+        return 'Gray'
+
+    # 2. Chromatic Colors (based on Hue)
+    # H values are halved degrees (0-360 -> 0-179)
+    if (0 <= h_val <= 10) or (160 <= h_val <= 179):
+        return 'Red'
+    elif 11 <= h_val <= 25:
+        return 'Orange'
+    elif 26 <= h_val <= 35:
+        return 'Yellow'
+    elif 36 <= h_val <= 85:
+        return 'Green'
+    elif 86 <= h_val <= 99:
+        return 'Cyan'
+    elif 100 <= h_val <= 130:
+        return 'Blue'
+    elif 131 <= h_val <= 150:
+        return 'Purple'
+    elif 151 <= h_val <= 159:
+        return 'Pink'
+
+    return 'Mixed'
+
+
+def spread_to_confidence(avg_dist):
+    """
+    根据颜色离散度 (像素到中心的平均平方距离) 计算置信度
+    Heuristic: avg_dist < 500 is very pure, > 3000 is mixed
+    """
+    return max(0.0, min(1.0, 1.0 - (avg_dist / 4000.0)))
+
+
+def label_colors(centers_bgr):
+    """把一组 BGR 中心色 (K, 3) 一次性转换到 HSV 并分类"""
+    centers = np.asarray(centers_bgr).astype(int)
+    pixel_bgr = np.clip(centers, 0, 255).astype(np.uint8).reshape(1, -1, 3)
+    pixel_hsv = cv2.cvtColor(pixel_bgr, cv2.COLOR_BGR2HSV)[0]
+    return [classify_hsv(int(h), int(s), int(v)) for h, s, v in pixel_hsv]
+
+
+def _resize_with_weights(image_region, mask):
+    """
+    缩放到 64x64 并生成像素权重 (与原 get_color 的掩码/回退规则一致)
+    返回 (img_small, weights)，weights 为 bool 数组；区域为空时返回 (None, None)
+    """
+    if image_region is None or image_region.size == 0:
+        return None, None
+
+    img_small = cv2.resize(image_region, TARGET_SIZE)
+    if mask is None:
+        return img_small, np.ones(img_small.shape[:2], dtype=bool)
+
+    mask_small = cv2.resize(mask, TARGET_SIZE)
+    weights = mask_small > 128
+    if np.count_nonzero(weights) < MIN_MASK_PIXELS:
+        # Fallback: use center crop if mask failed
+        h, w = img_small.shape[:2]
+        weights = np.zeros((h, w), dtype=bool)
+        weights[h // 4:h * 3 // 4, w // 4:w * 3 // 4] = True
+    return img_small, weights
+
+
+def extract_pixels(image_region, mask=None):
+    """返回参与统计的 BGR 像素 (N, 3)，区域为空时返回 None"""
+    img_small, weights = _resize_with_weights(image_region, mask)
+    if img_small is None:
+        return None
+    return img_small[weights]
+
+
+def dominant_colors_batch(regions):
+    """
+    一帧内所有 ROI 的主色，一次向量化计算
+    regions: [(image_region, mask), ...]
+    返回: [(label, confidence), ...]，无效区域为 (None, 0.0)
+    """
+    outputs = [(None, 0.0)] * len(regions)
+    valid = []
+    imgs = []
+    weights = []
+    for i, (image_region, mask) in enumerate(regions):
+        img_small, w = _resize_with_weights(image_region, mask)
+        if img_small is None:
+            continue
+        valid.append(i)
+        imgs.append(img_small)
+        weights.append(w)
+    if not valid:
+        return outputs
+
+    # (K, P, 3) 像素和 (K, P) 权重
+    pixels = np.stack(imgs).reshape(len(valid), -1, 3).astype(np.float64)
+    w = np.stack(weights).reshape(len(valid), -1).astype(np.float64)
+    counts = w.sum(axis=1)
+
+    # 单簇 KMeans 的中心就是均值，inertia / N 就是平均平方距离 E[|x|^2] - |mean|^2
+    means = np.einsum('kpc,kp->kc', pixels, w) / counts[:, None]
+    mean_sq = np.einsum('kpc,kp->k', pixels * pixels, w) / counts
+    avg_dist = np.maximum(mean_sq - (means * means).sum(axis=1), 0.0)
+
+    labels = label_colors(means)
+    for j, i in enumerate(valid):
+        outputs[i] = (labels[j], spread_to_confidence(avg_dist[j]))
+    return outputs
+
+
+def dominant_color_mean(pixels):
+    """单簇主色：均值 + 平均平方距离"""
+    pixels = pixels.astype(np.float64)
+    center = pixels.mean(axis=0)
+    avg_dist = float(((pixels - center) ** 2).sum(axis=1).mean())
+    return center, avg_dist
+
+
+def dominant_color_histogram(pixels, n_clusters=3, bits=3):
+    """
+    直方图量化的多簇主色
+    每通道量化到 bits 位，取像素最多的 n_clusters 个格子作为初始中心，
+    做一轮最近中心分配后返回最大簇的中心和簇内平均平方距离
+    """
+    pixels = np.asarray(pixels, dtype=np.uint8).reshape(-1, 3)
+    shift = 8 - bits
+    q = (pixels >> shift).astype(np.int32)
+    codes = (q[:, 0] << (2 * bits)) | (q[:, 1] << bits) | q[:, 2]
+    hist = np.bincount(codes, minlength=1 << (3 * bits))
+
+    top = np.argsort(hist)[::-1][:n_clusters]
+    top = top[hist[top] > 0]
+
+    pixels_f = pixels.astype(np.float32)
+    # 每个候选格子内像素的均值作为初始中心
+    sums = np.stack([np.bincount(codes, weights=pixels_f[:, c], minlength=hist.size)
+                     for c in range(3)], axis=1)
+    centers = (sums[top] / hist[top][:, None]).astype(np.float32)
+
+    # 一轮最近中心分配 (相当于一次 Lloyd 迭代)
+    dist = ((pixels_f[:, None, :] - centers[None, :, :]) ** 2).sum(axis=2)
+    assign = dist.argmin(axis=1)
+    sizes = np.bincount(assign, minlength=len(centers))
+    best = int(sizes.argmax())
+
+    members = pixels_f[assign == best].astype(np.float64)
+    center = members.mean(axis=0)
+    avg_dist = float(((members - center) ** 2).sum(axis=1).mean())
+    return center, avg_dist
+
+
+def dominant_color_kmeans(pixels):
+    """原 sklearn 路径 (对比基准)"""
+    # n_init='auto' is default in newer sklearn, using fixed number for compatibility
+    kmeans = KMeans(n_clusters=1, random_state=42, n_init=3)
+    kmeans.fit(pixels)
+    center = kmeans.cluster_centers_[0]
+    avg_dist = kmeans.inertia_ / len(pixels) if len(pixels) > 0 else 0
+    return center, avg_dist
+
+
+def dominant_color(image_region, mask=None, mode='mean', n_clusters=3):
+    """
+    单个 ROI 的主色
+    返回: (label, confidence)
+    """
+    pixels = extract_pixels(image_region, mask)
+    if pixels is None or len(pixels) == 0:
+        return None, 0.0
+
+    if mode == 'kmeans' and SKLEARN_AVAILABLE:
+        center, avg_dist = dominant_color_kmeans(pixels)
+    elif mode == 'histogram':
+        center, avg_dist = dominant_color_histogram(pixels, n_clusters=n_clusters)
+    else:
+        center, avg_dist = dominant_color_mean(pixels)
+
+    return label_colors([center])[0], spread_to_confidence(avg_dist)
@@ -0,0 +1,178 @@
+"""
+组合视图画布
+- 预分配几张整窗画布轮流使用 (流水线模式下渲染线程画下一帧时，显示线程还在用上一帧)
+- 每个格子 (quadrant) 直接渲染到画布视图上：cv2.resize(dst=视图)，不再产生临时图像
+- 分隔线等静态元素只绘制一次，存成细条模板，每帧贴回 (格子内容会覆盖分隔线所在的像素)
+- 每张画布记录各格子上次绘制的 key，key 不变的格子直接跳过
+- TextSpriteCache: 文字只 putText 一次，之后按掩码贴图
+"""
+
+import threading
+from collections import deque
+
+import cv2
+import numpy as np
+
+
+class QuadrantCompositor:
+    """固定布局的组合画布"""
+
+    def __init__(self, width, height, quadrants, dividers=(), line_color=(80, 80, 80),
+                 thickness=2, buffers=4):
+        """
+        Args:
+            width, height: 画布尺寸
+            quadrants: {名称: (x1, y1, x2, y2)}
+            dividers: [((x1, y1), (x2, y2)), ...] 分隔线
+            buffers: 轮流使用的画布数量 (>= 4：正在显示 / 等待显示 / 上一帧 / 正在绘制)
+        """
+        self.width = width
+        self.height = height
+        self.quadrants = dict(quadrants)
+        self.canvases = [np.zeros((height, width, 3), dtype=np.uint8) for _ in range(buffers)]
+        self._keys = [{} for _ in range(buffers)]   # 每张画布: 格子名 -> 上次绘制的 key
+
+        self._recent = deque(maxlen=2)   # 最近产出的画布 (可能还在流水线槽里等待显示)
+        self._held = None                # 正在显示的画布
+        self._lock = threading.Lock()
+        self._current = None
+
+        # 静态元素：在模板上画一次分隔线，记录每条线的外接矩形和像素掩码
+        template = np.zeros((height, width, 3), dtype=np.uint8)
+        self._chrome = []
+        for pt1, pt2 in dividers:
+            line_mask = np.zeros((height, width), dtype=np.uint8)
+            cv2.line(line_mask, pt1, pt2, 255, thickness)
+            cv2.line(template, pt1, pt2, line_color, thickness)
+            ys, xs = np.nonzero(line_mask)
+            if len(ys) == 0:
+                continue
+            y1, y2, x1, x2 = ys.min(), ys.max() + 1, xs.min(), xs.max() + 1
+            self._chrome.append(((slice(y1, y2), slice(x1, x2)),
+                                 template[y1:y2, x1:x2].copy(),
+                                 line_mask[y1:y2, x1:x2].astype(bool)[:, :, None]))
+
+    # ------------------------------------------------------------
+    # 画布轮换
+    # ------------------------------------------------------------
+    def begin(self):
+        """开始绘制新的一帧，返回本帧使用的画布"""
+        with self._lock:
+            busy = set(self._recent)
+            if self._held is not None:
+                busy.add(self._held)
+            index = next(i for i in range(len(self.canvases)) if i not in busy)
+        self._current = index
+        return self.canvases[index]
+
+    def finish(self):
+        """贴回静态元素，返回完成的画布"""
+        canvas = self.canvases[self._current]
+        for region, pixels, where in self._chrome:
+            np.copyto(canvas[region], pixels, where=where)
+        with self._lock:
+            self._recent.append(self._current)
+        return canvas
+
+    def hold(self, canvas):
+        """显示线程开始使用该画布 (在下一次 hold/release 之前不会被重绘)"""
+        with self._lock:
+            self._held = next((i for i, c in enumerate(self.canvases) if c is canvas), None)
+
+    def release(self):
+        with self._lock:
+            self._held = None
+
+    # ------------------------------------------------------------
+    # 格子绘制 (在 begin() 和 finish() 之间调用)
+    # ------------------------------------------------------------
+    def view(self, name):
+        """当前画布上某个格子的视图"""
+        x1, y1, x2, y2 = self.quadrants[name]
+        return self.canvases[self._current][y1:y2, x1:x2]
+
+    def unchanged(self, name, key):
+        """key 与该画布上次绘制时相同 (且不为 None) 时返回 True，否则记录新 key"""
+        keys = self._keys[self._current]
+        if key is not None and keys.get(name) == key:
+            return True
+        keys[name] = key
+        return False
+
+    def blit_resized(self, name, image, key=None):
+        """把 image 拉伸到格子大小直接写入画布 (image 为 None 时填黑)"""
+        if self.unchanged(name, key):
+            return
+        view = self.view(name)
+        if image is None:
+            view[:] = 0
+        elif image.shape[:2] == view.shape[:2]:
+            view[:] = image
+        else:
+            cv2.resize(image, (view.shape[1], view.shape[0]), dst=view, interpolation=cv2.INTER_LINEAR)
+
+    def draw(self, name, draw_fn, key=None):
+        """draw_fn(view) 直接在格子视图上绘制 (需要自己清空背景)"""
+        if self.unchanged(name, key):
+            return
+        draw_fn(self.view(name))
+
+
+class TextSpriteCache:
+    """
+    文字贴图缓存：同样的 (文字, 字号, 颜色, 线宽) 只 putText 一次，之后直接贴到目标图像上
+    用于黑色背景的面板：贴图以取最大值的方式合成，与直接 putText 逐像素一致 (文字互不重叠时)
+    """
+
+    def __init__(self, font=cv2.FONT_HERSHEY_SIMPLEX, max_entries=512):
+        self.font = font
+        self.max_entries = max_entries
+        self._sprites = {}
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, text, scale, color, thickness):
+        """返回 (贴图, 基线原点在贴图中的偏移 (ox, oy))，空白文字的贴图为 None"""
+        key = (text, scale, tuple(color), thickness)
+        sprite = self._sprites.get(key)
+        if sprite is not None:
+            self.hits += 1
+            return sprite
+        self.misses += 1
+
+        (w, h), baseline = cv2.getTextSize(text, self.font, scale, thickness)
+        pad = thickness + 2
+        ox, oy = pad, pad + h
+        patch = np.zeros((h + baseline + 2 * pad, w + 2 * pad, 3), dtype=np.uint8)
+        cv2.putText(patch, text, (ox, oy), self.font, scale, color, thickness)
+        # 裁掉空白边
+        ys, xs = np.nonzero(patch.any(axis=2))
+        if len(ys) == 0:
+            sprite = (None, (0, 0))
+        else:
+            y1, y2, x1, x2 = ys.min(), ys.max() + 1, xs.min(), xs.max() + 1
+            sprite = (patch[y1:y2, x1:x2].copy(), (ox - x1, oy - y1))
+
+        if len(self._sprites) >= self.max_entries:
+            # 简单的整体淘汰 (面板文字组合有限，很少触发)
+            self._sprites.clear()
+        self._sprites[key] = sprite
+        return sprite
+
+    def draw(self, canvas, text, org, scale, color, thickness=1):
+        """在黑色背景上等同 cv2.putText(canvas, text, org, font, scale, color, thickness)"""
+        image, (ox, oy) = self.get(text, scale, color, thickness)
+        if image is None:
+            return canvas
+        sh, sw = image.shape[:2]
+        ch, cw = canvas.shape[:2]
+        x1, y1 = org[0] - ox, org[1] - oy
+        # 裁剪到画布范围内
+        cx1, cy1 = max(0, x1), max(0, y1)
+        cx2, cy2 = min(cw, x1 + sw), min(ch, y1 + sh)
+        if cx2 <= cx1 or cy2 <= cy1:
+            return canvas
+        sx, sy = cx1 - x1, cy1 - y1
+        region = canvas[cy1:cy2, cx1:cx2]
+        np.maximum(region, image[sy:sy + cy2 - cy1, sx:sx + cx2 - cx1], out=region)
+        return canvas
@@ -87,18 +87,115 @@ SHOW_FPS = True
 # 性能设置
 # ============================================================
 
-# 人体识别处理频率
-# 每 N 帧处理一次完整的人体分析
+# 重型分析调度 (ai_scheduler.py)：每帧按人、按阶段决定是否运行
+# 新出现的人立即分析；新轨迹和移动中的人按下面的基础间隔重复分析；
+# 静止的人间隔再乘以 SCHEDULER_STATIC_FACTOR
+
+# 人体属性 (体型/服装/颜色) 的基础间隔 (帧)
 # 较大的值 = 更高FPS，但识别更新较慢
-# 推荐: 1 (每帧) 或 2 (隔帧)
-PROCESS_EVERY_N_FRAMES = 1
+PROCESS_EVERY_N_FRAMES = 10
 
-# 情感识别处理频率
-# 每 N 帧进行一次情感识别
+# 情感识别 (HSEmotion) 的基础间隔 (帧)，只在同一帧刚分析过人脸时运行
 # 情感识别比较耗时，可以降低频率
 # 推荐: 5 - 10
 EMOTION_EVERY_N_FRAMES = 10
 
+# 人脸 (年龄) 的基础间隔 (帧)
+# FACE_ROI_MODE = 'keypoints' 时只跑年龄模型，可以每帧分析；'detect' 模式整帧检测较重，推荐 3
+FACE_EVERY_N_FRAMES = 1
+
+# 静止的人各阶段间隔的放大倍数
+SCHEDULER_STATIC_FACTOR = 4
+
+# bbox 中心位移 (或高度变化) 超过 bbox 高度的该比例视为移动
+SCHEDULER_MOTION_THRESHOLD = 0.1
+
+# 新轨迹的前 N 帧按基础间隔分析 (年龄/情绪平滑尽快收敛)
+SCHEDULER_YOUNG_FRAMES = 30
+
+# 分析阶段每帧耗时预算 (毫秒)，平均耗时超出时所有间隔按比例拉长 (最多 4 倍)；0 = 不按负载调整
+ANALYSIS_FRAME_BUDGET_MS = 66
+
+# 人体检测模式
+# 'separate'  - YOLOv8-Pose 和 YOLOv8-Seg 各自预处理、各自推理 (原行为)
+# 'fused'     - 每帧只做一次 letterbox/归一化，两个模型共享同一个输入张量
+# 'pose_only' - 只跑一次 Pose 推理，人物 mask 由关键点轮廓生成 (纯 CPU 机器推荐)
+DETECTION_MODE = 'separate'
+
+# 推理分辨率 (长边像素)
+# 分析器把采集帧缩放一次后再送入所有模型，结果映射回采集坐标
+# None = 直接使用采集分辨率 (原行为)
+# 推荐: 640 (精度几乎不变) 或 480 (纯 CPU 机器)
+# 可用 tools/resolution_report.py 在录制片段上对比精度和耗时
+INFERENCE_LONG_EDGE = None
+
+# 推理后端 (YOLOv8-Pose / YOLOv8-Seg / HSEmotion 情绪模型)
+# 'torch'    - ultralytics .pt 模型 + PyTorch (GPU 机器推荐，原行为)
+# 'onnx'     - ONNX Runtime CPU，加载 models/ 下由 tools/export_models.py 导出的 .onnx
+# 'openvino' - OpenVINO CPU，加载 *_openvino_model/*.xml (没有时直接读取 .onnx)
+# 运行库未安装或找不到导出的模型时自动回退 'torch'
+INFERENCE_BACKEND = 'torch'
+
+# 模型精度 (仅 onnx / openvino 后端)
+# 'fp32' - 导出的原始模型
+# 'int8' - 量化模型 *_int8.onnx (tools/quantize_models.py 生成)，缺失时回退 fp32
+INFERENCE_PRECISION = 'fp32'
+
+# 推理线程数，0 = 运行时默认 (通常为物理核数)
+# 采集、渲染、追踪线程也要占用 CPU，纯 CPU 机器推荐 物理核数 - 2
+INFERENCE_THREADS = 0
+
+# 服装主色提取模式
+# 'mean'      - numpy 掩码均值 + 离散度，一帧所有 ROI 一次向量化计算 (推荐，结果等价于原 KMeans)
+# 'histogram' - 直方图量化多簇模式，条纹/拼色衣服取占比最大的颜色
+# 'kmeans'    - 原 sklearn KMeans(n_clusters=1) 路径 (需要 scikit-learn，仅用于对比)
+COLOR_MODE = 'mean'
+
+# 剪影模式扫描线特效 (每个人物 bbox 内从上到下扫描 + 模糊拖影)
+# 只在扫描线附近的条带内模糊和混合，开启后几乎不影响帧率
+SCAN_LINE_ENABLED = False
+
+# 关键点轮廓 (分割模型不可用 / pose_only 模式的人物 mask，以及取色用的人形 mask) 的绘制分辨率
+# 只在人物 ROI 内绘制；1.0 = 原分辨率 (与整帧绘制逐像素一致)，0.5 / 0.25 = 降分辨率绘制再放大
+SILHOUETTE_SCALE = 1.0
+
+# 人脸区域来源
+# 'detect'    - 每次人脸分析都跑 InsightFace 整帧检测 (640x640) + 全部属性模型
+# 'keypoints' - 由姿态关键点 (鼻子/眼睛/耳朵) 推算人脸框，只跑年龄模型，开销小到可以每帧分析人脸；
+#               每 FACE_DETECT_EVERY_N_FRAMES 次，或有人脸朝向镜头但关键点不可靠时，回退整帧检测
+FACE_ROI_MODE = 'keypoints'
+FACE_DETECT_EVERY_N_FRAMES = 15
+
+# 分级流水线
+# True  - 分析 (检测/人脸/属性/mask)、渲染 (特效/组合视图)、显示 各在独立线程，GPU 推理和绘制重叠执行
+# False - 原来的串行主循环
+PIPELINE_ENABLED = True
+
+# 流水线级间背压策略
+# 'latest' - 下游来不及处理时丢弃旧包，只保留最新一帧 (实时显示推荐)
+# 'block'  - 上游等待下游，保证每帧都被处理 (离线回放/测试用)
+PIPELINE_POLICY = 'latest'
+
+
+# ============================================================
+# 性能分析
+# ============================================================
+
+# 是否记录各阶段耗时 (p50/p95/p99 滚动统计，开销很小)
+PROFILE_ENABLED = True
+
+# 是否在组合视图中下格子显示统计面板 (运行时按 'p' 切换)
+PROFILE_OVERLAY = False
+
+# 每个阶段保留最近多少次采样
+PROFILE_WINDOW = 300
+
+# 定期导出 CSV/JSON 的间隔（秒），0 = 不导出
+PROFILE_DUMP_INTERVAL = 30.0
+
+# 导出目录 (profile.csv 追加历史，profile_latest.json 为最新快照)
+PROFILE_DUMP_DIR = 'logs/profile'
+
 
 # ============================================================
 # 追踪行为
@@ -116,6 +213,34 @@ AUTO_START_TRACKING = True
 # 启动时是否自动使能电机
 AUTO_ENABLE_MOTORS = True
 
+# GalleryView 中的 AdvancedTracker 是否绘制调试画面 (中心十字、目标圈、状态文字)
+# 组合视图不显示这张画面；关闭时追踪线程不复制整帧，只使用检测结果
+TRACKER_DRAW_UI = False
+
+# 舵机总线线程 (sts_control/servo_bus.py) 的循环频率 (Hz)
+# 追踪线程只更新目标，总线线程每个周期把有更新的目标合并成一个 SYNC WRITE
+SERVO_BUS_RATE_HZ = 100
+
+# 每隔多少个总线周期读取一次遥测 (位置/负载/温度/移动标志)，至少 1
+# 100 Hz / 5 = 20 Hz 遥测；启动/关闭时等待电机到位和巡航都依赖遥测
+SERVO_TELEMETRY_EVERY = 5
+
+# 追踪控制线程频率 (Hz)
+# 视觉结果只更新目标测量，控制线程按该频率外推目标、计算增量并写入舵机总线
+TRACKER_CONTROL_HZ = 100
+
+# 追踪增益对应的视觉帧率 (Hz)
+# 增益原本按每个视觉帧调校，控制线程每个周期的增量按 dt × 该频率折算，保持原来的转动速度
+TRACKER_GAIN_REFERENCE_HZ = 12.0
+
+# 目标预测 (alpha-beta 滤波) 的速度系数
+# 较大的值 = 跟随移动目标更快，但更容易抖动；0 = 不估计速度，只保持最新位置
+TRACKER_PREDICTOR_BETA = 0.1
+
+# 两个视觉帧之间最多向前外推的时间 (秒)
+# 推理卡顿超过该时间后目标保持不动，不会一直往外推
+TRACKER_MAX_EXTRAPOLATION = 0.15
+
 
 # ============================================================
 # 安全设置
@@ -151,7 +276,7 @@ LOG_FILE = 'tracking_log.txt'
 # 高级设置（不推荐修改）
 # ============================================================
 
-# 命令队列大小
+# 命令队列大小 (舵机总线线程的一次性命令队列，例如扭矩开关)
 COMMAND_QUEUE_SIZE = 10
 
 # 串口读取超时（秒）
@@ -163,6 +288,14 @@ SERIAL_RETRY_COUNT = 3
 # 摄像头缓冲区大小
 CAMERA_BUFFER_SIZE = 1
 
+# 后台采集线程的环形缓冲槽位数 (至少 3)
+# 采集线程持续抓帧，主循环始终取最新一帧
+CAMERA_RING_SIZE = 3
+
+# 整帧缓冲池每种尺寸最多保留的空闲缓冲数
+# 流水线的分析帧、剪影特效帧从池中取，用完回收，稳定运行时不再分配整帧数组
+FRAME_POOL_SIZE = 6
+
 
 
 
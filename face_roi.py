@@ -0,0 +1,86 @@
+"""
+由姿态关键点推算人脸框
+- YOLO Pose 已经给出鼻子 / 眼睛 / 耳朵 (COCO 0-4)，人脸位置不必再跑 InsightFace 的 640x640 整帧检测
+- 推算出的框只交给轻量的年龄模型 (genderage，96x96 输入，按框中心和边长裁剪) 和 HSEmotion
+- 关键点不可靠 (侧脸、背对、太远) 时返回 None，由调用方回退到整帧检测
+"""
+
+import math
+
+# COCO 关键点下标
+NOSE, LEFT_EYE, RIGHT_EYE, LEFT_EAR, RIGHT_EAR = 0, 1, 2, 3, 4
+
+# 关键点置信度阈值 / 人脸框最小边长 (像素，太小的脸年龄估计不可靠)
+FACE_KEYPOINT_CONF = 0.5
+MIN_FACE_SIZE = 24
+
+# 鼻子置信度高于此值时认为人脸可能朝向镜头 (推算不出框时值得交给检测器)
+FACE_VISIBLE_CONF = 0.25
+
+# 人脸框高宽比，以及双眼连线在框内的相对高度 (与 InsightFace 检测框的比例大致一致)
+FACE_ASPECT = 1.25
+EYE_LINE = 0.4
+
+
+def _point(keypoints, idx, min_conf):
+    if keypoints is None or len(keypoints) <= idx:
+        return None
+    kpt = keypoints[idx]
+    if len(kpt) < 3 or kpt[2] <= min_conf:
+        return None
+    return float(kpt[0]), float(kpt[1])
+
+
+def _dist(a, b):
+    return math.hypot(a[0] - b[0], a[1] - b[1])
+
+
+def face_box_from_keypoints(keypoints, img_h, img_w, min_conf=FACE_KEYPOINT_CONF, min_size=MIN_FACE_SIZE):
+    """
+    由鼻子、眼睛、耳朵推算人脸框 (x1, y1, x2, y2)，关键点不可靠时返回 None
+    需要鼻子可见，再加至少两只眼睛或一只眼睛 + 一只耳朵 (正脸 / 半侧脸)
+    """
+    nose = _point(keypoints, NOSE, min_conf)
+    if nose is None:
+        return None
+    l_eye = _point(keypoints, LEFT_EYE, min_conf)
+    r_eye = _point(keypoints, RIGHT_EYE, min_conf)
+    l_ear = _point(keypoints, LEFT_EAR, min_conf)
+    r_ear = _point(keypoints, RIGHT_EAR, min_conf)
+    eyes = [p for p in (l_eye, r_eye) if p is not None]
+    if not eyes:
+        return None
+
+    # 脸宽：优先用两耳距离，其次两眼距离，半侧脸用鼻子到耳朵的距离
+    if l_ear is not None and r_ear is not None:
+        width = _dist(l_ear, r_ear) * 1.1
+    elif len(eyes) == 2:
+        width = _dist(l_eye, r_eye) * 2.5
+    else:
+        ear = l_ear if l_ear is not None else r_ear
+        if ear is None:
+            return None
+        width = _dist(nose, ear) * 1.6
+
+    if width < min_size:
+        return None
+    height = width * FACE_ASPECT
+
+    # 水平中心取鼻子和双眼的平均，垂直方向以眼睛连线定位
+    cx = (nose[0] + sum(p[0] for p in eyes)) / (1 + len(eyes))
+    eye_y = sum(p[1] for p in eyes) / len(eyes)
+    x1 = int(round(cx - width / 2))
+    y1 = int(round(eye_y - height * EYE_LINE))
+    x2 = int(round(cx + width / 2))
+    y2 = int(round(y1 + height))
+
+    x1, y1 = max(0, x1), max(0, y1)
+    x2, y2 = min(img_w, x2), min(img_h, y2)
+    if x2 - x1 < min_size or y2 - y1 < min_size:
+        return None
+    return x1, y1, x2, y2
+
+
+def face_may_be_visible(keypoints, min_conf=FACE_VISIBLE_CONF):
+    """鼻子大致可见 (人脸可能朝向镜头)；背对镜头时为 False，整帧检测也找不到脸"""
+    return _point(keypoints, NOSE, min_conf) is not None
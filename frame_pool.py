@@ -0,0 +1,99 @@
+"""
+整帧缓冲池 (引用计数)
+- 流水线模式下环形缓冲的槽位只在下一次 read() 之前有效，分析阶段复制一次进池中的缓冲，
+  之后渲染线程、追踪线程共享同一块内存，不再各自 copy
+- 下游拿到的是只读视图 (writeable=False)：误在共享帧上绘制会直接报错，而不是悄悄污染其他阶段的画面
+- 真正要在帧上绘制的阶段 (剪影特效、追踪器调试画面) 从池中取一块缓冲自己复制 (copy-on-write)
+- 引用计数归零的缓冲回到空闲列表，稳定运行时不再分配新的整帧数组
+- 流水线丢弃的数据包由 on_drop 回调 release；漏掉 release 也不会泄漏，只是缓冲随对象被 GC 回收，池子之后再分配一块
+"""
+
+import threading
+
+import numpy as np
+
+
+def readonly_view(array):
+    """同一块内存的只读视图"""
+    view = array.view()
+    view.flags.writeable = False
+    return view
+
+
+class PooledFrame:
+    """
+    池中的一块整帧缓冲
+    array: 只读视图 (共享给各阶段)；buffer: 可写数组 (只有唯一持有者才应该写)
+    """
+
+    __slots__ = ('pool', 'buffer', 'array', '_refs')
+
+    def __init__(self, pool, buffer):
+        self.pool = pool
+        self.buffer = buffer
+        self.array = readonly_view(buffer)
+        self._refs = 1
+
+    @property
+    def refs(self):
+        return self._refs
+
+    def retain(self):
+        """增加一个持有者 (交给另一个线程前调用)，返回自身"""
+        with self.pool._lock:
+            self._refs += 1
+        return self
+
+    def release(self):
+        """持有者用完后调用；最后一个持有者释放时缓冲回到池中"""
+        with self.pool._lock:
+            self._refs -= 1
+            if self._refs != 0:
+                return
+        self.pool._recycle(self.buffer)
+
+
+class FramePool:
+    """按形状分组的整帧缓冲池"""
+
+    def __init__(self, max_free=6):
+        """
+        Args:
+            max_free: 每种形状最多保留的空闲缓冲数 (超出的直接交给 GC)
+        """
+        self.max_free = max_free
+        self._free = {}     # (shape, dtype) -> [ndarray, ...]
+        self._lock = threading.Lock()
+
+        # 统计
+        self.allocated = 0  # 新分配的缓冲数
+        self.reused = 0     # 从空闲列表取出的次数
+
+    def acquire(self, shape, dtype=np.uint8):
+        """取一块缓冲 (内容未初始化)，引用计数为 1"""
+        key = (tuple(shape), np.dtype(dtype).str)
+        with self._lock:
+            free = self._free.get(key)
+            if free:
+                self.reused += 1
+                return PooledFrame(self, free.pop())
+            self.allocated += 1
+        return PooledFrame(self, np.empty(shape, dtype=dtype))
+
+    def copy_from(self, src):
+        """取一块缓冲并复制 src 的内容"""
+        frame = self.acquire(src.shape, src.dtype)
+        np.copyto(frame.buffer, src)
+        return frame
+
+    def _recycle(self, buffer):
+        key = (buffer.shape, buffer.dtype.str)
+        with self._lock:
+            free = self._free.setdefault(key, [])
+            if len(free) < self.max_free:
+                free.append(buffer)
+
+    def stats(self):
+        with self._lock:
+            free = sum(len(v) for v in self._free.values())
+        return {'allocated': self.allocated, 'reused': self.reused, 'free': free}
@@ -0,0 +1,328 @@
+"""
+CPU 推理后端 (ONNX Runtime / OpenVINO)
+- 纯 CPU 机器上用 PyTorch eager 跑 YOLOv8n-pose / YOLOv8n-seg / HSEmotion 很慢，
+  这里加载 tools/export_models.py 导出的模型，前后处理 (letterbox / NMS / mask 解码 / softmax) 用 numpy + OpenCV
+- 模型文件 (都在 models/ 下，找不到时再看当前目录，与 .pt 的查找顺序一致):
+    <名称>.onnx                           FP32
+    <名称>_int8.onnx                      INT8 (tools/quantize_models.py 生成)
+    <名称>[_int8]_openvino_model/*.xml    OpenVINO IR (可选；没有时 OpenVINO 直接读取 ONNX)
+- 输出与 PyTorch 路径对齐: 姿态 -> (框, 置信度, 关键点)，分割 -> 合并后的人物 mask，
+  情绪 -> 与 HSEmotionRecognizer.predict_multi_emotions 相同的 (标签, 分数)
+- 导出的 YOLO 模型输入是固定的正方形 (imgsz × imgsz)，letterbox 填充到整个正方形
+"""
+
+import glob
+import os
+
+import cv2
+import numpy as np
+
+try:
+    import onnxruntime as ort
+    ONNXRUNTIME_AVAILABLE = True
+except ImportError:
+    ONNXRUNTIME_AVAILABLE = False
+
+try:
+    import openvino as ov
+    OPENVINO_AVAILABLE = True
+except ImportError:
+    OPENVINO_AVAILABLE = False
+
+BACKENDS = ('torch', 'onnx', 'openvino')
+PRECISIONS = ('fp32', 'int8')
+
+# 各模型导出后的文件名 (不含扩展名)
+MODEL_NAMES = {
+    'pose': 'yolov8n-pose',
+    'seg': 'yolov8n-seg',
+    'emotion': 'enet_b0_8_best_vgaf',
+}
+
+# 与 ultralytics predict 的默认阈值一致
+DEFAULT_CONF = 0.25
+DEFAULT_IOU = 0.7
+MAX_DET = 300
+
+# HSEmotion (enet_b0_8_best_vgaf) 的输入尺寸、ImageNet 归一化和类别
+EMOTION_IMG_SIZE = 224
+EMOTION_MEAN = np.array([0.485, 0.456, 0.406], dtype=np.float32)
+EMOTION_STD = np.array([0.229, 0.224, 0.225], dtype=np.float32)
+EMOTION_CLASSES = {0: 'Anger', 1: 'Contempt', 2: 'Disgust', 3: 'Fear',
+                   4: 'Happiness', 5: 'Neutral', 6: 'Sadness', 7: 'Surprise'}
+
+
+def backend_available(backend):
+    if backend == 'onnx':
+        return ONNXRUNTIME_AVAILABLE
+    if backend == 'openvino':
+        return OPENVINO_AVAILABLE
+    return backend == 'torch'
+
+
+def resolve_model_path(kind, backend, precision='fp32', model_dir='models'):
+    """
+    查找导出的模型文件，返回 (路径, 实际精度)；找不到时返回 (None, None)
+    INT8 文件不存在时回退 FP32
+    """
+    name = MODEL_NAMES[kind]
+    precisions = [precision] if precision == 'fp32' else [precision, 'fp32']
+    for prec in precisions:
+        stem = name if prec == 'fp32' else f"{name}_{prec}"
+        candidates = []
+        for directory in (model_dir, '.'):
+            if backend == 'openvino':
+                candidates += sorted(glob.glob(os.path.join(directory, f"{stem}_openvino_model", '*.xml')))
+            candidates.append(os.path.join(directory, f"{stem}.onnx"))
+        for path in candidates:
+            if os.path.exists(path):
+                return path, prec
+    return None, None
+
+
+class RuntimeSession:
+    """ONNX Runtime / OpenVINO 推理会话：run(inputs) -> [输出数组, ...] (按模型的输出顺序)"""
+
+    def __init__(self, path, backend, threads=0):
+        """
+        Args:
+            path: .onnx 或 OpenVINO .xml
+            backend: 'onnx' / 'openvino'
+            threads: 推理线程数 (0 = 运行时默认，通常为物理核数)
+        """
+        self.path = path
+        self.backend = backend
+        self.threads = threads
+
+        if backend == 'onnx':
+            if not ONNXRUNTIME_AVAILABLE:
+                raise RuntimeError("onnxruntime not installed")
+            options = ort.SessionOptions()
+            options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+            if threads:
+                options.intra_op_num_threads = threads
+                options.inter_op_num_threads = 1
+            self._session = ort.InferenceSession(path, sess_options=options,
+                                                 providers=['CPUExecutionProvider'])
+            model_input = self._session.get_inputs()[0]
+            self.input_name = model_input.name
+            self.input_shape = [d if isinstance(d, int) else None for d in model_input.shape]
+        elif backend == 'openvino':
+            if not OPENVINO_AVAILABLE:
+                raise RuntimeError("openvino not installed")
+            core = ov.Core()
+            model = core.read_model(path)
+            config = {'PERFORMANCE_HINT': 'LATENCY'}
+            if threads:
+                config['INFERENCE_NUM_THREADS'] = threads
+            self._compiled = core.compile_model(model, 'CPU', config)
+            self._outputs = list(self._compiled.outputs)
+            self.input_shape = [d.get_length() if d.is_static else None
+                                for d in model.inputs[0].get_partial_shape()]
+        else:
+            raise ValueError(f"Unknown runtime backend: {backend}")
+
+    def input_size(self, default):
+        """输入的空间尺寸 (H, W)；动态维度用 default"""
+        shape = self.input_shape
+        h = shape[2] if len(shape) == 4 and shape[2] else default
+        w = shape[3] if len(shape) == 4 and shape[3] else default
+        return h, w
+
+    @property
+    def fixed_batch(self):
+        """输入 batch 维度固定时返回该值，动态时返回 None"""
+        return self.input_shape[0] if self.input_shape else None
+
+    def run(self, blob):
+        if self.backend == 'onnx':
+            return self._session.run(None, {self.input_name: blob})
+        results = self._compiled(blob)
+        return [results[output] for output in self._outputs]
+
+
+# ------------------------------------------------------------
+# YOLOv8 (pose / seg)
+# ------------------------------------------------------------
+def letterbox_blob(frame, size):
+    """
+    等比缩放 + 居中填充到 size (H, W)，BGR uint8 -> 1x3xHxW RGB float32 (0-1)
+    返回 (blob, (ratio, pad_left, pad_top, new_w, new_h))，与分析器 fused 模式的 transform 格式一致
+    """
+    out_h, out_w = size
+    h, w = frame.shape[:2]
+    ratio = min(out_h / h, out_w / w)
+    new_w, new_h = int(round(w * ratio)), int(round(h * ratio))
+    pad_w, pad_h = out_w - new_w, out_h - new_h
+    left, top = pad_w // 2, pad_h // 2
+
+    resized = frame if (new_w, new_h) == (w, h) else \
+        cv2.resize(frame, (new_w, new_h), interpolation=cv2.INTER_LINEAR)
+    padded = cv2.copyMakeBorder(resized, top, pad_h - top, left, pad_w - left,
+                                cv2.BORDER_CONSTANT, value=(114, 114, 114))
+    blob = cv2.dnn.blobFromImage(padded, scalefactor=1.0 / 255.0, swapRB=True)
+    return blob, (ratio, left, top, new_w, new_h)
+
+
+def _nms(boxes_xyxy, scores, conf, iou, max_det=MAX_DET):
+    """单类 NMS，返回保留的下标 (按分数从高到低)"""
+    if len(scores) == 0:
+        return np.zeros(0, dtype=int)
+    xywh = np.column_stack([boxes_xyxy[:, :2], boxes_xyxy[:, 2:] - boxes_xyxy[:, :2]])
+    keep = cv2.dnn.NMSBoxes(xywh.tolist(), scores.tolist(), conf, iou)
+    keep = np.asarray(keep, dtype=int).reshape(-1)
+    return keep[:max_det]
+
+
+def _cxcywh_to_xyxy(boxes):
+    half = boxes[:, 2:4] / 2.0
+    return np.concatenate([boxes[:, :2] - half, boxes[:, :2] + half], axis=1)
+
+
+class YoloRuntimeModel:
+    """导出的 YOLOv8 pose / seg 模型 (ultralytics 导出格式，不含 NMS)"""
+
+    def __init__(self, session, task, imgsz=640):
+        """
+        Args:
+            session: RuntimeSession
+            task: 'pose' / 'seg'
+            imgsz: 模型输入尺寸为动态时使用的边长
+        """
+        self.session = session
+        self.task = task
+        self.input_hw = session.input_size(imgsz)
+
+    def preprocess(self, frame):
+        return letterbox_blob(frame, self.input_hw)
+
+    def _unletterbox(self, points, transform):
+        ratio, left, top, _, _ = transform
+        points[..., 0] = (points[..., 0] - left) / ratio
+        points[..., 1] = (points[..., 1] - top) / ratio
+        return points
+
+    def pose(self, frame, conf=DEFAULT_CONF, iou=DEFAULT_IOU, prepared=None):
+        """
+        人体姿态检测
+        prepared: 同一帧已经做好的 (blob, transform)，可在 pose / seg 之间共享
+        返回 [(xyxy, 置信度, 关键点 (17, 3)), ...]，坐标为 frame 坐标
+        """
+        blob, transform = prepared if prepared is not None else self.preprocess(frame)
+        # (1, 4 + 1 + 17*3, N) -> (N, 56)
+        preds = self.session.run(blob)[0][0].T
+        scores = preds[:, 4]
+        candidates = scores > conf
+        preds, scores = preds[candidates], scores[candidates]
+        boxes = _cxcywh_to_xyxy(preds[:, :4])
+        keep = _nms(boxes, scores, conf, iou)
+
+        h, w = frame.shape[:2]
+        boxes = self._unletterbox(boxes[keep].reshape(-1, 2, 2), transform).reshape(-1, 4)
+        boxes[:, [0, 2]] = boxes[:, [0, 2]].clip(0, w)
+        boxes[:, [1, 3]] = boxes[:, [1, 3]].clip(0, h)
+        keypoints = self._unletterbox(preds[keep, 5:].reshape(-1, 17, 3), transform)
+        return list(zip(boxes, scores[keep].astype(float), keypoints))
+
+    def _segment(self, frame, conf, iou, prepared):
+        """
+        实例分割解码 (只保留 person)
+        返回 (框 xyxy (frame 坐标), 分数, 原型分辨率的 mask 概率 (K, mh, mw)，框外为 0, 内容区域切片)
+        """
+        blob, transform = prepared if prepared is not None else self.preprocess(frame)
+        outputs = self.session.run(blob)
+        protos = next(o for o in outputs if o.ndim == 4)[0]   # (32, mh, mw)
+        preds = next(o for o in outputs if o.ndim == 3)[0].T  # (N, 4 + 类别数 + 32)
+        num_masks, mh, mw = protos.shape
+
+        # letterbox 内容区域在原型 mask 上的位置
+        _, left, top, new_w, new_h = transform
+        in_h, in_w = self.input_hw
+        sx, sy = mw / in_w, mh / in_h
+        content = (slice(int(round(top * sy)), int(round((top + new_h) * sy))),
+                   slice(int(round(left * sx)), int(round((left + new_w) * sx))))
+
+        class_scores = preds[:, 4:preds.shape[1] - num_masks]
+        # 每个框取最高分的类别 (与 ultralytics 单标签 NMS 一致)，只保留 person
+        best = class_scores.argmax(axis=1)
+        scores = class_scores[np.arange(len(preds)), best]
+        candidates = (best == 0) & (scores > conf)
+        preds, scores = preds[candidates], scores[candidates]
+        boxes = _cxcywh_to_xyxy(preds[:, :4])
+        keep = _nms(boxes, scores, conf, iou)
+        preds, scores, boxes = preds[keep], scores[keep], boxes[keep]
+
+        # 系数 × 原型 -> sigmoid，框外清零 (与 ultralytics 的 crop_mask 相同)
+        masks = preds[:, -num_masks:] @ protos.reshape(num_masks, -1)
+        masks = (1.0 / (1.0 + np.exp(-masks))).reshape(-1, mh, mw)
+        cols = np.arange(mw, dtype=np.float32)[None, None, :]
+        rows = np.arange(mh, dtype=np.float32)[None, :, None]
+        x1, y1, x2, y2 = (boxes * np.array([sx, sy, sx, sy], dtype=np.float32)).T[:, :, None, None]
+        masks *= (cols >= x1) & (cols < x2) & (rows >= y1) & (rows < y2)
+
+        h, w = frame.shape[:2]
+        boxes = self._unletterbox(boxes.reshape(-1, 2, 2), transform).reshape(-1, 4)
+        boxes[:, [0, 2]] = boxes[:, [0, 2]].clip(0, w)
+        boxes[:, [1, 3]] = boxes[:, [1, 3]].clip(0, h)
+        return boxes, scores.astype(float), masks, content
+
+    def instance_masks(self, frame, conf=DEFAULT_CONF, iou=DEFAULT_IOU, prepared=None):
+        """
+        每个 person 实例的二值 mask (原型分辨率，已去掉 letterbox 填充，用于精度对比)
+        返回 [(xyxy, 置信度, mask bool), ...]
+        """
+        boxes, scores, masks, content = self._segment(frame, conf, iou, prepared)
+        masks = masks[(slice(None),) + content] > 0.5
+        return list(zip(boxes, scores, masks))
+
+    def person_mask(self, frame, conf=DEFAULT_CONF, iou=DEFAULT_IOU, prepared=None):
+        """
+        人物分割：所有 person 实例合并成一张 frame 大小的二值 mask (0/255)，没有人时返回 None
+        原型 mask (160x160) 上取最大值合并后只做一次放大
+        """
+        _, _, masks, content = self._segment(frame, conf, iou, prepared)
+        if len(masks) == 0:
+            return None
+        combined = masks.max(axis=0)[content]
+        h, w = frame.shape[:2]
+        combined = cv2.resize(combined, (w, h), interpolation=cv2.INTER_LINEAR)
+        return (combined > 0.5).astype(np.uint8) * 255
+
+
+# ------------------------------------------------------------
+# 情绪 (HSEmotion EfficientNet-B0)
+# ------------------------------------------------------------
+class RuntimeEmotionRecognizer:
+    """
+    导出的 HSEmotion 模型，接口与 HSEmotionRecognizer.predict_multi_emotions 一致
+    预处理对应 HSEmotion 的 Resize(224) + ToTensor + ImageNet Normalize；
+    与 HSEmotion 一样不做通道转换，调用方传入什么顺序就按什么顺序送进模型
+    """
+
+    def __init__(self, session, img_size=EMOTION_IMG_SIZE):
+        self.session = session
+        self.img_size = session.input_size(img_size)
+        self.idx_to_class = dict(EMOTION_CLASSES)
+
+    def preprocess(self, face_img):
+        """HxWx3 uint8 -> 3xHxW float32"""
+        h, w = self.img_size
+        # 缩小用 INTER_AREA (接近 PIL 的抗锯齿双线性)，放大用 INTER_LINEAR
+        interpolation = cv2.INTER_AREA if face_img.shape[0] > h or face_img.shape[1] > w else cv2.INTER_LINEAR
+        img = cv2.resize(face_img, (w, h), interpolation=interpolation).astype(np.float32) / 255.0
+        img = (img - EMOTION_MEAN) / EMOTION_STD
+        return img.transpose(2, 0, 1)
+
+    def predict_multi_emotions(self, face_img_list, logits=True):
+        """返回 (标签列表, 分数数组 (N, 8))；logits=False 时分数经过 softmax"""
+        batch = np.ascontiguousarray(np.stack([self.preprocess(img) for img in face_img_list]))
+        if self.session.fixed_batch == 1 and len(batch) > 1:
+            # 导出时没有动态 batch：逐张推理
+            scores = np.concatenate([self.session.run(batch[i:i + 1])[0] for i in range(len(batch))])
+        else:
+            scores = self.session.run(batch)[0]
+        preds = np.argmax(scores, axis=1)
+        if not logits:
+            e_x = np.exp(scores - np.max(scores, axis=1)[:, np.newaxis])
+            scores = e_x / e_x.sum(axis=1)[:, None]
+        return [self.idx_to_class[int(pred)] for pred in preds], scores
@@ -38,20 +38,51 @@ from person_analysis import CompletePersonFaceAnalyzer
 from tracker import AdvancedTracker # 导入追踪器
 from visual_style import GlitchArtEffect # 导入故障艺术效果
 from config import ARM_PORT, ARM_BAUDRATE # 导入硬件配置
+from config import CAMERA_BUFFER_SIZE, CAMERA_RING_SIZE, FRAME_POOL_SIZE # 导入采集和帧缓冲池配置
+from config import TRACKER_DRAW_UI # 导入追踪器调试画面开关
+from config import SERVO_BUS_RATE_HZ, SERVO_TELEMETRY_EVERY, COMMAND_QUEUE_SIZE # 导入舵机总线线程配置
+from config import TRACKER_CONTROL_HZ, TRACKER_GAIN_REFERENCE_HZ, TRACKER_PREDICTOR_BETA, TRACKER_MAX_EXTRAPOLATION # 导入追踪控制线程配置
+from config import DETECTION_MODE, INFERENCE_LONG_EDGE, COLOR_MODE # 导入检测模式、推理分辨率和取色模式
+from config import INFERENCE_BACKEND, INFERENCE_PRECISION, INFERENCE_THREADS # 导入推理后端配置
+from config import SCAN_LINE_ENABLED, SILHOUETTE_SCALE # 导入扫描线特效开关和关键点轮廓分辨率
+from config import FACE_ROI_MODE, FACE_DETECT_EVERY_N_FRAMES # 导入人脸区域来源配置
+from config import PROCESS_EVERY_N_FRAMES, EMOTION_EVERY_N_FRAMES, FACE_EVERY_N_FRAMES # 导入重型分析间隔
+from config import SCHEDULER_STATIC_FACTOR, SCHEDULER_MOTION_THRESHOLD, SCHEDULER_YOUNG_FRAMES, ANALYSIS_FRAME_BUDGET_MS # 导入调度配置
+from config import PIPELINE_ENABLED, PIPELINE_POLICY # 导入流水线配置
+from camera_capture import ThreadedCamera # 导入后台采集
+from pipeline import StagedPipeline # 导入分级流水线
+from compositor import QuadrantCompositor, TextSpriteCache # 导入组合画布和文字贴图缓存
+from frame_pool import FramePool, readonly_view # 导入整帧缓冲池
+from replay import ReplaySource # 导入录像回放
+from config import PROFILE_ENABLED, PROFILE_OVERLAY, PROFILE_WINDOW, PROFILE_DUMP_INTERVAL, PROFILE_DUMP_DIR # 导入性能分析配置
+from profiler import profiler # 导入性能分析
 from osc_control import OscController # 导入OSC控制器
 
 class GalleryView:
     """画廊式视图系统"""
     
-    def __init__(self, camera_id=0, window_width=1920, window_height=1080):
+    def __init__(self, camera_id=0, window_width=1920, window_height=1080,
+                 source=None, headless=False, tracker_driver=None, enable_tracker=True):
         """
         Args:
             camera_id: 摄像头设备ID
             window_width: 窗口宽度 (1920x1080)
             window_height: 窗口高度
+            source: 录像回放源 (视频文件 / 图片目录 / ReplaySource)，None = 使用摄像头
+            headless: 不打开窗口 (离线基准测试)
+            tracker_driver: 注入给 AdvancedTracker 的电机驱动 (例如连接模拟总线的 STSServoSerial)
+            enable_tracker: 是否创建 AdvancedTracker
         """
         self.window_width = window_width
         self.window_height = window_height
+        self.headless = headless
+        self.frames_displayed = 0
+        self.last_composite = None
+        self.max_frames = None
+        
+        # 运行模式 (基准测试可覆盖)
+        self.pipeline_enabled = PIPELINE_ENABLED
+        self.pipeline_policy = PIPELINE_POLICY
         
         # === 新布局定义 (1920x1080) ===
         # 上半部分高度
@@ -69,6 +100,37 @@ class GalleryView:
         self.bottom_mid_width = 480
         self.bottom_right_width = 480
         
+        # 组合画布：预分配、轮流使用，分隔线只画一次
+        start_x_right = self.bottom_left_width + self.bottom_mid_width # 960 + 480 = 1440
+        self.compositor = QuadrantCompositor(
+            width=window_width,
+            height=window_height,
+            quadrants={
+                'silhouette': (0, 0, self.left_width, self.top_height),
+                'glitch': (self.left_width, 0, window_width, self.top_height),
+                'info': (0, self.top_height, self.bottom_left_width, window_height),
+                'mid': (self.bottom_left_width, self.top_height, start_x_right, window_height),
+                'tracker': (start_x_right, self.top_height, window_width, window_height),
+            },
+            dividers=[
+                # 水平总线 (y=810)
+                ((0, self.top_height), (window_width, self.top_height)),
+                # 垂直线 1: 分割左上/右上 (x=1440, y=0~810)
+                ((self.left_width, 0), (self.left_width, self.top_height)),
+                # 垂直线 2: 下半部分分割 Info/Mid (x=960, y=810~1080)
+                ((self.bottom_left_width, self.top_height), (self.bottom_left_width, window_height)),
+                # 垂直线 3: 下半部分分割 Mid/Right (x=1440)，与垂直线1对齐形成贯穿效果
+                ((start_x_right, self.top_height), (start_x_right, window_height)),
+            ],
+            line_color=(80, 80, 80),
+            thickness=2
+        )
+        
+        # 信息面板：显示内容不变时复用上一次的图像，文字用贴图缓存绘制
+        self.ui_target_cache = {}
+        self._info_panel = None  # (文本行, 面板图像)
+        self.text_sprites = TextSpriteCache()
+        
         print("=" * 60)
         print("画廊式视图系统 - 自定义 16:9 布局")
         print("=" * 60)
@@ -83,41 +145,66 @@ class GalleryView:
         print("=" * 60)
         
         # 打开摄像头
-        print("\n打开摄像头...")
-        self.cap = cv2.VideoCapture(camera_id)
-        
-        # 强制设置 MJPG 格式以解锁高帧率 (关键修复)
-        # 许多 USB 摄像头在 1080p 下默认使用 YUY2 格式，受限于 USB 带宽只有 5 FPS
-        # 切换到 MJPG 可以达到 30 FPS
-        self.cap.set(cv2.CAP_PROP_FOURCC, cv2.VideoWriter_fourcc('M', 'J', 'P', 'G'))
-        
-        # 尝试设置高清分辨率
-        self.cap.set(cv2.CAP_PROP_FRAME_WIDTH, 1920)
-        self.cap.set(cv2.CAP_PROP_FRAME_HEIGHT, 1080)
-        self.cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+        # 采集在后台线程进行 (MJPG + 镜像翻转 + 时间戳)，主循环只取最新一帧
+        # 这样推理慢的帧不会拖住 USB 抓帧，也不会读到缓冲区里的旧帧
+        if source is not None:
+            # 录像回放 (与 ThreadedCamera 接口一致)
+            print("\n打开回放源...")
+            self.cap = source if isinstance(source, ReplaySource) else ReplaySource(source)
+        else:
+            print("\n打开摄像头...")
+            self.cap = ThreadedCamera(
+                camera_id=camera_id,
+                width=1920,
+                height=1080,
+                flip=True,
+                ring_size=CAMERA_RING_SIZE,
+                buffer_size=CAMERA_BUFFER_SIZE
+            )
         
         # 检查实际设置的分辨率（有些摄像头不支持会回退）
-        actual_w = self.cap.get(cv2.CAP_PROP_FRAME_WIDTH)
-        actual_h = self.cap.get(cv2.CAP_PROP_FRAME_HEIGHT)
-        print(f"摄像头分辨率: {int(actual_w)}x{int(actual_h)}")
+        print(f"摄像头分辨率: {self.cap.width}x{self.cap.height}")
         
         if not self.cap.isOpened():
             print("✗ 无法打开摄像头")
             return
-        print("✓ 摄像头已打开")
+        self.cap.start()
+        print("✓ 摄像头已打开 (后台采集线程)" if source is None else "✓ 回放源已打开")
         
         # 创建分析器
         print("\n加载模型...")
         self.analyzer = CompletePersonFaceAnalyzer(
             show_keypoints=True,
-            show_skeleton=True
+            show_skeleton=True,
+            detection_mode=DETECTION_MODE,
+            backend=INFERENCE_BACKEND,
+            precision=INFERENCE_PRECISION,
+            num_threads=INFERENCE_THREADS
+        )
+        self.analyzer.inference_long_edge = INFERENCE_LONG_EDGE
+        self.analyzer.color_mode = COLOR_MODE
+        self.analyzer.enable_scan_line = SCAN_LINE_ENABLED
+        self.analyzer.silhouette_cache.scale = SILHOUETTE_SCALE
+        self.analyzer.face_roi_mode = FACE_ROI_MODE
+        self.analyzer.face_detect_every_n = FACE_DETECT_EVERY_N_FRAMES
+        self.analyzer.scheduler.configure(
+            intervals={
+                'body': PROCESS_EVERY_N_FRAMES,
+                'emotion': EMOTION_EVERY_N_FRAMES,
+                'face': FACE_EVERY_N_FRAMES,
+            },
+            static_factor=SCHEDULER_STATIC_FACTOR,
+            motion_threshold=SCHEDULER_MOTION_THRESHOLD,
+            young_frames=SCHEDULER_YOUNG_FRAMES,
+            frame_budget_ms=ANALYSIS_FRAME_BUDGET_MS
         )
         
         # --- 性能优化 ---
         # 为了提高追踪流畅度，暂时关闭耗时的分割和人脸功能
         # print("\n[性能模式] 已启用：关闭分割和人脸分析以提高帧率")
         # self.analyzer.segmentation_enabled = False
-        self.analyzer.segmentation_enabled = True # 重新开启分割以获得精确轮廓
+        # 重新开启分割以获得精确轮廓 (pose_only 模式没有分割模型，使用关键点轮廓)
+        self.analyzer.segmentation_enabled = self.analyzer.yolo_seg_model is not None
         self.analyzer.face_enabled = True  # 开启人脸识别
         self.analyzer.emotion_enabled = True # 开启情绪识别 (使用 HSEmotion)
         # ----------------
@@ -166,22 +253,36 @@ class GalleryView:
         
         # 初始化 AdvancedTracker (用于后台追踪，不显示在UI上)
         print("\n初始化手部追踪器 (AdvancedTracker)...")
-        try:
-            # AdvancedTracker 不接受 baud_rate 参数，且默认波特率为 1000000
-            # 我们需要禁用内部摄像头和模型加载，因为我们在外部处理
-            self.tracker = AdvancedTracker(
-                port=ARM_PORT, 
-                use_internal_camera=False, 
-                load_model=False
-            )
-            print("✓ 追踪器已集成 (后台运行)")
-        except Exception as e:
-            print(f"✗ 追踪器初始化失败: {e}")
-            self.tracker = None
+        self.tracker = None
+        if enable_tracker:
+            try:
+                # AdvancedTracker 不接受 baud_rate 参数，且默认波特率为 1000000
+                # 我们需要禁用内部摄像头和模型加载，因为我们在外部处理
+                self.tracker = AdvancedTracker(
+                    port=ARM_PORT, 
+                    use_internal_camera=False, 
+                    load_model=False,
+                    driver=tracker_driver,
+                    headless=headless or not TRACKER_DRAW_UI,
+                    bus_rate_hz=SERVO_BUS_RATE_HZ,
+                    telemetry_every=SERVO_TELEMETRY_EVERY,
+                    command_queue_size=COMMAND_QUEUE_SIZE,
+                    control_hz=TRACKER_CONTROL_HZ,
+                    gain_reference_hz=TRACKER_GAIN_REFERENCE_HZ,
+                    predictor_beta=TRACKER_PREDICTOR_BETA,
+                    max_extrapolation=TRACKER_MAX_EXTRAPOLATION
+                )
+                print("✓ 追踪器已集成 (后台运行)")
+            except Exception as e:
+                print(f"✗ 追踪器初始化失败: {e}")
+                self.tracker = None
         
         # 运行状态 (必须在启动线程前初始化)
         self.running = True
         
+        # 整帧缓冲池：分析帧在各线程间共享 (只读视图 + 引用计数)，需要绘制的阶段从池中取缓冲复制
+        self.frame_pool = FramePool(max_free=FRAME_POOL_SIZE)
+        
         # === 多线程追踪支持 ===
         # 创建一个队列，仅保留最新的1帧数据，如果处理不过来就丢弃旧的
         self.tracker_queue = queue.Queue(maxsize=1)
@@ -202,8 +303,23 @@ class GalleryView:
         self.fps_start = time.time()
         self.fps_counter = 0
         self.current_fps = 0
+        self.capture_stats = {}
         
-        # 缓存上一帧的完整结果，用于隔帧优化
+        # 流水线状态
+        self.pipeline = None
+        self.pipeline_stats = {}
+        self.e2e_latency_ms = 0.0
+        
+        # 性能分析 (各阶段 p50/p95/p99，可叠加到中下格子)
+        profiler.configure(
+            enabled=PROFILE_ENABLED,
+            window=PROFILE_WINDOW,
+            dump_interval=PROFILE_DUMP_INTERVAL,
+            dump_dir=PROFILE_DUMP_DIR
+        )
+        self.show_profiler = PROFILE_OVERLAY
+        
+        # 缓存上一帧的完整结果 (情绪暂时缺失时按 track_id 继承)
         self.last_full_results = []
         
         # 文本显示设置
@@ -220,18 +336,23 @@ class GalleryView:
     def _tracker_worker(self):
         """
         后台追踪线程
-        负责执行耗时的 process_frame 和串口通信
+        负责执行 process_frame (选目标 / 更新测量)；电机控制和串口通信在追踪器自己的控制线程和总线线程里
         """
         while self.running:
             try:
                 # 从队列获取数据，超时等待以免死锁
                 # get() 是阻塞的，所以没有数据时线程会挂起，不占CPU
                 item = self.tracker_queue.get(timeout=0.1)
-                frame_copy, results = item
+                frame, results, frame_ref, frame_ts = item
                 
                 if self.tracker:
                     # 执行耗时的追踪和控制逻辑
-                    tracker_frame = self.tracker.process_frame(frame_copy, external_results=results)
+                    try:
+                        with profiler.span('tracker.process_frame'):
+                            tracker_frame = self.tracker.process_frame(frame, external_results=results, frame_ts=frame_ts)
+                    finally:
+                        if frame_ref is not None:
+                            frame_ref.release()
                     active_idx = self.tracker.active_target_index
                     
                     # 更新结果
@@ -394,12 +515,42 @@ class GalleryView:
         
         return effect_frame
     
-    def create_info_quadrant(self, results):
+    # 信息面板缓存的目标字段 (轻量帧缺失时沿用同一 track_id 的上一次结果)
+    UI_CACHE_FIELDS = ('track_id', 'person_id', 'emotion', 'emotion_conf', 'face')
+    
+    def create_info_quadrant(self, results, out=None):
         """
         创建左下角文本信息区域
+        out: 直接写入该图像 (组合画布上的格子视图)，None 时返回新图像
         """
-        # 创建黑色背景，使用定义的 bottom_left_width
+        panel = self.render_info_panel(self.info_panel_lines(results))
+        if out is None:
+            return panel.copy()
+        out[:] = panel
+        return out
+    
+    def render_info_panel(self, lines):
+        """
+        按文本行绘制信息面板；显示内容 (lines) 不变时直接返回上一次的图像
+        每一行用 text_sprites 缓存的文字贴图绘制
+        """
+        if self._info_panel is not None and self._info_panel[0] == lines:
+            return self._info_panel[1]
+        
+        # 黑色背景，使用定义的 bottom_left_width
         info_canvas = np.zeros((self.bottom_height, self.bottom_left_width, 3), dtype=np.uint8)
+        for text, org, scale, color, thickness in lines:
+            self.text_sprites.draw(info_canvas, text, org, scale, color, thickness)
+        self._info_panel = (lines, info_canvas)
+        profiler.incr('gallery.info_redraw')
+        return info_canvas
+    
+    def info_panel_lines(self, results):
+        """
+        信息面板要显示的文本行: ((文字, (x, y), 字号, 颜色, 线宽), ...)
+        返回值同时作为面板缓存的 key
+        """
+        ops = []
         
         # 找到要显示的目标（优先 Target，否则显示第一个人）
         target_person = None
@@ -415,9 +566,6 @@ class GalleryView:
                 target_person = results[0]
         
         # --- UI级缓存逻辑 ---
-        if not hasattr(self, 'ui_target_cache'):
-            self.ui_target_cache = {} # 初始化缓存
-
         if target_person:
             # 检查当前帧是否有有效信息
             has_emotion = bool(target_person.get('emotion'))
@@ -425,9 +573,10 @@ class GalleryView:
             
             # 如果有有效信息，更新缓存
             if has_emotion or has_face:
-                self.ui_target_cache = target_person.copy() # 深度拷贝一份作为快照
-            # 如果当前帧信息缺失（如轻量帧或丢失），且缓存里有东西，且我们认为还是同一个人（简单起见，直接用）
-            elif self.ui_target_cache:
+                # 只保存面板需要的字段作为快照 (不再复制整个结果字典)
+                self.ui_target_cache = {k: target_person.get(k) for k in self.UI_CACHE_FIELDS}
+            # 如果当前帧信息缺失（如轻量帧或丢失），且缓存里是同一个人（同一 track_id）
+            elif self.ui_target_cache and self.ui_target_cache.get('track_id') == target_person.get('track_id'):
                  # 强制把缓存里的高级属性贴给当前显示的 target_person
                  cached = self.ui_target_cache
                  if not target_person.get('emotion'):
@@ -439,10 +588,8 @@ class GalleryView:
                      target_person['person_id'] = cached.get('person_id')
 
         if len(results) == 0:
-            cv2.putText(info_canvas, "No person detected", 
-                       (30, self.bottom_height // 2),
-                       cv2.FONT_HERSHEY_SIMPLEX, 0.7, (150, 150, 150), 2)
-            return info_canvas
+            ops.append(("No person detected", (30, self.bottom_height // 2), 0.7, (150, 150, 150), 2))
+            return tuple(ops)
         
         # 显示人物信息
         y_offset = 40
@@ -468,9 +615,7 @@ class GalleryView:
             color = (0, 255, 0) if is_target else (255, 255, 255)
             
             # Line 1: ID + Conf + Target
-            cv2.putText(info_canvas, f"PERSON {person_id} ({person_conf:.0%}) {target_marker}", 
-                       (30, y_offset),
-                       cv2.FONT_HERSHEY_SIMPLEX, font_scale_base, color, 2)
+            ops.append((f"PERSON {person_id} ({person_conf:.0%}) {target_marker}", (30, y_offset), font_scale_base, color, 2))
             y_offset += line_height + 5
             
             # Line 2: Age | Emotion | Build
@@ -498,9 +643,7 @@ class GalleryView:
             
             if line2_parts:
                 line2_text = " | ".join(line2_parts)
-                cv2.putText(info_canvas, line2_text, 
-                           (50, y_offset),
-                           cv2.FONT_HERSHEY_SIMPLEX, font_scale_detail, (200, 200, 200), 1)
+                ops.append((line2_text, (50, y_offset), font_scale_detail, (200, 200, 200), 1))
                 y_offset += line_height
             
             # Line 3: Clothing (Type + Color + Conf)
@@ -544,9 +687,7 @@ class GalleryView:
                 
             if line3_parts:
                 line3_text = " | ".join(line3_parts)
-                cv2.putText(info_canvas, line3_text, 
-                           (50, y_offset),
-                           cv2.FONT_HERSHEY_SIMPLEX, font_scale_detail, (200, 200, 200), 1)
+                ops.append((line3_text, (50, y_offset), font_scale_detail, (200, 200, 200), 1))
                 y_offset += line_height
 
             # Line 4+: Description (Auto Wrap)
@@ -569,9 +710,7 @@ class GalleryView:
                         current_line = test_line
                     else:
                         # 当前行满了，绘制并换行
-                        cv2.putText(info_canvas, current_line, 
-                                   (50, y_offset),
-                                   cv2.FONT_HERSHEY_SIMPLEX, font_scale_detail, (180, 180, 180), 1)
+                        ops.append((current_line, (50, y_offset), font_scale_detail, (180, 180, 180), 1))
                         y_offset += line_height
                         current_line = word # 新行的开始
                         
@@ -581,23 +720,26 @@ class GalleryView:
                 
                 # 绘制最后一行
                 if current_line and y_offset <= self.bottom_height - 10:
-                    cv2.putText(info_canvas, current_line, 
-                               (50, y_offset),
-                               cv2.FONT_HERSHEY_SIMPLEX, font_scale_detail, (180, 180, 180), 1)
+                    ops.append((current_line, (50, y_offset), font_scale_detail, (180, 180, 180), 1))
         
-        return info_canvas
+        return tuple(ops)
 
-    def create_tracker_view(self, frame, results=None, precomputed_frame=None):
+    def create_tracker_view(self, frame, results=None, precomputed_frame=None, out=None):
         """
         创建右下角追踪器视图
         使用 AdvancedTracker 处理当前帧 (仅运行逻辑，不显示GUI)
+        out: 直接绘制到该图像 (组合画布上的格子视图)，None 时新建
         """
         # 使用 bottom_right_width (480)
         target_w = self.bottom_right_width
         target_h = self.bottom_height
         
-        # 创建纯黑背景
-        canvas = np.zeros((target_h, target_w, 3), dtype=np.uint8)
+        # 纯黑背景
+        if out is None:
+            canvas = np.zeros((target_h, target_w, 3), dtype=np.uint8)
+        else:
+            canvas = out
+            canvas[:] = 0
 
         # 注意：这里的 precomputed_frame 是从后台线程获取的最新画面
         # 如果它不为空，直接返回（或者画出来）
@@ -617,60 +759,333 @@ class GalleryView:
     def create_composite_view(self, silhouette_frame, glitch_frame, results, frame, precomputed_tracker_frame=None):
         """
         创建组合视图 (1920x1080)
+        各格子直接绘制到预分配画布的视图上，分隔线由 compositor 贴回
+        返回的画布会被轮流复用，显示完之前不会被重绘 (见 QuadrantCompositor.hold)
         """
-        # 创建主画布
-        canvas = np.zeros((self.window_height, self.window_width, 3), dtype=np.uint8)
+        comp = self.compositor
+        comp.begin()
         
         # --- 1. 上半部分 ---
         # 左上 (Silhouette) - 1440x810
-        silhouette_resized = self.resize_to_fit(silhouette_frame, self.left_width, self.top_height)
-        canvas[0:self.top_height, 0:self.left_width] = silhouette_resized
+        comp.blit_resized('silhouette', silhouette_frame)
         
         # 右上 (Glitch) - 480x810
-        glitch_resized = self.resize_to_fit(glitch_frame, self.right_width, self.top_height)
-        canvas[0:self.top_height, self.left_width:self.window_width] = glitch_resized
+        comp.blit_resized('glitch', glitch_frame)
         
         # --- 2. 下半部分 ---
         # 左下 (Info) - 960x270
-        info_area = self.create_info_quadrant(results) # 已经在内部使用了 bottom_left_width
-        canvas[self.top_height:self.window_height, 0:self.bottom_left_width] = info_area
+        # 以显示的文本行作为 key：内容不变的帧不重绘、不复制
+        lines = self.info_panel_lines(results)
+        comp.draw('info', lambda view: np.copyto(view, self.render_info_panel(lines)), key=lines)
         
         # 中下 (Blank/Black) - 480x270
-        # 默认为黑色，不需要额外操作
+        # 默认为黑色 (只需清空一次)；开启性能面板时在这里显示各阶段 p50/p95/p99
+        if self.show_profiler:
+            dropped = self.capture_stats.get('dropped', 0)
+            sched = self.analyzer.scheduler.stats()
+            extra_lines = [
+                f"FPS {self.current_fps:.1f}  E2E {self.e2e_latency_ms:.0f}ms  CAM DROP {dropped}",
+                f"AI LOAD x{sched['load_scale']:.1f}  ANALYSIS {sched['avg_frame_ms']:.0f}ms"
+            ]
+            if self.tracker is not None and self.tracker.bus is not None:
+                bus = self.tracker.bus.stats()
+                extra_lines.append(f"BUS {bus['rate_hz']:.0f}Hz  CTRL {self.tracker.control_rate:.0f}Hz  "
+                                   f"Q {bus['queue_depth']}  COALESCED {bus['coalesced']}  OVERRUN {bus['overruns']}")
+            def draw_panel(view):
+                view[:] = 0
+                profiler.draw_panel(view, extra_lines=extra_lines)
+            comp.draw('mid', draw_panel)
+        else:
+            comp.blit_resized('mid', None, key='blank')
         
         # 右下 (Tracker) - 480x270
-        # x: 1440 ~ 1920
-        tracker_view = self.create_tracker_view(frame, results=results, precomputed_frame=precomputed_tracker_frame)
-        start_x_right = self.bottom_left_width + self.bottom_mid_width # 960 + 480 = 1440
-        canvas[self.top_height:self.window_height, start_x_right:self.window_width] = tracker_view
+        # 当前只显示黑屏或 TRACKER ERROR，内容只取决于追踪器是否存在
+        comp.draw('tracker',
+                  lambda view: self.create_tracker_view(frame, results=results,
+                                                        precomputed_frame=precomputed_tracker_frame, out=view),
+                  key=('tracker', self.tracker is not None))
         
-        # --- 3. 绘制分隔线 ---
-        # 颜色
-        line_color = (80, 80, 80)
-        thickness = 2
+        # --- 3. 分隔线 (静态，贴回) ---
+        return comp.finish()
+    
+    def analyze_frame(self, frame, frame_ts=0.0, frame_seq=-1, frame_ref=None):
+        """
+        阶段 1：人物分析 (检测 / 人脸情绪 / 属性) + 结果合并 + 人物 mask
+        frame: 只读视图；frame_ref: 帧所在的池缓冲 (流水线模式)，随数据包交给渲染阶段释放
+        返回交给渲染阶段的数据包
+        """
+        # 各阶段 (人脸 / 情绪 / 体型服装) 的运行节奏由分析器里的 AnalysisScheduler 按人决定：
+        # 新来的人立即分析，移动中的人按基础间隔，静止的人很少重复分析，没轮到的阶段沿用缓存结果
+        # 特效由渲染阶段单独绘制，分析阶段只出结果
+        with profiler.span('gallery.process_frame'):
+            _, results = self.analyzer.process_frame(frame, apply_effects=False)
         
-        # 水平总线 (y=810)
-        cv2.line(canvas, (0, self.top_height), (self.window_width, self.top_height), line_color, thickness)
+        # 结果合并逻辑：按 track_id 合并上一帧的情绪信息
+        # (同一个人移动时 track_id 不变，不再需要按中心点距离猜测是谁)
+        previous = {r['track_id']: r for r in self.last_full_results
+                    if r.get('track_id') is not None}
+        for curr_r in results:
+            old_r = previous.get(curr_r.get('track_id'))
+            if old_r is None:
+                continue
+            # 关键修复：如果当前检测到了人但没检测到情绪（可能是因为运动模糊导致人脸识别失败），
+            # 从同一轨迹的上一批结果中继承情绪，而不是让它变成 None (导致显示 "Analyzing...")
+            if not curr_r.get('emotion') and old_r.get('emotion'):
+                if not curr_r.get('face'): curr_r['face'] = old_r.get('face')
+                curr_r['emotion'] = old_r['emotion']
+                curr_r['emotion_conf'] = old_r.get('emotion_conf')
         
-        # 垂直线 1: 分割左上/右上 (x=1440, y=0~810)
-        cv2.line(canvas, (self.left_width, 0), (self.left_width, self.top_height), line_color, thickness)
+        self.last_full_results = results
+
+        h, w = frame.shape[:2]
+        with profiler.span('gallery.mask'):
+            person_mask = self.analyzer.get_segmentation_mask(frame)
+            
+            if person_mask is None:
+                # 与 process_frame 取色时共用同一帧的轮廓缓存
+                person_mask = self.analyzer.get_keypoint_mask(results, h, w)
         
-        # 垂直线 2: 下半部分分割 Info/Mid (x=960, y=810~1080)
-        cv2.line(canvas, (self.bottom_left_width, self.top_height), (self.bottom_left_width, self.window_height), line_color, thickness)
+        return {
+            'seq': frame_seq,
+            'ts': frame_ts,
+            'frame': frame,
+            'frame_ref': frame_ref,
+            'results': results,
+            'person_mask': person_mask,
+        }
+    
+    def render_packet(self, packet):
+        """
+        阶段 2：追踪器交接 + OSC + 剪影/故障艺术特效 + 组合视图
+        返回交给显示阶段的数据包
+        """
+        frame = packet['frame']
+        frame_ref = packet.get('frame_ref')
+        results = packet['results']
+        person_mask = packet['person_mask']
+        
+        # frame 是只读视图，各阶段只读取，不会被标注污染，故障艺术直接使用，不再复制
+        
+        # ===== 异步追踪器逻辑 =====
+        tracker_active_idx = None
+        tracker_frame = None
         
-        # 垂直线 3: 下半部分分割 Mid/Right (x=1440, y=810~1080)
-        # 这个x正好等于 left_width，所以视觉上和垂直线1是对齐的，形成贯穿效果
-        cv2.line(canvas, (start_x_right, self.top_height), (start_x_right, self.window_height), line_color, thickness)
+        if self.tracker:
+            # 尝试将当前帧和结果放入后台队列
+            # 如果队列满了（后台还没处理完上一帧），则直接丢弃当前帧的追踪任务
+            # 这样可以保证主线程永远不卡顿
+            # 追踪器只读取帧 (调试画面画在它自己的副本上)，不再为队列复制整帧：
+            # - 无界面模式只用到帧尺寸，直接交出视图
+            # - 需要绘制调试画面时，帧必须在追踪线程处理完之前保持有效：
+            #   流水线模式下共享池缓冲 (引用计数 +1)，串行模式下帧在环形缓冲里，复制到池中
+            tracker_ref = None
+            if not self.tracker.headless:
+                tracker_ref = frame_ref.retain() if frame_ref is not None else self.frame_pool.copy_from(frame)
+            try:
+                self.tracker_queue.put_nowait((tracker_ref.array if tracker_ref else frame, results, tracker_ref, packet['ts']))
+            except queue.Full:
+                # 队列满，说明机械臂忙，跳过
+                if tracker_ref is not None:
+                    tracker_ref.release()
+            
+            # 获取最新的追踪结果（哪怕是上一帧的）
+            with self.tracker_lock:
+                 tracker_active_idx = self.latest_tracker_result['active_idx']
+                 tracker_frame = self.latest_tracker_result['frame']
+            
+            # 标记 results 中的目标
+            if tracker_active_idx is not None:
+                for i, res in enumerate(results):
+                    if i == tracker_active_idx:
+                        res['is_target'] = True
+                    else:
+                        res['is_target'] = False
 
-        return canvas
+        # 更新 OSC (根据当前追踪目标)
+        with profiler.span('gallery.osc'):
+            self.update_osc(results, tracker_active_idx)
+        
+        # 左侧：黑色格子
+        # 使用 analyzer.apply_visual_effects 并传入 mask 和 target_idx
+        # 剪影特效要在背景上绘制，从池中取一块缓冲 (copy-on-write，不再每帧分配整帧数组)
+        effect_ref = self.frame_pool.acquire(frame.shape, frame.dtype)
+        with profiler.span('gallery.silhouette'):
+            silhouette_frame = self.analyzer.apply_visual_effects(
+                frame, results, 
+                person_mask=person_mask, 
+                target_person_idx=tracker_active_idx,
+                out=effect_ref.buffer
+            )
+        
+        # 右侧：故障艺术 (Glitch Art)
+        # 传入 tracker_active_idx，让右上角只显示被追踪的人
+        # create_glitch_frame(frame, results, target_person_idx=None)
+        glitch_frame = self.glitch_effect.create_glitch_frame(
+            frame, 
+            results, 
+            target_person_idx=tracker_active_idx
+        )
+        
+        # ===== 创建组合视图 =====
+        # 注意：tracker_frame 已经生成了，传给 create_composite_view 避免重复计算
+        with profiler.span('gallery.composite'):
+            composite = self.create_composite_view(silhouette_frame, glitch_frame, results, frame, precomputed_tracker_frame=tracker_frame)
+        
+        # 组合画布已经拷贝了各格子的内容，帧缓冲可以回收
+        effect_ref.release()
+        if frame_ref is not None:
+            frame_ref.release()
+        
+        return {
+            'seq': packet['seq'],
+            'ts': packet['ts'],
+            'composite': composite,
+        }
+    
+    def display_packet(self, packet):
+        """
+        阶段 3：显示 (OpenCV 窗口必须在主线程)
+        返回 False 表示用户要求退出
+        """
+        # 计算FPS
+        self.fps_counter += 1
+        if time.time() - self.fps_start > 1.0:
+            self.current_fps = self.fps_counter / (time.time() - self.fps_start)
+            self.fps_counter = 0
+            self.fps_start = time.time()
+            # 采集统计 (采集帧率 / 丢帧数 / 帧龄)
+            self.capture_stats = self.cap.get_stats()
+            if self.pipeline is not None:
+                self.pipeline_stats = self.pipeline.stats()
+        
+        # 端到端延迟：采集时间戳 -> 显示
+        if packet['ts']:
+            self.e2e_latency_ms = (time.time() - packet['ts']) * 1000.0
+            profiler.record('gallery.e2e_latency', self.e2e_latency_ms / 1000.0)
+        
+        self.frames_displayed += 1
+        
+        if self.headless:
+            # 无窗口模式：只保留最后一帧组合画面 (画布会被复用，需要保存时请自行复制)
+            self.last_composite = packet['composite']
+            profiler.maybe_dump()
+            return self.max_frames is None or self.frames_displayed < self.max_frames
+        
+        # 显示画面 (imshow 期间画布不会被渲染线程重绘)
+        with profiler.span('gallery.imshow'):
+            self.compositor.hold(packet['composite'])
+            cv2.imshow('Gallery View', packet['composite'])
+            self.compositor.release()
+            
+            # 键盘控制
+            key = cv2.waitKey(1) & 0xFF
+        
+        profiler.maybe_dump()
+        
+        if key == ord('p'):
+            # 切换性能面板
+            self.show_profiler = not self.show_profiler
+        
+        return key != ord('q')
+    
+    def _run_serial(self):
+        """串行模式：读帧 -> 分析 -> 渲染 -> 显示 依次执行"""
+        while self.running:
+            # 读取最新帧（采集线程已完成镜像翻转）
+            # frame 指向环形缓冲，在下一次 read() 之前有效
+            ret, frame, frame_ts, frame_seq = self.cap.read()
+
+            if not ret:
+                # read() 超时只说明暂时没有新帧 (首帧慢 / USB 短暂卡顿)，采集线程停止才退出
+                if self.cap.running:
+                    # 没有新画面时也要处理窗口事件
+                    if not self.headless and cv2.waitKey(1) & 0xFF == ord('q'):
+                        break
+                    continue
+                print("✗ 无法读取帧")
+                break
+            
+            # 串行模式下渲染在下一次 read() 之前完成，直接使用环形缓冲的只读视图，不复制
+            with profiler.span('stage.analysis'):
+                packet = self.analyze_frame(readonly_view(frame), frame_ts, frame_seq)
+            with profiler.span('stage.render'):
+                packet = self.render_packet(packet)
+            if not self.display_packet(packet):
+                break
+    
+    def _pipeline_analysis_stage(self, _):
+        """流水线首级：从采集线程取最新帧并分析"""
+        ret, frame, frame_ts, frame_seq = self.cap.read(timeout=0.5)
+        if not ret:
+            return None
+        # 环形缓冲的槽位只在下一次 read() 之前有效，而渲染阶段会持有这一帧更久，
+        # 所以复制一次到池中的缓冲；之后渲染/追踪线程共享这块缓冲的只读视图
+        frame_ref = self.frame_pool.copy_from(frame)
+        with profiler.span('stage.analysis'):
+            return self.analyze_frame(frame_ref.array, frame_ts, frame_seq, frame_ref=frame_ref)
+    
+    def _pipeline_render_stage(self, packet):
+        """流水线第二级：特效和组合视图"""
+        with profiler.span('stage.render'):
+            return self.render_packet(packet)
+    
+    @staticmethod
+    def _release_packet(packet):
+        """流水线丢弃的数据包：归还它持有的帧缓冲"""
+        frame_ref = packet.get('frame_ref') if isinstance(packet, dict) else None
+        if frame_ref is not None:
+            frame_ref.release()
+    
+    def _run_pipelined(self):
+        """
+        流水线模式：分析线程 -> 渲染线程 -> 主线程显示
+        级间只保留最新数据包，GPU 推理和 OpenCV 绘制重叠执行
+        """
+        self.pipeline = StagedPipeline([
+            ('analysis', self._pipeline_analysis_stage),
+            ('render', self._pipeline_render_stage),
+        ], policy=self.pipeline_policy, on_drop=self._release_packet)
+        self.pipeline.start()
+        print(f"✓ 流水线已启动 (analysis -> render -> display, 策略: {self.pipeline_policy})")
+        
+        drain_deadline = None
+        try:
+            while self.running:
+                packet = self.pipeline.get(timeout=0.1)
+                if packet is None:
+                    if not self.cap.running:
+                        # 采集结束后再等一会儿，把仍在流水线里的包显示完 (回放结尾)
+                        if drain_deadline is None:
+                            drain_deadline = time.time() + 1.0
+                        elif time.time() > drain_deadline:
+                            print("✗ 无法读取帧")
+                            break
+                        continue
+                    if not self.pipeline.alive:
+                        print("✗ 流水线线程异常退出")
+                        break
+                    # 没有新画面时也要处理窗口事件
+                    if not self.headless and cv2.waitKey(1) & 0xFF == ord('q'):
+                        break
+                    continue
+                
+                if not self.display_packet(packet):
+                    break
+        finally:
+            self.pipeline.stop()
     
-    def run(self):
-        """运行系统"""
+    def run(self, max_frames=None):
+        """
+        运行系统
+        max_frames: 无窗口模式下显示多少帧后退出 (None = 直到回放源结束)
+        """
+        self.max_frames = max_frames
         print("\n" + "=" * 60)
         print("系统启动")
         print("=" * 60)
         print("\n控制键:")
         print("  'q' - 退出")
+        print("  'p' - 显示/隐藏性能面板")
         print("=" * 60)
         print()
         
@@ -681,212 +1096,20 @@ class GalleryView:
             self.osc.set_value('Bg', 1.0)
             self.osc.update()
         
+        # 左上角使用剪影特效 (分析阶段调用 process_frame 时不绘制特效)
+        self.analyzer.enable_effects = True
+        self.analyzer.effect_mode = 'silhouette'
+        
         # 创建全屏窗口
-        cv2.namedWindow('Gallery View', cv2.WINDOW_NORMAL)
-        cv2.resizeWindow('Gallery View', self.window_width, self.window_height)
+        if not self.headless:
+            cv2.namedWindow('Gallery View', cv2.WINDOW_NORMAL)
+            cv2.resizeWindow('Gallery View', self.window_width, self.window_height)
         
         try:
-            while self.running:
-                # --- 性能诊断计时开始 ---
-                t_start = time.time()
-
-                # 读取帧
-                ret, frame = self.cap.read()
-                t_read = time.time()
-
-                if not ret:
-                    print("✗ 无法读取帧")
-                    break
-                
-                # 镜像翻转摄像头画面
-                frame = cv2.flip(frame, 1)
-                
-                # 保存一份纯净的帧用于故障艺术效果（避免被 analyzer 的标注污染）
-                clean_frame = frame.copy()
-                
-                # ===== 1. 人物分析 (用于左上、右上、左下) =====
-                self.analyzer.enable_effects = False
-                
-                # --- AI 隔帧优化策略 ---
-                # 每 3 帧运行一次耗时的人脸和情绪分析
-                run_heavy_ai = (self.fps_counter % 3 == 0)
-                
-                self.analyzer.face_enabled = run_heavy_ai
-                self.analyzer.emotion_enabled = run_heavy_ai
-                
-                _, results = self.analyzer.process_frame(frame)
-                t_analysis = time.time()
-                
-                # 结果合并逻辑：如果是轻量帧，合并上一帧的人脸信息
-                if run_heavy_ai:
-                    # 关键修复：如果当前（Heavy AI帧）检测到了人但没检测到情绪（可能是因为运动模糊导致人脸识别失败），
-                    # 尝试从上一批缓存结果中继承情绪，而不是让它变成 None (导致显示 "Analyzing...")
-                    if hasattr(self, 'last_full_results') and self.last_full_results:
-                        for curr_r in results:
-                            # 如果当前结果没有情绪信息
-                            if not curr_r.get('emotion'):
-                                # 尝试在旧结果中找匹配
-                                curr_box = curr_r.get('bbox')
-                                if not curr_box: continue
-                                cx = (curr_box[0] + curr_box[2]) / 2
-                                cy = (curr_box[1] + curr_box[3]) / 2
-                                
-                                best_match = None
-                                min_dist = 300.0 
-                                
-                                for old_r in self.last_full_results:
-                                    old_box = old_r.get('bbox')
-                                    if not old_box: continue
-                                    ox = (old_box[0] + old_box[2]) / 2
-                                    oy = (old_box[1] + old_box[3]) / 2
-                                    dist = ((cx - ox)**2 + (cy - oy)**2)**0.5
-                                    if dist < min_dist:
-                                        min_dist = dist
-                                        best_match = old_r
-                                
-                                # 如果找到了之前的匹配，且之前有情绪，就继承过来
-                                if best_match and best_match.get('emotion'):
-                                    if not curr_r.get('face'): curr_r['face'] = best_match.get('face')
-                                    curr_r['emotion'] = best_match['emotion']
-                                    curr_r['emotion_conf'] = best_match.get('emotion_conf')
-                                    if 'person_id' in best_match and 'person_id' not in curr_r:
-                                        curr_r['person_id'] = best_match['person_id']
-
-                    self.last_full_results = results
-                elif hasattr(self, 'last_full_results') and self.last_full_results:
-                    # 改进的匹配策略：
-                    # 1. 如果只有 1 个人，直接无脑继承上一帧的第 1 个结果 (最稳定)
-                    # 2. 如果有多人，才使用距离匹配
-                    
-                    if len(results) == 1 and len(self.last_full_results) >= 1:
-                        # 单人模式：直接继承，解决快速移动时的闪烁问题
-                        curr_r = results[0]
-                        old_r = self.last_full_results[0] # 假设主要目标也是第一个
-                        
-                        if 'face' in old_r: curr_r['face'] = old_r['face']
-                        if 'emotion' in old_r: curr_r['emotion'] = old_r['emotion']
-                        if 'emotion_conf' in old_r: curr_r['emotion_conf'] = old_r['emotion_conf']
-                        if 'person_id' in old_r and 'person_id' not in curr_r: 
-                            curr_r['person_id'] = old_r['person_id']
-                    else:
-                        # 多人模式：距离匹配
-                        for curr_r in results:
-                            curr_box = curr_r.get('bbox')
-                            if not curr_box: continue
-                            
-                            cx = (curr_box[0] + curr_box[2]) / 2
-                            cy = (curr_box[1] + curr_box[3]) / 2
-                            
-                            best_match = None
-                            min_dist = 300.0 # 像素阈值
-                            
-                            for old_r in self.last_full_results:
-                                old_box = old_r.get('bbox')
-                                if not old_box: continue
-                                ox = (old_box[0] + old_box[2]) / 2
-                                oy = (old_box[1] + old_box[3]) / 2
-                                dist = ((cx - ox)**2 + (cy - oy)**2)**0.5
-                                if dist < min_dist:
-                                    min_dist = dist
-                                    best_match = old_r
-                            
-                            if best_match:
-                                if 'face' in best_match: curr_r['face'] = best_match['face']
-                                if 'emotion' in best_match: curr_r['emotion'] = best_match['emotion']
-                                if 'emotion_conf' in best_match: curr_r['emotion_conf'] = best_match['emotion_conf']
-                                if 'person_id' in best_match and 'person_id' not in curr_r: 
-                                    curr_r['person_id'] = best_match['person_id']
-
-                h, w = frame.shape[:2]
-                person_mask = self.analyzer.get_segmentation_mask(frame)
-                
-                if person_mask is None:
-                    person_mask = np.zeros((h, w), dtype=np.uint8)
-                    for r in results:
-                        bbox = r.get('bbox')
-                        keypoints = r.get('keypoints')
-                        person_silhouette = self.analyzer.create_person_silhouette_from_keypoints(
-                            keypoints, bbox, h, w
-                        )
-                        person_mask = cv2.bitwise_or(person_mask, person_silhouette)
-                
-                t_mask = time.time()
-
-                # ===== 2. 异步追踪器逻辑 =====
-                tracker_active_idx = None
-                tracker_frame = None
-                
-                if self.tracker:
-                    # 尝试将当前帧和结果放入后台队列
-                    # 如果队列满了（后台还没处理完上一帧），则直接丢弃当前帧的追踪任务
-                    # 这样可以保证主线程永远不卡顿
-                    try:
-                        # 放入队列，frame 需要 copy 吗？因为 process_frame 会画图
-                        # 为了安全，copy 一份。或者如果 process_frame 只是读取，那就算了
-                        # AdvancedTracker.process_frame 会在图上画框，所以必须 copy
-                        # 否则会污染主线程显示的画面
-                        self.tracker_queue.put_nowait((frame.copy(), results))
-                    except queue.Full:
-                        # 队列满，说明机械臂忙，跳过
-                        pass
-                    
-                    # 获取最新的追踪结果（哪怕是上一帧的）
-                    with self.tracker_lock:
-                         tracker_active_idx = self.latest_tracker_result['active_idx']
-                         tracker_frame = self.latest_tracker_result['frame']
-                    
-                    # 标记 results 中的目标
-                    if tracker_active_idx is not None:
-                        for i, res in enumerate(results):
-                            if i == tracker_active_idx:
-                                res['is_target'] = True
-                            else:
-                                res['is_target'] = False
-
-                # 更新 OSC (根据当前追踪目标)
-                self.update_osc(results, tracker_active_idx)
-                t_tracker = time.time()
-                
-                # 左侧：黑色格子
-                self.analyzer.enable_effects = True
-                self.analyzer.effect_mode = 'silhouette'
-                # 使用 analyzer.apply_visual_effects 并传入 mask 和 target_idx
-                silhouette_frame = self.analyzer.apply_visual_effects(
-                    frame, results, 
-                    person_mask=person_mask, 
-                    target_person_idx=tracker_active_idx
-                )
-                
-                # 右侧：故障艺术 (Glitch Art)
-                # 传入 tracker_active_idx，让右上角只显示被追踪的人
-                # create_glitch_frame(frame, results, target_person_idx=None)
-                glitch_frame = self.glitch_effect.create_glitch_frame(
-                    clean_frame, 
-                    results, 
-                    target_person_idx=tracker_active_idx
-                )
-                t_effects = time.time()
-                
-                # ===== 3. 创建组合视图 =====
-                # 注意：tracker_frame 已经生成了，传给 create_composite_view 避免重复计算
-                composite = self.create_composite_view(silhouette_frame, glitch_frame, results, frame, precomputed_tracker_frame=tracker_frame)
-                t_composite = time.time()
-                
-                # 计算FPS
-                self.fps_counter += 1
-                if time.time() - self.fps_start > 1.0:
-                    self.current_fps = self.fps_counter / (time.time() - self.fps_start)
-                    self.fps_counter = 0
-                    self.fps_start = time.time()
-                
-                # 显示画面
-                cv2.imshow('Gallery View', composite)
-                
-                # 键盘控制
-                key = cv2.waitKey(1) & 0xFF
-                
-                if key == ord('q'):
-                    break
+            if self.pipeline_enabled:
+                self._run_pipelined()
+            else:
+                self._run_serial()
         
         except KeyboardInterrupt:
             print("\n用户中断")
@@ -920,6 +1143,13 @@ class GalleryView:
 
         if self.cap:
             self.cap.release()
+        
+        # 退出前导出一次性能统计
+        if PROFILE_ENABLED and PROFILE_DUMP_INTERVAL:
+            try:
+                profiler.dump(PROFILE_DUMP_DIR)
+            except Exception as e:
+                print(f"⚠ 性能数据导出失败: {e}")
             
         # 等待追踪线程结束
         if hasattr(self, 'tracker_thread') and self.tracker_thread.is_alive():
@@ -929,7 +1159,8 @@ class GalleryView:
         if self.tracker:
             self.tracker.close()
             
-        cv2.destroyAllWindows()
+        if not self.headless:
+            cv2.destroyAllWindows()
         print("✓ 系统已关闭")
 
 if __name__ == "__main__":
@@ -11,10 +11,17 @@ import cv2
 import numpy as np
 import torch
 from ultralytics import YOLO
-from sklearn.cluster import KMeans
 import time
 import os
-import random
+
+import color_engine
+from person_tracker import PersonTracker
+from silhouette import SilhouetteCache, rasterize_silhouette
+from face_roi import face_box_from_keypoints, face_may_be_visible
+from ai_scheduler import AnalysisScheduler
+from inference_backend import (BACKENDS, PRECISIONS, MODEL_NAMES, backend_available, resolve_model_path,
+                               RuntimeSession, YoloRuntimeModel, RuntimeEmotionRecognizer)
+from profiler import profiler
 
 # TensorFlow GPU Memory Growth (Prevent DeepFace from hogging all VRAM)
 try:
@@ -72,6 +79,7 @@ def suppress_stderr():
 try:
     import insightface
     from insightface.app import FaceAnalysis
+    from insightface.app.common import Face
     INSIGHTFACE_AVAILABLE = True
 except ImportError:
     print("Warning: InsightFace not installed.")
@@ -97,10 +105,58 @@ except ImportError:
 DEEPFACE_AVAILABLE = False
 FER_AVAILABLE = False
 
+# Screen 混合查找表 (uint8 整数运算，四舍五入): result = 255 - (255 - base) * (255 - overlay) / 255
+# 按 (base << 8) | overlay 索引；overlay = 0 时结果等于 base，所以混合区域可以放心合并扩大
+_screen_base = np.arange(256, dtype=np.int32)[:, None]
+_screen_over = np.arange(256, dtype=np.int32)[None, :]
+SCREEN_LUT = (255 - ((255 - _screen_base) * (255 - _screen_over) + 127) // 255).astype(np.uint8).ravel()
+del _screen_base, _screen_over
+
+
+def screen_blend_inplace(base, overlay):
+    """base = screen(base, overlay)，两者为同尺寸 uint8 图像 (可以是大图中的区域视图)"""
+    base[...] = SCREEN_LUT[(base.astype(np.uint16) << 8) | overlay]
+
+
+def merge_rects(rects):
+    """把相交的 (x1, y1, x2, y2) 矩形合并成外接矩形，直到互不相交"""
+    merged = []
+    for rect in rects:
+        x1, y1, x2, y2 = rect
+        if x2 <= x1 or y2 <= y1:
+            continue
+        changed = True
+        while changed:
+            changed = False
+            for other in merged:
+                ox1, oy1, ox2, oy2 = other
+                if x1 < ox2 and ox1 < x2 and y1 < oy2 and oy1 < y2:
+                    merged.remove(other)
+                    x1, y1, x2, y2 = min(x1, ox1), min(y1, oy1), max(x2, ox2), max(y2, oy2)
+                    changed = True
+                    break
+        merged.append((x1, y1, x2, y2))
+    return merged
+
 class CompletePersonFaceAnalyzer:
     """Complete person and face analysis with all attributes"""
     
-    def __init__(self, show_keypoints=True, show_skeleton=True):
+    def __init__(self, show_keypoints=True, show_skeleton=True, detection_mode='separate',
+                 backend='torch', precision='fp32', num_threads=0):
+        """
+        Args:
+            detection_mode: 检测模式
+                'separate'  - Pose 和 Seg 两个模型各自预处理、各自推理 (原行为)
+                'fused'     - 每帧只做一次 letterbox/归一化，Pose 和 Seg 共享同一个输入张量
+                'pose_only' - 只跑一次 Pose 推理，mask 由关键点轮廓生成 (CPU 最省)
+            backend: Pose / Seg / 情绪模型的推理后端 (见 inference_backend.py)
+                'torch'    - ultralytics .pt + HSEmotion (PyTorch，原行为)
+                'onnx'     - ONNX Runtime CPU，加载 tools/export_models.py 导出的模型
+                'openvino' - OpenVINO CPU
+                找不到导出的模型时该模型回退 PyTorch
+            precision: 'fp32' / 'int8' (仅 onnx / openvino)
+            num_threads: 推理线程数 (0 = 运行时默认)
+        """
         print("=" * 60)
         print("Complete Person + Face Analysis System")
         print("ALL ATTRIBUTES: Age, Emotion")
@@ -115,32 +171,74 @@ class CompletePersonFaceAnalyzer:
         self.show_keypoints = show_keypoints
         self.show_skeleton = show_skeleton
         
+        if detection_mode not in ('separate', 'fused', 'pose_only'):
+            print(f"  ⚠ Unknown detection_mode '{detection_mode}', using 'separate'")
+            detection_mode = 'separate'
+        self.detection_mode = detection_mode
+        print(f"Detection mode: {self.detection_mode}")
+        
+        if backend not in BACKENDS:
+            print(f"  ⚠ Unknown backend '{backend}', using 'torch'")
+            backend = 'torch'
+        elif not backend_available(backend):
+            print(f"  ⚠ {backend} runtime not installed, using 'torch'")
+            backend = 'torch'
+        if precision not in PRECISIONS:
+            print(f"  ⚠ Unknown precision '{precision}', using 'fp32'")
+            precision = 'fp32'
+        self.backend = backend
+        self.precision = precision
+        self.num_threads = num_threads
+        if num_threads:
+            torch.set_num_threads(num_threads)
+        print(f"Inference backend: {self.backend} ({self.precision}, threads: {num_threads or 'auto'})")
+        # ONNX/OpenVINO 模型的预处理结果按帧缓存，Pose 和 Seg 共享 (与 fused 模式无关)
+        self._runtime_input_cache = None  # (frame, frame_counter, input_hw, blob, transform)
+        
+        # 降采样推理：长边缩放到该尺寸后再送入所有模型 (None = 使用原始分辨率)
+        # 检测框/关键点/mask 会映射回采集坐标，下游绘制和取色仍使用全分辨率
+        self.inference_long_edge = None
+        self._inference_frame_cache = None  # (frame, frame_counter, small_frame, scale)
+        
+        # 人脸区域来源: 'detect'    - InsightFace 整帧检测 + 全部属性模型
+        #               'keypoints' - 由姿态关键点推算人脸框，只跑年龄模型 (见 face_roi.py)，
+        #                             每 face_detect_every_n 次或关键点不可靠时回退整帧检测
+        self.face_roi_mode = 'detect'
+        self.face_detect_every_n = 15
+        self._frames_since_face_detect = 0
+        
+        # 每帧各阶段耗时 (秒)，用于分辨率报告和调试
+        self.stage_times = {}
+        
+        # 服装主色提取模式: 'mean' / 'histogram' / 'kmeans' (见 color_engine.py)
+        self.color_mode = 'mean'
+        self.color_clusters = 3  # histogram 模式的候选簇数
+        
+        # fused 模式：共享输入张量的边长 (与 ultralytics 默认 imgsz 一致)
+        self.fused_imgsz = 640
+        self._shared_input_cache = None  # (frame, frame_counter, tensor, transform)
+        
         # Load YOLOv8-Pose
         print("Loading YOLOv8-Pose for body detection...")
-        # Suppress libpng warnings during model loading
-        with suppress_stderr():
-            pose_path = 'models/yolov8n-pose.pt'
-            if not os.path.exists(pose_path): pose_path = 'yolov8n-pose.pt'
-            self.yolo_model = YOLO(pose_path)
-        if self.device.type == 'cuda':
-            self.yolo_model.to(self.device)
-        print("  ✓ YOLOv8-Pose loaded!")
-        
-        # Load YOLOv8-Seg for accurate person segmentation (for visual effects)
-        print("Loading YOLOv8-Seg for person segmentation...")
-        try:
+        self.yolo_model = self._load_runtime_model('pose')
+        if self.yolo_model is None:
+            # Suppress libpng warnings during model loading
             with suppress_stderr():
-                seg_path = 'models/yolov8n-seg.pt'
-                if not os.path.exists(seg_path): seg_path = 'yolov8n-seg.pt'
-                self.yolo_seg_model = YOLO(seg_path)
+                pose_path = 'models/yolov8n-pose.pt'
+                if not os.path.exists(pose_path): pose_path = 'yolov8n-pose.pt'
+                self.yolo_model = YOLO(pose_path)
             if self.device.type == 'cuda':
-                self.yolo_seg_model.to(self.device)
-            print("  ✓ YOLOv8-Seg loaded!")
-            self.segmentation_enabled = True
-        except Exception as e:
-            print(f"  ⚠ YOLOv8-Seg failed to load: {e}")
-            print("  → Visual effects will use keypoint-based silhouette")
+                self.yolo_model.to(self.device)
+            print("  ✓ YOLOv8-Pose loaded!")
+        
+        # Load YOLOv8-Seg for accurate person segmentation (for visual effects)
+        if self.detection_mode == 'pose_only':
+            # 单次推理模式：不加载分割模型，mask 由关键点轮廓生成
+            print("Skipping YOLOv8-Seg (pose_only mode, keypoint silhouettes)")
+            self.yolo_seg_model = None
             self.segmentation_enabled = False
+        else:
+            self._load_seg_model()
         
         # Load MiDaS for depth estimation (for depth-based visual effects)
         # 深度模式已注释
@@ -215,7 +313,10 @@ class CompletePersonFaceAnalyzer:
             self.face_enabled = False
         
         # Load HSEmotion for emotion recognition
-        if HSEMOTION_AVAILABLE:
+        self.emotion_detector = self._load_runtime_model('emotion')
+        if self.emotion_detector is not None:
+            self.emotion_enabled = True
+        elif HSEMOTION_AVAILABLE:
             print("Loading HSEmotion for emotion recognition...")
             try:
                 # 使用推荐的模型 (支持 GPU)
@@ -276,10 +377,18 @@ class CompletePersonFaceAnalyzer:
         }
         
         # Performance settings
-        self.process_every_n_frames = 10  # 从5改到10，提升性能
-        self.emotion_every_n_frames = 10  # Emotion slower
+        # 重型分析调度：每帧按人、按阶段决定是否运行 (新人立即分析，静止的人很少重复分析)
+        # 基础间隔由 main.py 按 config 设置 (PROCESS_EVERY_N_FRAMES / EMOTION_EVERY_N_FRAMES / FACE_EVERY_N_FRAMES)
+        self.scheduler = AnalysisScheduler()
         self.frame_counter = 0
-        self.cached_results = {}
+        self.cached_results = {}  # track_id: 缓存的属性
+        
+        # 人物身份追踪：缓存和平滑历史都以 track_id 为键，人物移动不会产生新身份
+        # 置信度在 low_conf ~ high_conf 之间的检测只用于维持已有轨迹 (ByteTrack 式两阶段匹配)
+        self.person_tracker = PersonTracker(high_conf=0.75, low_conf=0.3)
+        
+        # 关键点轮廓：只在人物 ROI 内绘制，按 track_id 缓存本帧结果 (取色、特效回退 mask、GalleryView 共用)
+        self.silhouette_cache = SilhouetteCache(scale=1.0)
         
         # Age smoothing - 保存最近N次年龄检测结果
         self.age_history = {}  # person_id: [age1, age2, ...]
@@ -314,6 +423,8 @@ class CompletePersonFaceAnalyzer:
         self.ascii_grid_size = 8  # 字符大小和密度（更小=更密集）
         self.ascii_threshold = 20  # 亮度阈值（更低=更多字符，包括暗色衣服）
         self.ascii_chars = ['0', '1']  # 使用的字符
+        self.ascii_background_chars = ['.', ':', '-', '=', '+', '*', '#', '%', '@', '~', '^', '&']  # 背景字符集（复杂符号）
+        self._ascii_atlas = None  # (key, tiles) 预渲染的字符图块
         
         # 扫描线效果（每个人物独立的扫描线）
         self.scan_line_positions = {}  # person_id: y_position
@@ -323,6 +434,10 @@ class CompletePersonFaceAnalyzer:
         self.scan_line_color = (255, 255, 255)  # 扫描线颜色（白色）
         self.scan_line_trail_frames = 8  # 残影保留帧数
         self.scan_line_blur_radius = 15  # 残影模糊半径
+        self.enable_scan_line = False  # 是否在剪影模式中绘制扫描线 (main.py 按 config.SCAN_LINE_ENABLED 设置)
+        self._scan_layer = None  # 扫描线图层 (复用，只在脏矩形内清零)
+        self._scan_trail_buffers = {}  # person_id: 残影缓冲 (复用，避免每帧重新分配)
+        self._scan_last_seen = {}  # person_id: 最后一次绘制扫描线的帧 (未启用追踪时按它清理)
         
         print("=" * 60)
         print("Features:")
@@ -373,21 +488,212 @@ class CompletePersonFaceAnalyzer:
         
         print("=" * 60)
     
+    def _load_seg_model(self):
+        """Load YOLOv8-Seg for accurate person segmentation (for visual effects)"""
+        print("Loading YOLOv8-Seg for person segmentation...")
+        self.yolo_seg_model = self._load_runtime_model('seg')
+        if self.yolo_seg_model is not None:
+            self.segmentation_enabled = True
+            return
+        try:
+            with suppress_stderr():
+                seg_path = 'models/yolov8n-seg.pt'
+                if not os.path.exists(seg_path): seg_path = 'yolov8n-seg.pt'
+                self.yolo_seg_model = YOLO(seg_path)
+            if self.device.type == 'cuda':
+                self.yolo_seg_model.to(self.device)
+            print("  ✓ YOLOv8-Seg loaded!")
+            self.segmentation_enabled = True
+        except Exception as e:
+            print(f"  ⚠ YOLOv8-Seg failed to load: {e}")
+            print("  → Visual effects will use keypoint-based silhouette")
+            self.yolo_seg_model = None
+            self.segmentation_enabled = False
+
+    def _load_runtime_model(self, kind):
+        """
+        加载 ONNX / OpenVINO 版本的模型 ('pose' / 'seg' / 'emotion')
+        torch 后端、找不到导出文件或加载失败时返回 None，由调用方回退 PyTorch
+        """
+        if self.backend == 'torch':
+            return None
+        path, precision = resolve_model_path(kind, self.backend, self.precision)
+        if path is None:
+            print(f"  ⚠ {MODEL_NAMES[kind]} not exported for {self.backend} "
+                  f"(run tools/export_models.py), using PyTorch")
+            return None
+        if precision != self.precision:
+            print(f"  ⚠ {MODEL_NAMES[kind]} has no {self.precision} variant, using {precision}")
+        try:
+            session = RuntimeSession(path, self.backend, self.num_threads)
+        except Exception as e:
+            print(f"  ⚠ {path} failed to load: {e}")
+            print("  → Using PyTorch")
+            return None
+        print(f"  ✓ {os.path.basename(path)} loaded! ({self.backend}, {precision})")
+        if kind == 'emotion':
+            return RuntimeEmotionRecognizer(session)
+        return YoloRuntimeModel(session, kind, imgsz=self.fused_imgsz)
+
+    def _runtime_input(self, model, frame):
+        """ONNX/OpenVINO 模型的输入 (blob, transform)，同一帧、同一输入尺寸只预处理一次"""
+        cache = self._runtime_input_cache
+        if (cache is not None and cache[0] is frame and cache[1] == self.frame_counter
+                and cache[2] == model.input_hw):
+            return cache[3], cache[4]
+        blob, transform = model.preprocess(frame)
+        self._runtime_input_cache = (frame, self.frame_counter, model.input_hw, blob, transform)
+        return blob, transform
+
+    def _prepare_shared_input(self, frame):
+        """
+        fused 模式：对整帧只做一次 letterbox + BGR→RGB + 归一化
+        生成的 BCHW 张量同时喂给 Pose 和 Seg 模型，跳过 ultralytics 内部的重复预处理
+        返回 (tensor, (ratio, pad_left, pad_top, new_w, new_h))
+        """
+        # 采集线程的环形缓冲会复用同一个数组，所以同时比较帧计数
+        cache = self._shared_input_cache
+        if cache is not None and cache[0] is frame and cache[1] == self.frame_counter:
+            return cache[2], cache[3]
+        
+        h, w = frame.shape[:2]
+        ratio = min(self.fused_imgsz / h, self.fused_imgsz / w)
+        new_w, new_h = int(round(w * ratio)), int(round(h * ratio))
+        
+        # 最小矩形填充到 stride(32) 的倍数，与 ultralytics 的 auto letterbox 一致
+        pad_w = (32 - new_w % 32) % 32
+        pad_h = (32 - new_h % 32) % 32
+        left, top = pad_w // 2, pad_h // 2
+        
+        resized = cv2.resize(frame, (new_w, new_h), interpolation=cv2.INTER_LINEAR)
+        padded = cv2.copyMakeBorder(resized, top, pad_h - top, left, pad_w - left,
+                                    cv2.BORDER_CONSTANT, value=(114, 114, 114))
+        
+        # HWC BGR uint8 -> 1xCxHxW RGB float (0-1)
+        chw = np.ascontiguousarray(padded[:, :, ::-1].transpose(2, 0, 1))
+        tensor = torch.from_numpy(chw).to(self.device).float().div_(255.0).unsqueeze(0)
+        
+        transform = (ratio, left, top, new_w, new_h)
+        # 缓存到同一帧，get_segmentation_mask 会复用
+        self._shared_input_cache = (frame, self.frame_counter, tensor, transform)
+        return tensor, transform
+    
+    def _unletterbox_points(self, points, transform):
+        """把 letterbox 坐标 (N, 2+) 映射回原始帧坐标"""
+        ratio, left, top, _, _ = transform
+        points = points.copy()
+        points[..., 0] = (points[..., 0] - left) / ratio
+        points[..., 1] = (points[..., 1] - top) / ratio
+        return points
+    
+    def get_inference_frame(self, frame):
+        """
+        降采样推理：整帧只缩放一次，所有模型共用这张小图
+        返回 (infer_frame, (scale_x, scale_y))，scale 用于把结果映射回采集坐标
+        """
+        if not self.inference_long_edge:
+            return frame, (1.0, 1.0)
+        
+        h, w = frame.shape[:2]
+        long_edge = max(h, w)
+        if long_edge <= self.inference_long_edge:
+            return frame, (1.0, 1.0)
+        
+        cache = self._inference_frame_cache
+        if cache is not None and cache[0] is frame and cache[1] == self.frame_counter:
+            return cache[2], cache[3]
+        
+        ratio = self.inference_long_edge / long_edge
+        small_w, small_h = int(round(w * ratio)), int(round(h * ratio))
+        # INTER_AREA 下采样抗锯齿，小目标更稳定
+        small = cv2.resize(frame, (small_w, small_h), interpolation=cv2.INTER_AREA)
+        scale = (w / small_w, h / small_h)
+        
+        self._inference_frame_cache = (frame, self.frame_counter, small, scale)
+        return small, scale
+    
+    def _rescale_persons(self, persons, scale, frame_shape):
+        """把小图上的人体检测框和关键点映射回采集坐标"""
+        sx, sy = scale
+        h, w = frame_shape[:2]
+        for person in persons:
+            x1, y1, x2, y2 = person['bbox']
+            person['bbox'] = (
+                max(0, min(w, int(x1 * sx))), max(0, min(h, int(y1 * sy))),
+                max(0, min(w, int(x2 * sx))), max(0, min(h, int(y2 * sy)))
+            )
+            keypoints = person.get('keypoints')
+            if keypoints is not None:
+                keypoints = keypoints.copy()
+                keypoints[:, 0] *= sx
+                keypoints[:, 1] *= sy
+                person['keypoints'] = keypoints
+    
+    def _rescale_faces(self, faces, scale):
+        """把小图上的人脸框和关键点映射回采集坐标"""
+        sx, sy = scale
+        for face in faces:
+            fx1, fy1, fx2, fy2 = face['bbox']
+            face['bbox'] = (int(fx1 * sx), int(fy1 * sy), int(fx2 * sx), int(fy2 * sy))
+            if face.get('landmarks') is not None:
+                face['landmarks'] = (face['landmarks'] * np.array([sx, sy])).astype(int)
+    
+    def reset_state(self):
+        """清空跨帧缓存 (切换推理分辨率或重放新片段时使用)"""
+        self.frame_counter = 0
+        self.cached_results.clear()
+        if self.person_tracker is not None:
+            self.person_tracker.reset()
+        self.age_history.clear()
+        self.emotion_history.clear()
+        self.scan_line_positions.clear()
+        self.scan_line_trails.clear()
+        self._scan_trail_buffers.clear()
+        self._scan_last_seen.clear()
+        self._shared_input_cache = None
+        self._inference_frame_cache = None
+        self._runtime_input_cache = None
+        self.scheduler.reset()
+        self.stage_times = {}
+    
+    @staticmethod
+    def _person_key(person):
+        """人物的稳定标识：track_id (未启用追踪时退回按位置的网格键)"""
+        x1, y1 = person['bbox'][:2]
+        return person.get('track_id', f"{x1//50}_{y1//50}")
+    
     def detect_persons(self, frame):
         """Detect persons with pose"""
-        results = self.yolo_model(frame, verbose=False, device=self.device)
+        if isinstance(self.yolo_model, YoloRuntimeModel):
+            return self._detect_persons_runtime(frame)
+        
+        transform = None
+        if self.detection_mode == 'fused':
+            # 共享输入张量：只做一次预处理，Seg 模型同帧复用
+            model_input, transform = self._prepare_shared_input(frame)
+        else:
+            model_input = frame
+        
+        results = self.yolo_model(model_input, verbose=False, device=self.device)
         persons = []
         
         for result in results:
             if result.boxes is not None:
                 for i, box in enumerate(result.boxes):
                     # 严格过滤：只有置信度 > 0.75 才认为是有效的人
-                    if int(box.cls[0]) == 0 and float(box.conf[0]) > 0.75:
-                        x1, y1, x2, y2 = map(int, box.xyxy[0])
+                    # (启用身份追踪时保留低置信度检测，由 PersonTracker 决定是否用来维持已有轨迹)
+                    min_conf = self.person_tracker.low_conf if self.person_tracker is not None else 0.75
+                    if int(box.cls[0]) == 0 and float(box.conf[0]) > min_conf:
+                        xyxy = box.xyxy[0].cpu().numpy()
+                        if transform is not None:
+                            xyxy = self._unletterbox_points(xyxy.reshape(2, 2), transform).reshape(4)
+                        x1, y1, x2, y2 = map(int, xyxy)
                         
                         keypoints = None
                         if result.keypoints is not None and len(result.keypoints.data) > i:
                             keypoints = result.keypoints.data[i].cpu().numpy()
+                            if transform is not None:
+                                keypoints = self._unletterbox_points(keypoints, transform)
                         
                         persons.append({
                             'bbox': (x1, y1, x2, y2),
@@ -397,13 +703,45 @@ class CompletePersonFaceAnalyzer:
         
         return persons
     
-    def analyze_faces(self, frame):
-        """Analyze all faces using InsightFace"""
+    def _detect_persons_runtime(self, frame):
+        """ONNX / OpenVINO 姿态模型的 detect_persons (输出格式相同)"""
+        min_conf = self.person_tracker.low_conf if self.person_tracker is not None else 0.75
+        prepared = self._runtime_input(self.yolo_model, frame)
+        persons = []
+        # ultralytics 先按默认阈值 0.25 做 NMS，再由上面的 min_conf 过滤，这里保持同样的顺序
+        for xyxy, conf, keypoints in self.yolo_model.pose(frame, prepared=prepared):
+            if conf > min_conf:
+                x1, y1, x2, y2 = map(int, xyxy)
+                persons.append({
+                    'bbox': (x1, y1, x2, y2),
+                    'confidence': conf,
+                    'keypoints': keypoints
+                })
+        return persons
+    
+    def analyze_faces(self, frame, persons=None, infer_frame=None, infer_scale=(1.0, 1.0)):
+        """
+        Analyze all faces using InsightFace
+        frame: 采集分辨率的帧；persons: 需要分析人脸的人 (采集坐标)，face_roi_mode='keypoints' 时用来推算人脸框
+        infer_frame / infer_scale: 降采样推理小图，整帧检测在小图上运行，结果映射回采集坐标
+        """
         if not self.face_enabled or not hasattr(self, 'face_app'):
             return []
         
+        if self.face_roi_mode == 'keypoints' and persons is not None:
+            if not persons:
+                # 没有人就不会有能匹配上的人脸，不必整帧检测
+                return []
+            faces = self.analyze_faces_from_keypoints(frame, persons)
+            if faces is not None:
+                return faces
+        
+        self._frames_since_face_detect = 0
+        profiler.incr('analyzer.face_detect')
+        if infer_frame is None:
+            infer_frame = frame
         try:
-            faces = self.face_app.get(frame)
+            faces = self.face_app.get(infer_frame)
             face_results = []
             
             for face in faces:
@@ -419,11 +757,59 @@ class CompletePersonFaceAnalyzer:
                     'landmarks': landmarks
                 })
             
+            if infer_frame is not frame:
+                self._rescale_faces(face_results, infer_scale)
             return face_results
         except Exception as e:
             print(f"InsightFace error: {e}")
             return []
     
+    def analyze_faces_from_keypoints(self, frame, persons):
+        """
+        由关键点推算人脸框，只跑 genderage 模型估计年龄 (不做检测、特征提取和 106 点关键点)
+        需要回退整帧检测时返回 None：到了定期检测的时候，或者有人脸朝向镜头但关键点不可靠
+        """
+        genderage = self.face_app.models.get('genderage')
+        if genderage is None:
+            return None
+        
+        self._frames_since_face_detect += 1
+        if self.face_detect_every_n and self._frames_since_face_detect >= self.face_detect_every_n:
+            return None
+        
+        h, w = frame.shape[:2]
+        boxes = []  # (person, 人脸框)
+        for person in persons:
+            keypoints = person.get('keypoints')
+            box = face_box_from_keypoints(keypoints, h, w)
+            if box is None:
+                if face_may_be_visible(keypoints):
+                    # 鼻子大致可见但推算不出可靠的框 (侧脸、遮挡)，交给检测器
+                    return None
+                continue  # 背对镜头，整帧检测也找不到脸
+            boxes.append((person, box))
+        
+        face_results = []
+        try:
+            for person, box in boxes:
+                face = Face(bbox=np.array(box, dtype=np.float32))
+                genderage.get(frame, face)
+                face_result = {
+                    'bbox': box,
+                    'age': int(face.age),
+                    'embedding': None,
+                    'landmarks': None
+                }
+                # 人脸来自哪个人是确定的，匹配时直接使用 (多人重叠时不会配错)
+                person['keypoint_face'] = face_result
+                face_results.append(face_result)
+        except Exception as e:
+            print(f"InsightFace genderage error: {e}")
+            return None
+        
+        profiler.incr('analyzer.face_keypoints')
+        return face_results
+    
     def detect_emotion(self, face_region):
         """Detect emotion using DeepFace or FER"""
         # print(f"DEBUG: detect_emotion called. DeepFace available: {DEEPFACE_AVAILABLE}")
@@ -524,6 +910,35 @@ class CompletePersonFaceAnalyzer:
         counts = Counter(self.emotion_history[person_id])
         return counts.most_common(1)[0][0]
     
+    def predict_emotions_batch(self, pending, results):
+        """
+        批量情绪识别
+        pending: [(results 下标, person_id, 人脸区域), ...]
+        所有人脸在 HSEmotion 内部预处理后堆叠成一个 batch，只做一次 EfficientNet 前向推理，
+        结果经过 smooth_emotion 平滑后写回缓存和对应的 result
+        """
+        try:
+            face_regions = [face_region for _, _, face_region in pending]
+            # predict_multi_emotions returns (emotion_labels, scores_array)
+            emotions, scores = self.emotion_detector.predict_multi_emotions(face_regions, logits=False)
+        except Exception as e:
+            print(f"!!! HSEmotion ERROR (batch of {len(pending)}): {e}")
+            return
+        
+        for (result_idx, person_id, _), emotion, person_scores in zip(pending, emotions, scores):
+            # Find max score for confidence
+            confidence = float(max(person_scores))
+            
+            # Normalize to lowercase for consistency, then apply smoothing
+            smoothed_emotion = self.smooth_emotion(person_id, emotion.lower())
+            
+            # Update cache
+            self.cached_results[person_id]['emotion'] = smoothed_emotion
+            self.cached_results[person_id]['emotion_conf'] = confidence
+            
+            results[result_idx]['emotion'] = smoothed_emotion
+            results[result_idx]['emotion_conf'] = confidence
+    
     def analyze_body_type(self, keypoints, bbox):
         """Analyze body type from keypoints"""
         if keypoints is None or len(keypoints) < 17:
@@ -580,99 +995,63 @@ class CompletePersonFaceAnalyzer:
     
     def get_color(self, image_region, mask=None):
         """Extract dominant color using HSV + Mask filtering (More Robust)"""
-        if image_region is None or image_region.size == 0:
-            return None, 0.0
-        
         try:
-            # 1. Pre-processing: Resize for speed
-            target_size = (64, 64)
-            img_small = cv2.resize(image_region, target_size)
-            
-            # 2. Masking: Only use pixels inside the person silhouette
-            if mask is not None:
-                mask_small = cv2.resize(mask, target_size)
-                # Binarize mask
-                _, mask_bin = cv2.threshold(mask_small, 128, 255, cv2.THRESH_BINARY)
-                # Extract valid pixels (BGR)
-                pixels = img_small[mask_bin > 0]
-                
-                # If too few pixels (e.g. empty mask), fallback to whole image or return None
-                if len(pixels) < 50:
-                    # Fallback: use center crop if mask failed
-                    h, w = img_small.shape[:2]
-                    center_pixels = img_small[h//4:h*3//4, w//4:w*3//4].reshape(-1, 3)
-                    pixels = center_pixels
-            else:
-                # No mask provided, use whole image
-                pixels = img_small.reshape(-1, 3)
-            
-            if len(pixels) == 0:
-                return None, 0.0
-
-            # 3. K-Means clustering to find Dominant Color (in BGR space)
-            # n_init='auto' is default in newer sklearn, using fixed number for compatibility
-            kmeans = KMeans(n_clusters=1, random_state=42, n_init=3)
-            kmeans.fit(pixels)
-            dominant_bgr = kmeans.cluster_centers_[0].astype(int)
-            
-            # Calculate confidence based on compactness (inertia)
-            # Normalized by number of pixels
-            inertia = kmeans.inertia_
-            avg_dist = inertia / len(pixels) if len(pixels) > 0 else 0
-            # Heuristic: avg_dist < 500 is very pure, > 3000 is mixed
-            color_confidence = max(0.0, min(1.0, 1.0 - (avg_dist / 4000.0)))
-            
-            # 4. Convert Dominant Color to HSV for robust classification
-            # Create a 1x1 pixel to convert color space
-            pixel_bgr = np.uint8([[dominant_bgr]])
-            pixel_hsv = cv2.cvtColor(pixel_bgr, cv2.COLOR_BGR2HSV)[0][0]
-            
-            h_val, s_val, v_val = int(pixel_hsv[0]), int(pixel_hsv[1]), int(pixel_hsv[2])
-            
-            # === HSV Color Classification Rules ===
-            # OpenCV HSV ranges: H: 0-179, S: 0-255, V: 0-255
-            
-            # 1. Achromatic Colors (Black, White, Gray)
-            # Check saturation and value
-            
-            # Black: Very low value (dark)
-            if v_val < 40: 
-                return 'Black', color_confidence
-            
-            # White: Very low saturation AND high value (bright)
-            if s_val < 30 and v_val > 200:
-                return 'White', color_confidence
-                
-            # Gray: Low saturation, medium value
-            if s_val < 40:
-                return 'Gray', color_confidence
-            
-            # 2. Chromatic Colors (based on Hue)
-            # H values are halved degrees (0-360 -> 0-179)
-            
-            if (0 <= h_val <= 10) or (160 <= h_val <= 179):
-                return 'Red', color_confidence
-            elif 11 <= h_val <= 25:
-                return 'Orange', color_confidence
-            elif 26 <= h_val <= 35:
-                return 'Yellow', color_confidence
-            elif 36 <= h_val <= 85:
-                return 'Green', color_confidence
-            elif 86 <= h_val <= 99:
-                return 'Cyan', color_confidence
-            elif 100 <= h_val <= 130:
-                return 'Blue', color_confidence
-            elif 131 <= h_val <= 150:
-                return 'Purple', color_confidence
-            elif 151 <= h_val <= 159:
-                return 'Pink', color_confidence
-            
-            return 'Mixed', color_confidence
-            
+            return color_engine.dominant_color(image_region, mask, mode=self.color_mode,
+                                               n_clusters=self.color_clusters)
         except Exception as e:
             # print(f"Color extraction error: {e}")
             return None, 0.0
     
+    def get_colors_batch(self, regions):
+        """
+        一帧内所有 ROI 的主色
+        regions: [(image_region, mask), ...]，返回 [(label, confidence), ...]
+        'mean' 模式下所有 ROI 一次向量化计算，其他模式逐个计算
+        """
+        if self.color_mode == 'mean':
+            try:
+                return color_engine.dominant_colors_batch(regions)
+            except Exception as e:
+                # print(f"Color extraction error: {e}")
+                return [(None, 0.0)] * len(regions)
+        return [self.get_color(image_region, mask) for image_region, mask in regions]
+    
+    def apply_colors_batch(self, pending, results):
+        """
+        批量提取服装颜色
+        pending: [(results 下标, person_id, 上半身ROI, 上半身mask, 下半身ROI, 下半身mask), ...]
+        结果经过置信度过滤后写回缓存和对应的 result
+        """
+        regions = []
+        for _, _, upper_roi, upper_mask, lower_roi, lower_mask in pending:
+            regions.append((upper_roi, upper_mask))
+            regions.append((lower_roi, lower_mask))
+        colors = self.get_colors_batch(regions)
+        
+        for j, (result_idx, person_id, _, _, _, _) in enumerate(pending):
+            upper_color, upper_color_conf = colors[2 * j]
+            lower_color, lower_color_conf = colors[2 * j + 1]
+            
+            # Upper color filtering (Confidence threshold)
+            if upper_color and upper_color_conf < 0.6:
+                upper_color = None
+            
+            # Lower color filtering (Confidence threshold)
+            if lower_color and lower_color_conf < 0.6:
+                lower_color = None
+            
+            cached = self.cached_results[person_id]
+            cached['upper_color'] = upper_color
+            cached['upper_color_conf'] = upper_color_conf
+            cached['lower_color'] = lower_color
+            cached['lower_color_conf'] = lower_color_conf
+            
+            clothing = results[result_idx]['clothing']
+            clothing['upper_color'] = upper_color
+            clothing['upper_color_conf'] = upper_color_conf
+            clothing['lower_color'] = lower_color
+            clothing['lower_color_conf'] = lower_color_conf
+    
     def classify_clothing_type(self, person_roi, keypoints, upper_roi, lower_roi):
         """Classify clothing type based on visual features"""
         try:
@@ -1031,64 +1410,82 @@ class CompletePersonFaceAnalyzer:
             grid_cols = max(3, person_width // spacing)
             grid_rows = max(3, person_height // spacing)
             
-            # 在人物bbox区域内创建网格
-            for row in range(grid_rows):
-                for col in range(grid_cols):
-                    # 计算方块位置（在bbox内，使用固定间距）
-                    block_x = x1 + col * spacing + spacing // 2
-                    block_y = y1 + row * spacing + spacing // 2
-                    
-                    # 确保在bbox内
-                    if block_x < x1 or block_x >= x2 or block_y < y1 or block_y >= y2:
-                        continue
-                    
-                    # 确保坐标在图像范围内
-                    block_x = max(size, min(block_x, w - size))
-                    block_y = max(size, min(block_y, h - size))
-                    
-                    # 计算方块区域
-                    block_x1 = block_x - size // 2
-                    block_y1 = block_y - size // 2
-                    block_x2 = block_x + size // 2
-                    block_y2 = block_y + size // 2
-                    
-                    # 检查方块中心位置是在剪影内还是背景上
-                    # 采样方块中心及四个角的mask值
-                    sample_points = [
-                        (block_x, block_y),  # 中心
-                        (block_x1, block_y1),  # 左上
-                        (block_x2, block_y1),  # 右上
-                        (block_x1, block_y2),  # 左下
-                        (block_x2, block_y2),  # 右下
-                    ]
-                    
-                    mask_values = []
-                    for px, py in sample_points:
-                        px = max(0, min(int(px), w-1))
-                        py = max(0, min(int(py), h-1))
-                        mask_values.append(person_mask[py, px])
-                    
-                    # 如果多数点在剪影内（mask > 128），使用白色（如果是目标）；否则使用黑色
-                    in_silhouette = sum(1 for v in mask_values if v > 128) >= len(mask_values) // 2
-                    
-                    if in_silhouette:
-                        block_color = (255, 255, 255) if is_target else (0, 0, 0)
-                    else:
-                        block_color = (0, 0, 0)
-                    
-                    # 绘制方块（填充，无描边）
-                    cv2.rectangle(effect_frame, (block_x1, block_y1), (block_x2, block_y2), 
-                                 block_color, -1)
+            # 在人物bbox区域内创建网格 (向量化：一次算出所有格子的位置和采样结果)
+            # 方块中心需落在bbox内，再限制在图像范围内
+            cols = np.arange(grid_cols)
+            rows = np.arange(grid_rows)
+            block_xs = x1 + cols[cols * spacing + spacing // 2 < person_width] * spacing + spacing // 2
+            block_ys = y1 + rows[rows * spacing + spacing // 2 < person_height] * spacing + spacing // 2
+            if len(block_xs) == 0 or len(block_ys) == 0:
+                continue
+            block_xs = np.clip(block_xs, size, w - size)
+            block_ys = np.clip(block_ys, size, h - size)
+            
+            # 检查方块中心位置是在剪影内还是背景上
+            # 采样方块中心及四个角的mask值，多数点在剪影内（mask > 128）则视为剪影内
+            half = size // 2
+            xs = [np.clip(block_xs + d, 0, w - 1) for d in (0, -half, half)]
+            ys = [np.clip(block_ys + d, 0, h - 1) for d in (0, -half, half)]
+            votes = sum((person_mask[np.ix_(ys[r], xs[c])] > 128).astype(np.uint8)
+                        for r, c in ((0, 0), (1, 1), (1, 2), (2, 1), (2, 2)))
+            in_silhouette = votes >= 5 // 2
+            
+            # 每个像素属于哪个格子：方块按行、列顺序绘制，重叠处后画的覆盖先画的
+            # 所以像素取 覆盖它的最大行号 × 覆盖它的最大列号 对应的格子
+            px1, px2 = max(0, block_xs[0] - half), min(w - 1, block_xs[-1] + half)
+            py1, py2 = max(0, block_ys[0] - half), min(h - 1, block_ys[-1] + half)
+            col_of = self._block_cover_index(block_xs, half, px1, px2)
+            row_of = self._block_cover_index(block_ys, half, py1, py2)
+            covered = ((row_of >= 0)[:, None] & (col_of >= 0)[None, :]).view(np.uint8)
+            
+            # 格子颜色查表后按像素展开 (目标剪影内白色，其余黑色)，再按覆盖 mask 一次写回
+            if is_target:
+                block_colors = np.where(in_silhouette, 255, 0).astype(np.uint8)
+            else:
+                block_colors = np.zeros(in_silhouette.shape, dtype=np.uint8)
+            blocks = block_colors[np.maximum(row_of, 0)][:, np.maximum(col_of, 0)]
+            
+            # 绘制方块（填充，无描边）
+            region = effect_frame[py1:py2 + 1, px1:px2 + 1]
+            cv2.copyTo(cv2.cvtColor(blocks, cv2.COLOR_GRAY2BGR), covered, region)
+    
+    @staticmethod
+    def _block_cover_index(centers, half, lo, hi):
+        """
+        一维方向上 [lo, hi] 每个像素被哪个方块覆盖 (取下标最大的那个，-1 表示不在任何方块内)
+        centers 单调不减，方块覆盖 [c - half, c + half]
+        """
+        pixels = np.arange(lo, hi + 1)
+        idx = np.searchsorted(centers - half, pixels, side='right') - 1
+        hit = (idx >= 0) & (centers[np.maximum(idx, 0)] + half >= pixels)
+        return np.where(hit, idx, -1)
+    
+    def get_trail_buffer(self, person_id, height, width):
+        """取该人物的残影缓冲 (单通道，残影都是灰度)，尺寸不够时才重新分配；返回清零后的视图"""
+        buf = self._scan_trail_buffers.get(person_id)
+        if buf is None or buf.shape[0] < height or buf.shape[1] < width:
+            buf = np.zeros((max(height, 1), max(width, 1)), dtype=np.uint8)
+            self._scan_trail_buffers[person_id] = buf
+        view = buf[:height, :width]
+        view[:] = 0
+        return view
     
     def draw_scan_line(self, effect_frame, results):
         """
         在每个人物的bbox内绘制从上到下的扫描线效果（带模糊拖影）
         使用混合模式单独叠加，不影响下面的内容
+        只处理扫描线附近的条带 (脏矩形)，图层和残影缓冲跨帧复用
         """
         h, w = effect_frame.shape[:2]
         
-        # 创建单独的扫描线图层（全透明）
-        scan_layer = np.zeros((h, w, 3), dtype=np.uint8)
+        # 扫描线图层（全透明），只在脏矩形内被写入，混合后清零
+        if self._scan_layer is None or self._scan_layer.shape != effect_frame.shape:
+            self._scan_layer = np.zeros_like(effect_frame)
+        scan_layer = self._scan_layer
+        dirty = []
+        
+        radius = self.scan_line_blur_radius
+        thickness = self.scan_line_thickness
         
         for r in results:
             if 'bbox' not in r:
@@ -1096,6 +1493,7 @@ class CompletePersonFaceAnalyzer:
             
             x1, y1, x2, y2 = r['bbox']
             person_id = r.get('person_id', 0)
+            self._scan_last_seen[person_id] = self.frame_counter
             
             # 确保bbox坐标在图像范围内
             x1 = max(0, int(x1))
@@ -1130,61 +1528,70 @@ class CompletePersonFaceAnalyzer:
                 if len(self.scan_line_trails[person_id]) > self.scan_line_trail_frames:
                     self.scan_line_trails[person_id].pop(0)
             
-            # 创建临时图像用于绘制残影（只在bbox区域内）
             bbox_width = x2 - x1
             bbox_height = y2 - y1
-            if bbox_width > 0 and bbox_height > 0:
-                # 创建临时图像（只包含bbox区域）
-                trail_mask = np.zeros((bbox_height, bbox_width, 3), dtype=np.uint8)
+            trail_list = self.scan_line_trails[person_id]
+            trail_rows = [t['y'] - y1 for t in trail_list if 0 <= t['y'] - y1 < bbox_height]
+            if bbox_width > 0 and trail_rows:
+                # 模糊只影响残影线上下 radius 行，只在这个条带上做模糊；
+                # 条带再多留 radius 行空白，使条带边界的反射填充读到的都是 0，结果与整框模糊一致
+                margin = 2 * radius + thickness
+                strip_y1 = max(0, min(trail_rows) - margin)
+                strip_y2 = min(bbox_height, max(trail_rows) + margin + 1)
+                trail_mask = self.get_trail_buffer(person_id, strip_y2 - strip_y1, bbox_width)
                 
-                # 在临时图像上绘制所有残影线（白色，逐渐变淡）
-                trail_list = self.scan_line_trails[person_id]
+                # 在残影缓冲上绘制所有残影线（白色，逐渐变淡）
                 for i, trail in enumerate(trail_list):
                     # 计算透明度：越新的残影越亮
-                    alpha = (i + 1) / len(trail_list) if trail_list else 1.0
-                    # 计算颜色强度（白色）
+                    alpha = (i + 1) / len(trail_list)
                     color_intensity = int(255 * alpha)
-                    trail_color = (color_intensity, color_intensity, color_intensity)  # BGR格式，白色
                     
-                    # 计算在临时图像中的相对位置
+                    # 计算在条带中的相对位置
                     trail_y_rel = trail['y'] - y1
-                    trail_x1_rel = trail['x1'] - x1
-                    trail_x2_rel = trail['x2'] - x1
-                    
-                    # 确保在bbox范围内
                     if 0 <= trail_y_rel < bbox_height:
-                        trail_x1_rel = max(0, min(trail_x1_rel, bbox_width - 1))
-                        trail_x2_rel = max(0, min(trail_x2_rel, bbox_width - 1))
-                        cv2.line(trail_mask, (trail_x1_rel, trail_y_rel), 
-                                (trail_x2_rel, trail_y_rel), trail_color, self.scan_line_thickness)
+                        trail_x1_rel = max(0, min(trail['x1'] - x1, bbox_width - 1))
+                        trail_x2_rel = max(0, min(trail['x2'] - x1, bbox_width - 1))
+                        cv2.line(trail_mask, (trail_x1_rel, trail_y_rel - strip_y1),
+                                (trail_x2_rel, trail_y_rel - strip_y1), color_intensity, thickness)
                 
                 # 对残影应用高斯模糊（创建拖影效果）
-                if len(trail_list) > 0:
-                    blurred_trail = cv2.GaussianBlur(trail_mask, 
-                                                     (self.scan_line_blur_radius * 2 + 1, 
-                                                      self.scan_line_blur_radius * 2 + 1), 0)
-                    
-                    # 将模糊后的残影绘制到扫描线图层（不混合，直接绘制）
-                    scan_layer[y1:y2, x1:x2] = np.maximum(scan_layer[y1:y2, x1:x2], blurred_trail)
+                blurred_trail = cv2.GaussianBlur(trail_mask, (radius * 2 + 1, radius * 2 + 1), 0)
+                
+                # 将模糊后的残影绘制到扫描线图层（不混合，取最大值）
+                region = scan_layer[y1 + strip_y1:y1 + strip_y2, x1:x2]
+                np.maximum(region, blurred_trail[:, :, None], out=region)
+                dirty.append((x1, y1 + strip_y1, x2, y1 + strip_y2))
             
             # 绘制当前扫描线到扫描线图层（白色，不模糊，清晰）
             scan_y = int(self.scan_line_positions[person_id])
             if y1 <= scan_y < y2:  # 确保在bbox内
                 cv2.line(scan_layer, (x1, scan_y), (x2, scan_y), 
-                        self.scan_line_color, self.scan_line_thickness)
+                        self.scan_line_color, thickness)
+                # bbox 完全在画面外时 x2 < x1，cv2.line 仍会画出端点
+                dirty.append((max(0, min(x1, x2) - thickness), max(0, scan_y - thickness),
+                              min(w, max(x1, x2) + thickness + 1), min(h, scan_y + thickness + 1)))
         
         # 使用 Screen 混合模式叠加扫描线图层（只增亮，不影响黑色）
         # Screen 模式：result = 1 - (1 - base) * (1 - overlay)
-        # 对于白色扫描线，会增亮下面的内容，但黑色保持不变
-        scan_layer_float = scan_layer.astype(np.float32) / 255.0
-        effect_frame_float = effect_frame.astype(np.float32) / 255.0
-        
-        # Screen 混合模式
-        blended = 1.0 - (1.0 - effect_frame_float) * (1.0 - scan_layer_float)
-        blended = (blended * 255.0).astype(np.uint8)
-        
-        # 将混合后的结果写回效果帧
-        effect_frame[:] = blended
+        # 只在脏矩形内混合 (相交的先合并，避免重复混合)，混合后清零图层
+        for rx1, ry1, rx2, ry2 in merge_rects(dirty):
+            layer = scan_layer[ry1:ry2, rx1:rx2]
+            screen_blend_inplace(effect_frame[ry1:ry2, rx1:rx2], layer)
+            layer[:] = 0
+        
+        # 轨迹删除后才释放扫描线状态和残影缓冲 (person_id 是递增的 track_id，不清理会一直增长)；
+        # 与 cached_results 的清理规则一致，人物短暂遮挡或置信度掉到阈值以下时扫描线不会从头开始
+        if self.person_tracker is not None:
+            alive = self.person_tracker.track_ids()
+            old_keys = [k for k in self._scan_last_seen if k not in alive]
+        else:
+            old_keys = [k for k, frame_id in self._scan_last_seen.items()
+                        if self.frame_counter - frame_id > 30]
+        for k in old_keys:
+            del self._scan_last_seen[k]
+            self.scan_line_positions.pop(k, None)
+            self.scan_line_trails.pop(k, None)
+            self._scan_trail_buffers.pop(k, None)
     
     def draw_info_on_effect_frame(self, effect_frame, person_mask, results):
         """
@@ -1326,115 +1733,19 @@ class CompletePersonFaceAnalyzer:
     
     def create_person_silhouette_from_keypoints(self, keypoints, bbox, img_h, img_w):
         """
-        从关键点创建精确的人体轮廓
-        使用关键点连接和形态学操作来创建更准确的人形
+        从关键点创建精确的人体轮廓 (整帧 mask，兼容旧接口)
+        使用关键点连接和形态学操作来创建更准确的人形，只在人物 ROI 内绘制 (见 silhouette.py)
         """
         mask = np.zeros((img_h, img_w), dtype=np.uint8)
-        
-        if keypoints is None or len(keypoints) < 17:
-            # 如果没有关键点，使用bbox创建椭圆
-            if bbox:
-                x1, y1, x2, y2 = bbox
-                center_x = int((x1 + x2) / 2)
-                center_y = int((y1 + y2) / 2)
-                width = int(x2 - x1)
-                height = int(y2 - y1)
-                cv2.ellipse(mask, (center_x, center_y), (width//2, height//2), 0, 0, 360, 255, -1)
-            return mask
-        
-        # 提取可见关键点及其索引
-        visible_kpts = {}
-        for idx, kpt in enumerate(keypoints):
-            if len(kpt) >= 3 and kpt[2] > 0.3:  # 置信度 > 0.3
-                x, y = int(kpt[0]), int(kpt[1])
-                x = max(0, min(x, img_w-1))
-                y = max(0, min(y, img_h-1))
-                visible_kpts[idx] = (x, y)
-        
-        if len(visible_kpts) < 5:
-            # 关键点太少，使用bbox
-            if bbox:
-                x1, y1, x2, y2 = bbox
-                center_x = int((x1 + x2) / 2)
-                center_y = int((y1 + y2) / 2)
-                width = int(x2 - x1)
-                height = int(y2 - y1)
-                cv2.ellipse(mask, (center_x, center_y), (width//2, height//2), 0, 0, 360, 255, -1)
-            return mask
-        
-        # 方法1: 使用关键点连接创建轮廓
-        # 定义身体部位的关键点组（用于创建更精确的轮廓）
-        body_parts = {
-            'head': [0, 1, 2, 3, 4],  # 头部
-            'torso': [5, 6, 11, 12],  # 躯干
-            'left_arm': [5, 7, 9],  # 左臂
-            'right_arm': [6, 8, 10],  # 右臂
-            'left_leg': [11, 13, 15],  # 左腿
-            'right_leg': [12, 14, 16],  # 右腿
-        }
-        
-        # 为每个身体部位创建轮廓
-        for part_name, part_indices in body_parts.items():
-            part_points = []
-            for idx in part_indices:
-                if idx in visible_kpts:
-                    part_points.append(visible_kpts[idx])
-            
-            if len(part_points) >= 2:
-                part_points = np.array(part_points, dtype=np.int32)
-                
-                # 对于头部，使用椭圆
-                if part_name == 'head' and len(part_points) >= 3:
-                    # 计算头部边界
-                    min_x, min_y = part_points.min(axis=0)
-                    max_x, max_y = part_points.max(axis=0)
-                    center_x = (min_x + max_x) // 2
-                    center_y = (min_y + max_y) // 2
-                    width = max(20, max_x - min_x)
-                    height = max(20, max_y - min_y)
-                    cv2.ellipse(mask, (center_x, center_y), (width//2, height//2), 0, 0, 360, 255, -1)
-                # 对于躯干，使用凸包
-                elif part_name == 'torso' and len(part_points) >= 3:
-                    hull = cv2.convexHull(part_points)
-                    cv2.fillPoly(mask, [hull], 255)
-                # 对于四肢，使用连接线加宽度
-                elif len(part_points) >= 2:
-                    # 绘制连接线，并加粗
-                    for i in range(len(part_points) - 1):
-                        pt1 = tuple(part_points[i])
-                        pt2 = tuple(part_points[i + 1])
-                        # 根据身体部位设置不同的线宽
-                        if part_name in ['left_arm', 'right_arm']:
-                            thickness = 25
-                        elif part_name in ['left_leg', 'right_leg']:
-                            thickness = 30
-                        else:
-                            thickness = 20
-                        cv2.line(mask, pt1, pt2, 255, thickness)
-                    # 在关键点位置绘制圆
-                    for pt in part_points:
-                        cv2.circle(mask, tuple(pt), thickness//2, 255, -1)
-        
-        # 方法2: 使用所有关键点的凸包作为基础，然后细化
-        all_points = np.array(list(visible_kpts.values()), dtype=np.int32)
-        if len(all_points) >= 3:
-            hull = cv2.convexHull(all_points)
-            # 创建临时mask用于凸包
-            temp_mask = np.zeros((img_h, img_w), dtype=np.uint8)
-            cv2.fillPoly(temp_mask, [hull], 255)
-            
-            # 将凸包与身体部位mask合并
-            mask = cv2.bitwise_or(mask, temp_mask)
-        
-        # 方法3: 使用形态学操作平滑和填充轮廓
-        # 先膨胀再腐蚀，填充小洞
-        kernel = np.ones((5, 5), np.uint8)
-        mask = cv2.morphologyEx(mask, cv2.MORPH_CLOSE, kernel, iterations=2)
-        # 轻微腐蚀以平滑边缘
-        mask = cv2.erode(mask, kernel, iterations=1)
-        mask = cv2.dilate(mask, kernel, iterations=1)
-        
-        return mask
+        return rasterize_silhouette(keypoints, bbox, img_h, img_w).paste(mask)
+    
+    def get_person_silhouette(self, person, img_h, img_w):
+        """本帧该人物的轮廓 (Silhouette，ROI 视图)，同一轨迹同一帧只绘制一次"""
+        return self.silhouette_cache.get(person, img_h, img_w, frame_id=self.frame_counter)
+    
+    def get_keypoint_mask(self, persons, img_h, img_w):
+        """所有人的关键点轮廓合并成整帧 mask (分割模型不可用时的回退)"""
+        return self.silhouette_cache.combined_mask(persons, img_h, img_w, frame_id=self.frame_counter)
     
     # 深度估计函数已注释
     # def estimate_depth(self, frame):
@@ -1498,19 +1809,39 @@ class CompletePersonFaceAnalyzer:
             frame: 输入图像
             conf_threshold: 置信度阈值，只有高于此值的才会被分割 (默认 0.75)
         """
-        if not self.segmentation_enabled:
+        if not self.segmentation_enabled or self.yolo_seg_model is None:
             return None
         
+        t_start = time.time()
         try:
+            # 降采样推理：分割跑在小图上，最后只做一次放大回采集分辨率
+            infer_frame, _ = self.get_inference_frame(frame)
+            
+            if isinstance(self.yolo_seg_model, YoloRuntimeModel):
+                # ONNX / OpenVINO：合并后的 mask 已经是小图尺寸
+                combined_mask = self.yolo_seg_model.person_mask(
+                    infer_frame, conf=conf_threshold,
+                    prepared=self._runtime_input(self.yolo_seg_model, infer_frame))
+                if combined_mask is None:
+                    return None
+                return self._upscale_mask(combined_mask, infer_frame, frame)
+            
+            transform = None
+            if self.detection_mode == 'fused':
+                # 复用 detect_persons 为同一帧准备好的输入张量
+                model_input, transform = self._prepare_shared_input(infer_frame)
+            else:
+                model_input = infer_frame
+            
             # 使用分割模型，直接传入置信度阈值进行过滤
-            seg_results = self.yolo_seg_model(frame, verbose=False, conf=conf_threshold)
+            seg_results = self.yolo_seg_model(model_input, verbose=False, conf=conf_threshold)
             
             if seg_results and len(seg_results) > 0:
                 seg_result = seg_results[0]
                 
                 # 检查是否有分割mask
                 if seg_result.masks is not None and len(seg_result.masks.data) > 0:
-                    h, w = frame.shape[:2]
+                    h, w = infer_frame.shape[:2]
                     combined_mask = np.zeros((h, w), dtype=np.uint8)
                     
                     # 遍历所有检测到的对象
@@ -1520,6 +1851,10 @@ class CompletePersonFaceAnalyzer:
                         if class_id == 0:  # person
                             # 获取mask并调整到原始图像大小
                             mask = mask_data.cpu().numpy()
+                            if transform is not None:
+                                # 去掉 letterbox 填充区域
+                                _, left, top, new_w, new_h = transform
+                                mask = mask[top:top + new_h, left:left + new_w]
                             mask_resized = cv2.resize(mask, (w, h), interpolation=cv2.INTER_LINEAR)
                             
                             # 转换为二值mask (0-255)
@@ -1528,57 +1863,122 @@ class CompletePersonFaceAnalyzer:
                             # 合并到总mask
                             combined_mask = cv2.bitwise_or(combined_mask, mask_binary)
                     
-                    return combined_mask
+                    return self._upscale_mask(combined_mask, infer_frame, frame)
         except Exception as e:
             print(f"Segmentation error: {e}")
+        finally:
+            self.stage_times['segmentation'] = time.time() - t_start
+            profiler.record('analyzer.segmentation', self.stage_times['segmentation'])
         
         return None
     
-    def create_ascii_effect(self, frame, person_mask, results):
+    @staticmethod
+    def _upscale_mask(mask, infer_frame, frame):
+        """合并后的小图 mask 一次性放大回采集坐标"""
+        if infer_frame is frame:
+            return mask
+        full_h, full_w = frame.shape[:2]
+        mask = cv2.resize(mask, (full_w, full_h), interpolation=cv2.INTER_LINEAR)
+        _, mask = cv2.threshold(mask, 127, 255, cv2.THRESH_BINARY)
+        return mask
+    
+    def get_ascii_atlas(self):
         """
-        创建ASCII艺术效果：使用0和1字符显示人物轮廓
-        背景用复杂符号填满（灰色）
+        预渲染字符图块 (字符大小/字符集变化时重建)
+        返回 (tiles, (oy, ox))：
+        - tiles: (1 + 前景字符数 + 背景字符数, th, tw, 3)，下标 0 为空白格
+        - 图块覆盖所有字形的实际范围 (putText 以 y + grid 为基线)，左上角相对格子左上角偏移 (oy, ox)
+        字形比格子大时 (th/tw > grid) 图块会与相邻格子重叠，由 create_ascii_effect 按绘制顺序合成
         """
-        h, w = frame.shape[:2]
+        g = self.ascii_grid_size
+        key = (g, tuple(self.ascii_chars), tuple(self.ascii_background_chars))
+        if self._ascii_atlas is not None and self._ascii_atlas[0] == key:
+            return self._ascii_atlas[1]
         
-        # 创建黑色背景
-        ascii_frame = np.zeros((h, w, 3), dtype=np.uint8)
-        
-        # 遍历网格，绘制字符
         font = cv2.FONT_HERSHEY_SIMPLEX
-        font_scale = self.ascii_grid_size / 30.0  # 根据网格大小调整字体
+        font_scale = g / 30.0  # 根据网格大小调整字体
         font_thickness = 1
-        
-        # 背景字符集（复杂符号）
-        background_chars = ['.', ':', '-', '=', '+', '*', '#', '%', '@', '~', '^', '&']
         # 灰色 #666666 = RGB(102, 102, 102)
         background_color = (102, 102, 102)  # BGR格式
         
-        for y in range(0, h, self.ascii_grid_size):
-            for x in range(0, w, self.ascii_grid_size):
-                # 检查当前位置是否在人物mask内
-                if x < w and y < h:
-                    mask_value = person_mask[y, x]
-                    
-                    # 如果在人物区域内（mask > 128）
-                    if mask_value > 128:
-                        # 获取该位置的亮度
-                        pixel = frame[y, x]
-                        brightness = (int(pixel[0]) + int(pixel[1]) + int(pixel[2])) / 3
-                        
-                        # 只有当亮度超过阈值时才绘制字符
-                        if brightness > self.ascii_threshold:
-                            # 随机选择0或1
-                            char = random.choice(self.ascii_chars)
-                            
-                            # 绘制白色字符（人物）
-                            cv2.putText(ascii_frame, char, (x, y + self.ascii_grid_size),
-                                       font, font_scale, (255, 255, 255), font_thickness)
-                    else:
-                        # 背景区域：绘制灰色复杂符号
-                        char = random.choice(background_chars)
-                        cv2.putText(ascii_frame, char, (x, y + self.ascii_grid_size),
-                                   font, font_scale, background_color, font_thickness)
+        glyphs = [(c, (255, 255, 255)) for c in self.ascii_chars] + \
+                 [(c, background_color) for c in self.ascii_background_chars]
+        # 在足够大的画布上绘制 (格子左上角位于 (pad, pad))，再按所有字形的并集范围裁剪
+        pad = 2 * g
+        canvas = np.zeros((len(glyphs), 5 * g, 5 * g, 3), dtype=np.uint8)
+        for i, (char, color) in enumerate(glyphs):
+            cv2.putText(canvas[i], char, (pad, pad + g), font, font_scale, color, font_thickness)
+        ys, xs = np.nonzero(canvas.any(axis=(0, 3)))
+        if len(ys) == 0:
+            ys = xs = np.array([pad])
+        y0, y1 = ys.min(), ys.max() + 1
+        x0, x1 = xs.min(), xs.max() + 1
+        
+        tiles = np.zeros((1 + len(glyphs), y1 - y0, x1 - x0, 3), dtype=np.uint8)
+        tiles[1:] = canvas[:, y0:y1, x0:x1]
+        atlas = (tiles, (y0 - pad, x0 - pad))
+        self._ascii_atlas = (key, atlas)
+        return atlas
+    
+    def create_ascii_effect(self, frame, person_mask, results):
+        """
+        创建ASCII艺术效果：使用0和1字符显示人物轮廓
+        背景用复杂符号填满（灰色）
+        每个格子按左上角像素的 mask/亮度选择字符图块，整帧一次拼接 (不逐格 putText)
+        """
+        h, w = frame.shape[:2]
+        g = self.ascii_grid_size
+        tiles, (oy, ox) = self.get_ascii_atlas()
+        th, tw = tiles.shape[1:3]
+        n_fg = len(self.ascii_chars)
+        n_bg = len(self.ascii_background_chars)
+        
+        # 每个格子左上角的采样
+        in_person = person_mask[::g, ::g] > 128
+        pixels = frame[::g, ::g]
+        brightness = pixels.sum(axis=2, dtype=np.uint16) / 3
+        rows, cols = in_person.shape
+        
+        # 人物区域内亮度超过阈值：随机 0/1；人物区域内较暗：空白；背景：随机灰色符号
+        glyph_idx = np.where(
+            in_person,
+            np.where(brightness > self.ascii_threshold,
+                     1 + np.random.randint(n_fg, size=(rows, cols)), 0),
+            1 + n_fg + np.random.randint(n_bg, size=(rows, cols)))
+        
+        # 画布原点相对画面偏移 (-oy, -ox)，图块放在 (行 * g, 列 * g)
+        # 图块不超过格子时互不重叠，一次拼接；否则按 (行 mod ky, 列 mod kx) 分层，
+        # 每层内互不重叠，层间按原来逐格 putText 的顺序 (先行后列，后画的字形像素覆盖先画的) 合成
+        ky, kx = -(-th // g), -(-tw // g)
+        cell_h, cell_w = ky * g, kx * g
+        padded = np.zeros((tiles.shape[0], cell_h, cell_w, 3), dtype=np.uint8)
+        padded[:, :th, :tw] = tiles
+        canvas = np.zeros((rows * g + cell_h, cols * g + cell_w, 3), dtype=np.uint8)
+        
+        if ky == 1 and kx == 1:
+            # 拼接图块: (rows, cols, g, g, 3) -> (rows*g, cols*g, 3)
+            canvas[:rows * g, :cols * g] = padded[glyph_idx].transpose(0, 2, 1, 3, 4).reshape(rows * g, cols * g, 3)
+        else:
+            order = np.arange(rows * cols, dtype=np.int32).reshape(rows, cols)
+            priority = np.full(canvas.shape[:2], -1, dtype=np.int32)
+            for a in range(ky):
+                for b in range(kx):
+                    idx = glyph_idx[a::ky, b::kx]
+                    if idx.size == 0:
+                        continue
+                    ra, cb = idx.shape
+                    layer = padded[idx].transpose(0, 2, 1, 3, 4).reshape(ra * cell_h, cb * cell_w, 3)
+                    rank = np.repeat(np.repeat(order[a::ky, b::kx], cell_h, axis=0), cell_w, axis=1)
+                    ys, xs = slice(a * g, a * g + ra * cell_h), slice(b * g, b * g + cb * cell_w)
+                    update = layer.any(axis=2) & (rank > priority[ys, xs])
+                    canvas[ys, xs][update] = layer[update]
+                    priority[ys, xs][update] = rank[update]
+        
+        # 创建黑色背景，按图块偏移贴回画面坐标
+        ascii_frame = np.zeros((h, w, 3), dtype=np.uint8)
+        dy, dx = max(oy, 0), max(ox, 0)
+        src = canvas[max(-oy, 0):, max(-ox, 0):][:h - dy, :w - dx]
+        ascii_frame[dy:dy + src.shape[0], dx:dx + src.shape[1]] = src
         
         # 不绘制任何标注信息，保持纯粹的ASCII艺术效果
         
@@ -1615,9 +2015,11 @@ class CompletePersonFaceAnalyzer:
             cv2.putText(ascii_frame, f"Person {r.get('person_id', idx+1)} ({person_conf*100:.0f}%)", 
                        (x1, y_offset), font, 0.4, (0, 255, 0), 1)
     
-    def apply_visual_effects(self, frame, results, person_mask=None, target_person_idx=None):
+    def apply_visual_effects(self, frame, results, person_mask=None, target_person_idx=None, out=None):
         """
         应用视觉特效：黑色剪影 + 真实背景 + 数据方块 或 ASCII艺术
+        frame 只读 (可以是共享帧的只读视图)；剪影模式在 out (调用方预分配的同尺寸缓冲) 上绘制，
+        out 为 None 时复制一份 frame
         """
         if not self.enable_effects:
             return frame
@@ -1632,29 +2034,27 @@ class CompletePersonFaceAnalyzer:
         
         h, w = frame.shape[:2]
         
-        # 使用真实摄像头背景
-        effect_frame = frame.copy()
-        
         # 3. 获取 Mask (所有人)
         if person_mask is None:
             person_mask = self.get_segmentation_mask(frame, conf_threshold=0.75)
         
         if person_mask is None:
-            person_mask = np.zeros((h, w), dtype=np.uint8)
-            for r in filtered_results:
-                bbox = r.get('bbox')
-                keypoints = r.get('keypoints')
-                person_silhouette = self.create_person_silhouette_from_keypoints(
-                    keypoints, bbox, h, w
-                )
-                person_mask = cv2.bitwise_or(person_mask, person_silhouette)
+            person_mask = self.get_keypoint_mask(filtered_results, h, w)
         
         # 4. 渲染
         if self.effect_mode == 'ascii':
+            # ASCII艺术模式 (使用过滤后的 results，自己生成新画布，不需要背景副本)
             effect_frame = self.create_ascii_effect(frame, person_mask, filtered_results)
             return effect_frame
         else:
-            # 默认剪影模式
+            # 默认剪影模式：在真实摄像头背景的副本上绘制
+            if out is None:
+                effect_frame = frame.copy()
+            else:
+                effect_frame = out
+                np.copyto(effect_frame, frame)
+            
+            # 保存原始mask用于文本颜色判断（在羽化之前）
             original_mask = person_mask.copy()
             
             if self.feather_radius > 0:
@@ -1668,78 +2068,68 @@ class CompletePersonFaceAnalyzer:
             # 绘制识别信息
             self.draw_info_on_effect_frame(effect_frame, original_mask, filtered_results)
             
-            return effect_frame
-        
-        # 根据特效模式选择不同的渲染方法
-        if self.effect_mode == 'ascii':
-            # ASCII艺术模式 (使用过滤后的 results)
-            effect_frame = self.create_ascii_effect(frame, person_mask, filtered_results)
-            return effect_frame
-        else:
-            # 默认剪影模式
-            # 保存原始mask用于文本颜色判断（在羽化之前）
-            original_mask = person_mask.copy()
-            
-            # 应用羽化效果（边缘模糊）
-            if self.feather_radius > 0:
-                person_mask = cv2.GaussianBlur(person_mask, 
-                                             (self.feather_radius * 2 + 1, self.feather_radius * 2 + 1),
-                                             0)
-            
-            # 不绘制纯黑色剪影，只绘制黑色格子
-            # effect_frame 保持真实背景，不做任何混合
-            
-            # 添加残影效果（在绘制完所有内容后应用，避免影响格子颜色）
-            # 注意：残影效果会在最后应用，所以不会影响格子的白色
-            
-            # 在人物剪影上叠加数据方块（马赛克格子效果）
-            # 注意：传入 filtered_results 确保只绘制高置信度人物的格子
-            self.draw_data_blocks(effect_frame, original_mask, filtered_results, frame)
-            
-            # 在特效帧上绘制识别信息（使用黑色文本，在格子之后绘制，确保可见）
-            self.draw_info_on_effect_frame(effect_frame, original_mask, filtered_results)
-            
             # 绘制扫描线效果（在每个人物的bbox内）
-            # self.draw_scan_line(effect_frame, filtered_results)  # 已注释
+            if self.enable_scan_line:
+                self.draw_scan_line(effect_frame, filtered_results)
             
             return effect_frame
     
-    def process_frame(self, frame):
-        """Complete analysis of the frame"""
+    def process_frame(self, frame, apply_effects=None):
+        """
+        Complete analysis of the frame
+        apply_effects: None 时跟随 self.enable_effects；流水线模式下分析线程传 False，
+                       特效由渲染线程单独调用 apply_visual_effects
+        """
         self.frame_counter += 1
+        self.scheduler.begin_frame()
+        self.stage_times = {}
+        t_stage = t_frame = time.time()
         
-        # Detect persons
-        persons = self.detect_persons(frame)
-        
-        # Analyze faces
-        faces = self.analyze_faces(frame)
+        # 降采样推理：只缩放一次，所有模型跑在小图上
+        infer_frame, infer_scale = self.get_inference_frame(frame)
+        t_now = time.time()
+        self.stage_times['resize'] = t_now - t_stage
+        t_stage = t_now
         
-        should_analyze_body = (self.frame_counter % self.process_every_n_frames == 0)
-        should_analyze_emotion = (self.frame_counter % self.emotion_every_n_frames == 0)
+        # Detect persons
+        persons = self.detect_persons(infer_frame)
+        
+        # 映射回采集坐标 (下游绘制、取色、故障艺术裁剪都使用全分辨率坐标)
+        if infer_frame is not frame:
+            self._rescale_persons(persons, infer_scale, frame.shape)
+        
+        # 分配持久的 track_id (低置信度检测只有被已有轨迹接住才保留)
+        if self.person_tracker is not None:
+            persons = self.person_tracker.update(persons)
+        t_now = time.time()
+        self.stage_times['detect'] = t_now - t_stage
+        t_stage = t_now
+        
+        # Analyze faces (调度器决定本帧哪些人需要重新分析人脸，其余沿用缓存)
+        face_people = [p for p in persons
+                       if self.scheduler.should_run('face', self._person_key(p), p['bbox'])]
+        faces = []
+        if face_people:
+            faces = self.analyze_faces(frame, face_people, infer_frame=infer_frame, infer_scale=infer_scale)
+        t_now = time.time()
+        self.stage_times['faces'] = t_now - t_stage
+        t_stage = t_now
         
         results = []
+        pending_emotions = []  # (results 下标, person_id, 人脸区域)
+        pending_colors = []    # (results 下标, person_id, 上半身ROI, 上半身mask, 下半身ROI, 下半身mask)
         
         for idx, person in enumerate(persons):
             x1, y1, x2, y2 = person['bbox']
             keypoints = person['keypoints']
-            person_roi = frame[y1:y2, x1:x2].copy()
+            # 只读取像素 (取色 / 服装分类)，直接使用视图
+            person_roi = frame[y1:y2, x1:x2]
             
-            person_id = f"{x1//50}_{y1//50}"
+            # 稳定身份：所有缓存以 track_id 为键 (未启用追踪时退回原来的网格键)
+            person_id = self._person_key(person)
             
-            # Find matching face
-            matching_face = None
-            for face in faces:
-                if self.match_face_to_person(person['bbox'], face['bbox']):
-                    matching_face = face
-                    # Smooth age to reduce jumping
-                    raw_age = face['age']
-                    smoothed_age = self.smooth_age(person_id, raw_age)
-                    face['smoothed_age'] = smoothed_age
-                    break
-            
-            # 确保person_id在缓存中（如果不存在，立即初始化并分析一次，避免闪烁）
-            is_new_person = person_id not in self.cached_results
-            if is_new_person:
+            # 确保person_id在缓存中（新检测到的人物由调度器立即安排所有阶段，避免闪烁）
+            if person_id not in self.cached_results:
                 self.cached_results[person_id] = {
                     'body_type': None,
                     'upper_color': None,
@@ -1747,20 +2137,35 @@ class CompletePersonFaceAnalyzer:
                     'clothing_type': None,
                     'emotion': None,
                     'emotion_conf': None,
+                    'face': None,
                     'frame': self.frame_counter
                 }
-                # 新检测到的人物，立即分析一次，避免闪烁
-                should_analyze_body_local = True
-                should_analyze_emotion_local = True
+            cached = self.cached_results[person_id]
+            cached['frame'] = self.frame_counter  # 最后一次出现的帧 (未启用追踪时按它清理缓存)
+            
+            # Find matching face (关键点推算的人脸直接属于这个人，不用按位置匹配)
+            face_fresh = any(p is person for p in face_people)
+            if face_fresh:
+                matching_face = person.get('keypoint_face')
+                if matching_face is None:
+                    for face in faces:
+                        if self.match_face_to_person(person['bbox'], face['bbox']):
+                            matching_face = face
+                            break
+                if matching_face:
+                    # Smooth age to reduce jumping
+                    raw_age = matching_face['age']
+                    smoothed_age = self.smooth_age(person_id, raw_age)
+                    matching_face['smoothed_age'] = smoothed_age
+                cached['face'] = matching_face
             else:
-                should_analyze_body_local = should_analyze_body
-                should_analyze_emotion_local = should_analyze_emotion
+                # 本帧没有轮到这个人：沿用上次的人脸结果
+                matching_face = cached.get('face')
             
             # Person 检测置信度（来自YOLO）
             person_conf = person.get('confidence', 0.0)
             
             # 从缓存读取
-            cached = self.cached_results[person_id]
             body_type = cached.get('body_type')
             upper_color = cached.get('upper_color')
             upper_color_conf = cached.get('upper_color_conf', 0.0)
@@ -1771,7 +2176,9 @@ class CompletePersonFaceAnalyzer:
             emotion_conf = cached.get('emotion_conf')
             
             # Analyze face attributes (independent of body analysis)
-            if matching_face:
+            # 情绪只在本帧刚分析过人脸时计算 (缓存的人脸框可能已经过时)，是否运行由调度器决定
+            if (face_fresh and matching_face and self.emotion_detector is not None and self.emotion_enabled
+                    and self.scheduler.should_run('emotion', person_id, person['bbox'])):
                 fx1, fy1, fx2, fy2 = matching_face['bbox']
                 
                 # Add padding for better emotion detection
@@ -1788,41 +2195,20 @@ class CompletePersonFaceAnalyzer:
                 face_region = frame[fy1_pad:fy2_pad, fx1_pad:fx2_pad].copy()
                 
                 # Emotion detection - Using HSEmotion (EfficientNet)
-                if HSEMOTION_AVAILABLE and self.emotion_enabled and face_region.size > 0 and self.frame_counter % 5 == 0:
-                    try:
-                        # predict_emotions returns (emotion_label, scores_list)
-                        # emotion_label is like 'Happiness', 'Neutral', etc.
-                        emotion, scores = self.emotion_detector.predict_emotions(face_region, logits=False)
-                        
-                        # Find max score for confidence
-                        confidence = max(scores)
-                        
-                        # Normalize to lowercase for consistency
-                        emotion_lower = emotion.lower()
-                        
-                        # Apply smoothing
-                        smoothed_emotion = self.smooth_emotion(person_id, emotion_lower)
-                        
-                        # Update cache
-                        self.cached_results[person_id]['emotion'] = smoothed_emotion
-                        self.cached_results[person_id]['emotion_conf'] = confidence
-                            
-                    except Exception as e:
-                        print(f"!!! HSEmotion ERROR (Person {idx+1}): {e}")
-                        pass
+                # 先收集本帧所有人脸，循环结束后一次批量推理
+                if face_region.size > 0:
+                    pending_emotions.append((len(results), person_id, face_region))
             
             # Analyze body attributes
-            if should_analyze_body_local:
+            if self.scheduler.should_run('body', person_id, person['bbox']):
                 body_type = self.analyze_body_type(keypoints, person['bbox'])
                 
                 # Generate silhouette mask for accurate color extraction (Remove background)
                 # This ensures we only analyze pixels belonging to the person
-                full_mask = self.create_person_silhouette_from_keypoints(
-                    keypoints, person['bbox'], frame.shape[0], frame.shape[1]
-                )
+                silhouette = self.get_person_silhouette(person, frame.shape[0], frame.shape[1])
                 
-                # Crop mask to person ROI
-                person_mask_roi = full_mask[y1:y2, x1:x2]
+                # Crop mask to person ROI (ROI 包含 bbox，直接取视图)
+                person_mask_roi = silhouette.crop(x1, y1, x2, y2)
                 
                 h = person_roi.shape[0]
                 mid = h // 2
@@ -1837,26 +2223,14 @@ class CompletePersonFaceAnalyzer:
                     upper_mask = person_mask_roi[:mid, :]
                     lower_mask = person_mask_roi[mid:, :]
                 
-                upper_color, upper_color_conf = self.get_color(upper_roi, upper_mask)
-                lower_color, lower_color_conf = self.get_color(lower_roi, lower_mask)
-                
-                # Upper color filtering (Confidence threshold)
-                if upper_color and upper_color_conf < 0.6:
-                    upper_color = None
-                
-                # Lower color filtering (Confidence threshold)
-                if lower_color and lower_color_conf < 0.6:
-                    lower_color = None
+                # 颜色在循环结束后对本帧所有 ROI 一次性提取
+                pending_colors.append((len(results), person_id, upper_roi, upper_mask, lower_roi, lower_mask))
                 
                 # Classify clothing type
                 clothing_type = self.classify_clothing_type(person_roi, keypoints, upper_roi, lower_roi)
                 
                 # Update body cache
                 self.cached_results[person_id]['body_type'] = body_type
-                self.cached_results[person_id]['upper_color'] = upper_color
-                self.cached_results[person_id]['upper_color_conf'] = upper_color_conf
-                self.cached_results[person_id]['lower_color'] = lower_color
-                self.cached_results[person_id]['lower_color_conf'] = lower_color_conf
                 self.cached_results[person_id]['clothing_type'] = clothing_type
                 self.cached_results[person_id]['frame'] = self.frame_counter
             
@@ -1864,7 +2238,8 @@ class CompletePersonFaceAnalyzer:
             # 绘制代码已移除，统一在 apply_visual_effects 中绘制
             
             result_data = {
-                'person_id': idx + 1,
+                'person_id': person.get('track_id', idx + 1),
+                'track_id': person.get('track_id'),
                 'person_conf': person_conf,  # 添加Person置信度
                 'bbox': person['bbox'],
                 'keypoints': keypoints,
@@ -1881,24 +2256,48 @@ class CompletePersonFaceAnalyzer:
                 }
             }
             
-            # Generate natural language description
-            description = self.generate_person_description(result_data)
-            result_data['description'] = description
-            
             results.append(result_data)
         
+        # 批量提取服装颜色
+        if pending_colors:
+            self.apply_colors_batch(pending_colors, results)
+        
+        # 批量情绪识别：N 个人只做一次前向推理，再按人分发、平滑
+        if pending_emotions:
+            self.predict_emotions_batch(pending_emotions, results)
+        
+        # Generate natural language description (情绪结果回填之后再生成)
+        for result_data in results:
+            result_data['description'] = self.generate_person_description(result_data)
+        
+        self.stage_times['attributes'] = time.time() - t_stage
+        for stage in ('resize', 'detect', 'faces', 'attributes'):
+            profiler.record(f'analyzer.{stage}', self.stage_times[stage])
+        # 分析耗时超出预算时，调度器拉长各阶段的重复分析间隔
+        self.scheduler.end_frame(time.time() - t_frame)
+        
         # Clean cache
         if self.frame_counter % 30 == 0:
-            old_keys = [k for k, v in self.cached_results.items() 
-                       if self.frame_counter - v.get('frame', 0) > 30]
+            if self.person_tracker is not None:
+                # 轨迹删除后才清理，人物短暂遮挡时保留属性和平滑历史
+                alive = self.person_tracker.track_ids()
+                old_keys = [k for k in self.cached_results if k not in alive]
+            else:
+                old_keys = [k for k, v in self.cached_results.items() 
+                           if self.frame_counter - v.get('frame', 0) > 30]
             for k in old_keys:
                 del self.cached_results[k]
-                # Also clean age history
+                # Also clean age / emotion history
                 if k in self.age_history:
                     del self.age_history[k]
+                if k in self.emotion_history:
+                    del self.emotion_history[k]
+            self.scheduler.forget(old_keys)
         
         # 应用视觉特效
-        if self.enable_effects:
+        if apply_effects is None:
+            apply_effects = self.enable_effects
+        if apply_effects:
             frame = self.apply_visual_effects(frame, results)
         
         # 渲染示波器（右下角）
@@ -1922,7 +2321,9 @@ class CompletePersonFaceAnalyzer:
                     keypoints=results[0]['keypoints']
                 )
             
-            # 渲染示波器到帧上（会自动放在右下角）
+            # 渲染示波器到帧上（会自动放在右下角）；共享的只读帧先复制一份
+            if not frame.flags.writeable:
+                frame = frame.copy()
             frame = self.oscilloscope.render(frame)
         
         return frame, results
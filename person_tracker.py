@@ -0,0 +1,201 @@
+"""
+多目标人物追踪 (稳定身份 ID)
+- 每条轨迹一个恒速 Kalman 滤波器，状态为 (cx, cy, w, h) 及其速度
+- 关联方式：预测框与检测框的 IoU，贪心匹配
+- ByteTrack 式两阶段匹配：高置信度检测先与所有轨迹匹配，
+  低置信度检测只用于维持已有轨迹 (遮挡、运动模糊时不丢 ID)，不会创建新轨迹
+- 分析器的缓存、GalleryView 的结果合并、AdvancedTracker 的锁定目标都使用 track_id
+"""
+
+import numpy as np
+
+
+def iou_matrix(boxes_a, boxes_b):
+    """两组 (x1, y1, x2, y2) 框的 IoU 矩阵"""
+    a = np.asarray(boxes_a, dtype=np.float64).reshape(-1, 4)
+    b = np.asarray(boxes_b, dtype=np.float64).reshape(-1, 4)
+    if len(a) == 0 or len(b) == 0:
+        return np.zeros((len(a), len(b)))
+
+    ix1 = np.maximum(a[:, None, 0], b[None, :, 0])
+    iy1 = np.maximum(a[:, None, 1], b[None, :, 1])
+    ix2 = np.minimum(a[:, None, 2], b[None, :, 2])
+    iy2 = np.minimum(a[:, None, 3], b[None, :, 3])
+    inter = np.clip(ix2 - ix1, 0, None) * np.clip(iy2 - iy1, 0, None)
+    area_a = (a[:, 2] - a[:, 0]) * (a[:, 3] - a[:, 1])
+    area_b = (b[:, 2] - b[:, 0]) * (b[:, 3] - b[:, 1])
+    union = area_a[:, None] + area_b[None, :] - inter
+    return np.where(union > 0, inter / np.maximum(union, 1e-9), 0.0)
+
+
+def greedy_match(iou, threshold):
+    """
+    贪心匹配：按 IoU 从大到小依次配对
+    返回 (matches, unmatched_rows, unmatched_cols)
+    """
+    matches = []
+    used_rows, used_cols = set(), set()
+    if iou.size > 0:
+        order = np.argsort(-iou, axis=None)
+        for flat in order:
+            r, c = np.unravel_index(flat, iou.shape)
+            if iou[r, c] < threshold:
+                break
+            if r in used_rows or c in used_cols:
+                continue
+            matches.append((int(r), int(c)))
+            used_rows.add(r)
+            used_cols.add(c)
+    unmatched_rows = [r for r in range(iou.shape[0]) if r not in used_rows]
+    unmatched_cols = [c for c in range(iou.shape[1]) if c not in used_cols]
+    return matches, unmatched_rows, unmatched_cols
+
+
+class KalmanBoxTrack:
+    """单条轨迹：恒速 Kalman 滤波，状态 [cx, cy, w, h, vx, vy, vw, vh]"""
+
+    def __init__(self, track_id, bbox, confidence):
+        self.track_id = track_id
+        self.confidence = confidence
+        self.hits = 1
+        self.age = 1
+        self.time_since_update = 0
+
+        # 状态转移 (dt = 1 帧)
+        self.F = np.eye(8)
+        self.F[:4, 4:] = np.eye(4)
+        self.H = np.eye(4, 8)
+
+        self.x = np.zeros(8)
+        self.x[:4] = self._to_xywh(bbox)
+
+        # 速度初始不确定性大，观测噪声随框尺寸缩放
+        self.P = np.diag([10.0, 10.0, 10.0, 10.0, 1e4, 1e4, 1e4, 1e4])
+        self.q = 1.0   # 过程噪声系数
+        self.r = 1.0   # 观测噪声系数
+
+    @staticmethod
+    def _to_xywh(bbox):
+        x1, y1, x2, y2 = bbox
+        return np.array([(x1 + x2) / 2.0, (y1 + y2) / 2.0, max(1.0, x2 - x1), max(1.0, y2 - y1)])
+
+    def _noise_scale(self):
+        w, h = max(1.0, self.x[2]), max(1.0, self.x[3])
+        return np.array([w, h, w, h]) * 0.05
+
+    def predict(self):
+        """预测下一帧位置"""
+        # 尺寸不能预测成负数
+        if self.x[2] + self.x[6] <= 1:
+            self.x[6] = 0.0
+        if self.x[3] + self.x[7] <= 1:
+            self.x[7] = 0.0
+
+        s = self._noise_scale()
+        Q = np.diag(np.concatenate([s, s * 0.5]) ** 2) * self.q
+        self.x = self.F @ self.x
+        self.P = self.F @ self.P @ self.F.T + Q
+        self.age += 1
+        self.time_since_update += 1
+        return self.bbox
+
+    def update(self, bbox, confidence):
+        """用匹配到的检测框修正状态"""
+        z = self._to_xywh(bbox)
+        R = np.diag(self._noise_scale() ** 2) * self.r
+        y = z - self.H @ self.x
+        S = self.H @ self.P @ self.H.T + R
+        K = self.P @ self.H.T @ np.linalg.inv(S)
+        self.x = self.x + K @ y
+        self.P = (np.eye(8) - K @ self.H) @ self.P
+
+        self.confidence = confidence
+        self.hits += 1
+        self.time_since_update = 0
+
+    @property
+    def bbox(self):
+        cx, cy, w, h = self.x[:4]
+        return (cx - w / 2.0, cy - h / 2.0, cx + w / 2.0, cy + h / 2.0)
+
+
+class PersonTracker:
+    """为每帧的人体检测分配持久的 track_id"""
+
+    def __init__(self, high_conf=0.75, low_conf=0.3, iou_threshold=0.3,
+                 low_iou_threshold=0.5, max_age=30):
+        """
+        Args:
+            high_conf: 高置信度阈值 (原 detect_persons 的过滤阈值)，只有高置信度检测能创建新轨迹
+            low_conf: 低置信度下限，介于两者之间的检测只用于维持已有轨迹
+            iou_threshold: 第一阶段 (高置信度) 匹配的最小 IoU
+            low_iou_threshold: 第二阶段 (低置信度) 匹配的最小 IoU，更严格以免误关联
+            max_age: 轨迹连续多少帧未匹配后删除
+        """
+        self.high_conf = high_conf
+        self.low_conf = low_conf
+        self.iou_threshold = iou_threshold
+        self.low_iou_threshold = low_iou_threshold
+        self.max_age = max_age
+
+        self.tracks = []
+        self._next_id = 1
+
+    def update(self, persons):
+        """
+        persons: detect_persons 的输出 (含 'bbox', 'confidence')
+        返回需要分析的人物列表 (所有高置信度检测 + 被轨迹接住的低置信度检测)，
+        按原检测顺序排列，每个人物加上 'track_id'
+        """
+        for track in self.tracks:
+            track.predict()
+
+        high = [i for i, p in enumerate(persons) if p.get('confidence', 0.0) >= self.high_conf]
+        low = [i for i, p in enumerate(persons)
+               if self.low_conf <= p.get('confidence', 0.0) < self.high_conf]
+        boxes = [persons[i]['bbox'] for i in range(len(persons))]
+        assigned = {}  # 检测下标 -> track_id
+
+        # 第一阶段：高置信度检测 vs 所有轨迹
+        track_boxes = [t.bbox for t in self.tracks]
+        iou = iou_matrix(track_boxes, [boxes[i] for i in high])
+        matches, unmatched_tracks, unmatched_high = greedy_match(iou, self.iou_threshold)
+        for t, d in matches:
+            det = high[d]
+            self.tracks[t].update(boxes[det], persons[det]['confidence'])
+            assigned[det] = self.tracks[t].track_id
+
+        # 第二阶段：剩余轨迹 vs 低置信度检测 (只维持轨迹，不新建)
+        remaining = [self.tracks[t] for t in unmatched_tracks]
+        iou = iou_matrix([t.bbox for t in remaining], [boxes[i] for i in low])
+        matches, _, _ = greedy_match(iou, self.low_iou_threshold)
+        for t, d in matches:
+            det = low[d]
+            remaining[t].update(boxes[det], persons[det]['confidence'])
+            assigned[det] = remaining[t].track_id
+
+        # 未匹配的高置信度检测创建新轨迹
+        for d in unmatched_high:
+            det = high[d]
+            track = KalmanBoxTrack(self._next_id, boxes[det], persons[det]['confidence'])
+            self._next_id += 1
+            self.tracks.append(track)
+            assigned[det] = track.track_id
+
+        # 删除长时间未匹配的轨迹
+        self.tracks = [t for t in self.tracks if t.time_since_update <= self.max_age]
+
+        tracked = []
+        for i, person in enumerate(persons):
+            if i in assigned:
+                person['track_id'] = assigned[i]
+                tracked.append(person)
+        return tracked
+
+    def track_ids(self):
+        """当前存活的轨迹 ID"""
+        return {t.track_id for t in self.tracks}
+
+    def reset(self):
+        self.tracks = []
+        self._next_id = 1
@@ -0,0 +1,215 @@
+"""
+分级流水线
+- 每一级在独立线程中运行，级与级之间用容量为 1 的 LatestSlot 交接
+- 每个数据包带采集序号 (seq)，用来统计丢帧和端到端延迟
+- 背压策略:
+    'latest' - 下游来不及取走时直接用新包覆盖旧包 (实时显示用，吞吐接近最慢的一级)
+    'block'  - 上游等待下游取走 (离线回放/基准测试用，保证每帧都处理)
+GPU 推理和 OpenCV 绘制在不同线程里重叠执行，整体帧率取决于最慢的一级而不是各级耗时之和
+"""
+
+import threading
+import time
+
+
+class LatestSlot:
+    """容量为 1 的交接槽，只保留最新的数据包"""
+
+    def __init__(self, name, policy='latest', on_drop=None):
+        """on_drop(item): 数据包被覆盖丢弃时调用 (例如归还包里持有的帧缓冲)"""
+        if policy not in ('latest', 'block'):
+            raise ValueError(f"Unknown backpressure policy: {policy}")
+        self.name = name
+        self.policy = policy
+        self.on_drop = on_drop
+        self._item = None
+        self._has_item = False
+        self._closed = False
+        self._cond = threading.Condition()
+
+        # 统计
+        self.put_count = 0
+        self.dropped = 0    # 'latest' 策略下被覆盖、从未被取走的包
+
+    def put(self, item, timeout=None):
+        """放入数据包；返回 False 表示槽已关闭 (或 'block' 策略下等待超时)"""
+        with self._cond:
+            if self.policy == 'block':
+                deadline = None if timeout is None else time.time() + timeout
+                while self._has_item and not self._closed:
+                    remaining = None if deadline is None else deadline - time.time()
+                    if remaining is not None and remaining <= 0:
+                        return False
+                    self._cond.wait(remaining)
+            if self._closed:
+                return False
+            dropped = None
+            if self._has_item:
+                self.dropped += 1
+                dropped = self._item
+            self._item = item
+            self._has_item = True
+            self.put_count += 1
+            self._cond.notify_all()
+        if dropped is not None and self.on_drop is not None:
+            self.on_drop(dropped)
+        return True
+
+    def get(self, timeout=None):
+        """取出数据包；超时或槽已关闭返回 None"""
+        with self._cond:
+            deadline = None if timeout is None else time.time() + timeout
+            while not self._has_item:
+                if self._closed:
+                    return None
+                remaining = None if deadline is None else deadline - time.time()
+                if remaining is not None and remaining <= 0:
+                    return None
+                self._cond.wait(remaining)
+            item = self._item
+            self._item = None
+            self._has_item = False
+            self._cond.notify_all()
+            return item
+
+    @property
+    def closed(self):
+        return self._closed
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+
+class PipelineStage:
+    """
+    流水线中的一级
+    fn(item) -> 下游数据包；返回 None 表示本包不再向下传递
+    inbox 为 None 的首级由 fn(None) 自行产生数据 (例如从摄像头取帧)
+    """
+
+    def __init__(self, name, fn, inbox=None, outbox=None):
+        self.name = name
+        self.fn = fn
+        self.inbox = inbox
+        self.outbox = outbox
+
+        self.running = False
+        self.error = None
+        self._thread = None
+
+        # 统计
+        self.processed = 0
+        self.busy_time = 0.0
+        self.last_seq = -1
+        self.fps = 0.0
+        self.avg_ms = 0.0
+        self._window_start = time.time()
+        self._window_count = 0
+        self._window_busy = 0.0
+
+    def start(self):
+        self.running = True
+        self._thread = threading.Thread(target=self._loop, name=f"stage-{self.name}", daemon=True)
+        self._thread.start()
+        return self
+
+    def _loop(self):
+        while self.running:
+            if self.inbox is not None:
+                item = self.inbox.get(timeout=0.1)
+                if item is None:
+                    continue
+            else:
+                item = None
+
+            t0 = time.time()
+            try:
+                out = self.fn(item)
+            except Exception as e:
+                print(f"✗ Pipeline stage '{self.name}' error: {e}")
+                self.error = e
+                self.running = False
+                break
+            elapsed = time.time() - t0
+
+            self._record(elapsed, out)
+            if out is not None and self.outbox is not None:
+                # 'block' 策略下等待下游取走，直到流水线停止
+                while not self.outbox.put(out, timeout=0.5):
+                    if not self.running or self.outbox.closed:
+                        break
+
+    def _record(self, elapsed, out):
+        self.processed += 1
+        self.busy_time += elapsed
+        if isinstance(out, dict) and 'seq' in out:
+            self.last_seq = out['seq']
+        self._window_count += 1
+        self._window_busy += elapsed
+        now = time.time()
+        if now - self._window_start > 1.0:
+            self.fps = self._window_count / (now - self._window_start)
+            self.avg_ms = self._window_busy * 1000.0 / max(1, self._window_count)
+            self._window_start = now
+            self._window_count = 0
+            self._window_busy = 0.0
+
+    def stop(self, timeout=1.0):
+        self.running = False
+        if self._thread is not None and self._thread.is_alive() and self._thread is not threading.current_thread():
+            self._thread.join(timeout=timeout)
+
+
+class StagedPipeline:
+    """
+    把若干级串起来
+    stages: [(name, fn), ...]，按顺序连接；最后一级的输出放进 output 槽，
+    由调用方 (通常是主线程，OpenCV 窗口必须在主线程显示) 取走
+    on_drop: 各交接槽丢弃数据包时的回调
+    """
+
+    def __init__(self, stages, policy='latest', on_drop=None):
+        self.policy = policy
+        self.slots = []
+        self.stages = []
+        inbox = None
+        for name, fn in stages:
+            outbox = LatestSlot(f"{name}->", policy=policy, on_drop=on_drop)
+            self.slots.append(outbox)
+            self.stages.append(PipelineStage(name, fn, inbox=inbox, outbox=outbox))
+            inbox = outbox
+        self.output = inbox
+
+    def start(self):
+        for stage in self.stages:
+            stage.start()
+        return self
+
+    def get(self, timeout=None):
+        """取最后一级的最新输出"""
+        return self.output.get(timeout=timeout) if self.output is not None else None
+
+    @property
+    def alive(self):
+        return all(stage.running for stage in self.stages)
+
+    def stats(self):
+        """各级帧率、平均耗时和交接丢弃数"""
+        return {
+            stage.name: {
+                'fps': stage.fps,
+                'avg_ms': stage.avg_ms,
+                'processed': stage.processed,
+                'dropped': slot.dropped,
+                'last_seq': stage.last_seq,
+            }
+            for stage, slot in zip(self.stages, self.slots)
+        }
+
+    def stop(self):
+        for slot in self.slots:
+            slot.close()
+        for stage in self.stages:
+            stage.stop()
@@ -0,0 +1,217 @@
+"""
+轻量级性能分析
+- 命名区间 (span)：with profiler.span('gallery.render'): ...
+- 每个区间保留最近 N 次耗时，计算 p50 / p95 / p99
+- 计数器：profiler.incr('scheduler.skip_emotion')
+- 可选叠加面板 (画在组合视图空着的中下格子)
+- 定期导出 CSV (追加历史) 和 JSON (最新快照)，现场排查掉帧不需要挂 profiler
+
+全局共享一个实例 `profiler`，由 main.py 根据 config 配置；未启用时 span 几乎零开销
+"""
+
+import csv
+import json
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+import cv2
+import numpy as np
+
+
+class Profiler:
+    """命名区间耗时统计 + 计数器"""
+
+    def __init__(self, enabled=True, window=300):
+        self.enabled = enabled
+        self.window = window
+        self._samples = {}      # name -> deque[秒]
+        self._totals = {}       # name -> 累计次数
+        self._counters = {}     # name -> int
+        self._lock = threading.Lock()
+
+        # 定期导出
+        self.dump_interval = 0.0
+        self.dump_dir = None
+        self._last_dump = time.time()
+
+    def configure(self, enabled=None, window=None, dump_interval=None, dump_dir=None):
+        if enabled is not None:
+            self.enabled = enabled
+        if window is not None and window != self.window:
+            self.window = window
+            with self._lock:
+                self._samples = {k: deque(v, maxlen=window) for k, v in self._samples.items()}
+        if dump_interval is not None:
+            self.dump_interval = dump_interval
+        if dump_dir is not None:
+            self.dump_dir = dump_dir
+        return self
+
+    # ------------------------------------------------------------
+    # 记录
+    # ------------------------------------------------------------
+    def record(self, name, seconds):
+        """记录一次耗时 (秒)"""
+        if not self.enabled:
+            return
+        with self._lock:
+            samples = self._samples.get(name)
+            if samples is None:
+                samples = self._samples[name] = deque(maxlen=self.window)
+                self._totals[name] = 0
+            samples.append(seconds)
+            self._totals[name] += 1
+
+    @contextmanager
+    def span(self, name):
+        """统计 with 块的耗时"""
+        if not self.enabled:
+            yield
+            return
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - t0)
+
+    def timed(self, name):
+        """装饰器版本的 span"""
+        def decorator(fn):
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return fn(*args, **kwargs)
+                t0 = time.perf_counter()
+                try:
+                    return fn(*args, **kwargs)
+                finally:
+                    self.record(name, time.perf_counter() - t0)
+            wrapper.__name__ = fn.__name__
+            wrapper.__doc__ = fn.__doc__
+            return wrapper
+        return decorator
+
+    def incr(self, name, n=1):
+        """计数器加 n"""
+        if not self.enabled:
+            return
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + n
+
+    # ------------------------------------------------------------
+    # 统计
+    # ------------------------------------------------------------
+    def snapshot(self):
+        """
+        所有区间的滚动统计 (毫秒) 和计数器
+        返回: {'spans': {name: {count, last, mean, p50, p95, p99, max}}, 'counters': {...}}
+        """
+        with self._lock:
+            samples = {k: np.fromiter(v, dtype=np.float64) for k, v in self._samples.items() if v}
+            totals = dict(self._totals)
+            counters = dict(self._counters)
+
+        spans = {}
+        for name, values in samples.items():
+            ms = values * 1000.0
+            p50, p95, p99 = np.percentile(ms, [50, 95, 99])
+            spans[name] = {
+                'count': totals[name],
+                'last': float(ms[-1]),
+                'mean': float(ms.mean()),
+                'p50': float(p50),
+                'p95': float(p95),
+                'p99': float(p99),
+                'max': float(ms.max()),
+            }
+        return {'time': time.time(), 'spans': spans, 'counters': counters}
+
+    def reset(self):
+        with self._lock:
+            self._samples.clear()
+            self._totals.clear()
+            self._counters.clear()
+
+    # ------------------------------------------------------------
+    # 导出
+    # ------------------------------------------------------------
+    def maybe_dump(self):
+        """到达导出间隔时写出 CSV/JSON (在主循环里每帧调用即可)"""
+        if not self.enabled or not self.dump_interval or not self.dump_dir:
+            return
+        now = time.time()
+        if now - self._last_dump < self.dump_interval:
+            return
+        self._last_dump = now
+        try:
+            self.dump(self.dump_dir)
+        except Exception as e:
+            print(f"⚠ 性能数据导出失败: {e}")
+
+    def dump(self, directory):
+        """CSV 追加一行/区间 (历史趋势)，JSON 覆盖为最新快照"""
+        os.makedirs(directory, exist_ok=True)
+        snap = self.snapshot()
+
+        csv_path = os.path.join(directory, 'profile.csv')
+        new_file = not os.path.exists(csv_path)
+        with open(csv_path, 'a', newline='', encoding='utf-8') as f:
+            writer = csv.writer(f)
+            if new_file:
+                writer.writerow(['time', 'name', 'count', 'mean_ms', 'p50_ms', 'p95_ms', 'p99_ms', 'max_ms'])
+            stamp = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(snap['time']))
+            for name, s in sorted(snap['spans'].items()):
+                writer.writerow([stamp, name, s['count'], f"{s['mean']:.2f}", f"{s['p50']:.2f}",
+                                 f"{s['p95']:.2f}", f"{s['p99']:.2f}", f"{s['max']:.2f}"])
+            for name, value in sorted(snap['counters'].items()):
+                writer.writerow([stamp, name, value, '', '', '', '', ''])
+
+        with open(os.path.join(directory, 'profile_latest.json'), 'w', encoding='utf-8') as f:
+            json.dump(snap, f, indent=2)
+
+    # ------------------------------------------------------------
+    # 叠加面板
+    # ------------------------------------------------------------
+    def draw_panel(self, canvas, names=None, extra_lines=None):
+        """
+        在 canvas 上绘制统计面板 (每行: 区间名 p50 p95 p99)
+        names: 要显示的区间 (默认按 p95 从大到小取前几个)
+        extra_lines: 面板顶部额外显示的文字 (例如 FPS / 端到端延迟)
+        """
+        h, w = canvas.shape[:2]
+        font = cv2.FONT_HERSHEY_SIMPLEX
+        scale = 0.42
+        line_h = 17
+        y = 18
+
+        for text in extra_lines or []:
+            cv2.putText(canvas, text, (8, y), font, scale, (0, 255, 0), 1, cv2.LINE_AA)
+            y += line_h
+
+        spans = self.snapshot()['spans']
+        if names is None:
+            names = sorted(spans, key=lambda n: -spans[n]['p95'])
+        max_lines = max(0, (h - y - 4) // line_h - 1)
+
+        # Hershey 字体不是等宽的，数值列按固定 x 坐标对齐
+        columns = [w - 160, w - 105, w - 50]
+
+        def row(label, values, color):
+            cv2.putText(canvas, label, (8, y), font, scale, color, 1, cv2.LINE_AA)
+            for x, value in zip(columns, values):
+                cv2.putText(canvas, value, (x, y), font, scale, color, 1, cv2.LINE_AA)
+
+        row('STAGE (ms)', ['p50', 'p95', 'p99'], (160, 160, 160))
+        y += line_h
+        for name in [n for n in names if n in spans][:max_lines]:
+            s = spans[name]
+            color = (0, 0, 255) if s['p95'] > 50 else (0, 200, 255) if s['p95'] > 20 else (220, 220, 220)
+            row(name, [f"{s['p50']:.1f}", f"{s['p95']:.1f}", f"{s['p99']:.1f}"], color)
+            y += line_h
+        return canvas
+
+
+# 全局共享实例 (main.py 按 config 配置)
+profiler = Profiler()
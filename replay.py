@@ -0,0 +1,165 @@
+"""
+录像回放源
+- 把视频文件或图片目录伪装成 ThreadedCamera (isOpened / start / read / get_stats / release)，
+  GalleryView 和基准测试工具无需摄像头即可跑完整流水线
+- 默认按消费速度逐帧读取 (不丢帧，结果可复现)；realtime=True 时按源帧率推进，
+  跟不上的帧会被跳过，模拟现场摄像头的行为
+"""
+
+import os
+import time
+
+import cv2
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp')
+
+
+class ReplaySource:
+    """视频文件 / 图片目录回放"""
+
+    def __init__(self, path, flip=False, loop=False, realtime=False, fps=None, max_frames=None):
+        """
+        Args:
+            path: 视频文件或图片目录
+            flip: 是否水平镜像 (录的是摄像头原始画面时设为 True，与 ThreadedCamera 一致)
+            loop: 播放完后是否从头循环
+            realtime: 是否按源帧率推进 (False = 尽可能快，每次 read 返回下一帧)
+            fps: 覆盖源帧率 (图片目录默认 30)
+            max_frames: 最多回放的帧数
+        """
+        self.path = path
+        self.flip = flip
+        self.loop = loop
+        self.realtime = realtime
+        self.max_frames = max_frames
+
+        self._cap = None
+        self._files = None
+        if os.path.isdir(path):
+            self._files = sorted(os.path.join(path, n) for n in os.listdir(path)
+                                 if n.lower().endswith(IMAGE_EXTENSIONS))
+            self.source_fps = fps or 30.0
+        else:
+            self._cap = cv2.VideoCapture(path)
+            self.source_fps = fps or self._cap.get(cv2.CAP_PROP_FPS) or 30.0
+
+        self._index = 0
+        self._seq = 0
+        self._start_time = None
+        self.running = False
+
+        # 与 ThreadedCamera 相同的统计字段
+        self.frames_read = 0
+        self.frames_dropped = 0
+        self.read_failures = 0
+        self.last_read_latency = 0.0
+
+        first = self._peek_size()
+        self.height, self.width = first if first else (0, 0)
+
+    def _peek_size(self):
+        if self._files:
+            img = cv2.imread(self._files[0])
+            return img.shape[:2] if img is not None else None
+        if self._cap is not None and self._cap.isOpened():
+            w = int(self._cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+            h = int(self._cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+            return (h, w) if w and h else None
+        return None
+
+    def isOpened(self):
+        if self._files is not None:
+            return len(self._files) > 0
+        return self._cap is not None and self._cap.isOpened()
+
+    def get(self, prop_id):
+        if prop_id == cv2.CAP_PROP_FPS:
+            return self.source_fps
+        if self._cap is not None:
+            return self._cap.get(prop_id)
+        return 0.0
+
+    def start(self):
+        self.running = self.isOpened()
+        self._start_time = time.time()
+        return self
+
+    def _rewind(self):
+        self._index = 0
+        if self._cap is not None:
+            self._cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+
+    def _decode_next(self):
+        """解码下一帧，到结尾返回 None"""
+        if self._files is not None:
+            while self._index < len(self._files):
+                img = cv2.imread(self._files[self._index])
+                self._index += 1
+                if img is not None:
+                    return img
+                self.read_failures += 1
+            return None
+        ret, frame = self._cap.read()
+        if not ret:
+            return None
+        self._index += 1
+        return frame
+
+    def _skip(self, count):
+        for _ in range(count):
+            if self._files is not None:
+                self._index += 1
+            elif not self._cap.grab():
+                return
+            else:
+                self._index += 1
+            self.frames_dropped += 1
+
+    def read(self, timeout=1.0):
+        """返回: (ret, frame, timestamp, seq)，与 ThreadedCamera.read 一致"""
+        if not self.running:
+            return False, None, 0.0, -1
+        if self.max_frames is not None and self.frames_read >= self.max_frames:
+            self.running = False
+            return False, None, 0.0, -1
+
+        if self.realtime:
+            # 按墙钟时间推进：跳过已经“过去”的帧，提前了就等
+            due_index = int((time.time() - self._start_time) * self.source_fps)
+            if due_index > self._index:
+                self._skip(due_index - self._index)
+            elif due_index < self._index:
+                time.sleep((self._index - due_index) / self.source_fps)
+
+        frame = self._decode_next()
+        if frame is None and self.loop:
+            self._rewind()
+            self._start_time = time.time()
+            frame = self._decode_next()
+        if frame is None:
+            self.running = False
+            return False, None, 0.0, -1
+
+        if self.flip:
+            frame = cv2.flip(frame, 1)
+
+        timestamp = time.time()
+        seq = self._seq
+        self._seq += 1
+        self.frames_read += 1
+        return True, frame, timestamp, seq
+
+    def get_stats(self):
+        return {
+            'captured': self._index,
+            'read': self.frames_read,
+            'dropped': self.frames_dropped,
+            'failures': self.read_failures,
+            'capture_fps': self.source_fps,
+            'latency_ms': self.last_read_latency * 1000.0,
+        }
+
+    def release(self):
+        self.running = False
+        if self._cap is not None:
+            self._cap.release()
@@ -0,0 +1,241 @@
+"""
+关键点人形轮廓 (silhouette) 光栅化
+- 只在人物周围的 ROI 内绘制 (bbox ∪ 关键点范围，外扩 ROI_MARGIN)，不再为每个人分配整帧 mask
+- ROI 外扩量大于绘制线宽和形态学操作的影响范围，结果与整帧绘制逐像素一致 (scale=1 时)
+- 可选降分辨率绘制 (scale=0.5 / 0.25)，需要整帧 mask 时再放大
+- SilhouetteCache 按 track_id 缓存本帧结果，取色、特效回退 mask、GalleryView 共用同一份
+"""
+
+import cv2
+import numpy as np
+
+# 关键点置信度阈值 / 最少可见关键点数
+KEYPOINT_CONF = 0.3
+MIN_VISIBLE_KEYPOINTS = 5
+
+# ROI 外扩像素 (四肢线宽一半 15 + 圆半径 15 + 形态学 CLOSE/膨胀 最多扩张 6，取 32 留余量)
+ROI_MARGIN = 32
+
+# 身体部位的关键点组（用于创建更精确的轮廓）
+BODY_PARTS = {
+    'head': [0, 1, 2, 3, 4],  # 头部
+    'torso': [5, 6, 11, 12],  # 躯干
+    'left_arm': [5, 7, 9],  # 左臂
+    'right_arm': [6, 8, 10],  # 右臂
+    'left_leg': [11, 13, 15],  # 左腿
+    'right_leg': [12, 14, 16],  # 右腿
+}
+
+_MORPH_KERNEL = np.ones((5, 5), np.uint8)
+
+
+class Silhouette:
+    """一个人的轮廓 mask：mask 覆盖原图中 [x0, x0 + w/scale) × [y0, y0 + h/scale) 的区域"""
+
+    __slots__ = ('mask', 'x0', 'y0', 'scale')
+
+    def __init__(self, mask, x0, y0, scale=1.0):
+        self.mask = mask
+        self.x0 = x0
+        self.y0 = y0
+        self.scale = scale
+
+    @property
+    def rect(self):
+        """在原图坐标中覆盖的区域 (x1, y1, x2, y2)"""
+        h, w = self.mask.shape[:2]
+        return (self.x0, self.y0,
+                self.x0 + int(round(w / self.scale)), self.y0 + int(round(h / self.scale)))
+
+    def crop(self, x1, y1, x2, y2):
+        """
+        原图坐标区域 [x1, x2) × [y1, y2) 的 mask (原分辨率)
+        区域在 ROI 内且 scale=1 时直接返回视图，否则返回新数组 (ROI 外补 0)
+        """
+        if self.scale == 1.0:
+            h, w = self.mask.shape[:2]
+            if self.x0 <= x1 and self.y0 <= y1 and x2 <= self.x0 + w and y2 <= self.y0 + h:
+                return self.mask[y1 - self.y0:y2 - self.y0, x1 - self.x0:x2 - self.x0]
+        out = np.zeros((max(0, y2 - y1), max(0, x2 - x1)), dtype=np.uint8)
+        self.paste(out, x1, y1)
+        return out
+
+    def paste(self, canvas, cx=0, cy=0):
+        """把轮廓 OR 到 canvas 上 (canvas 左上角对应原图坐标 (cx, cy))"""
+        rx1, ry1, rx2, ry2 = self.rect
+        ch, cw = canvas.shape[:2]
+        dx1, dy1 = max(0, rx1 - cx), max(0, ry1 - cy)
+        dx2, dy2 = min(cw, rx2 - cx), min(ch, ry2 - cy)
+        if dx2 <= dx1 or dy2 <= dy1:
+            return canvas
+        mask = self.mask
+        if self.scale != 1.0:
+            mask = cv2.resize(mask, (rx2 - rx1, ry2 - ry1), interpolation=cv2.INTER_LINEAR)
+            _, mask = cv2.threshold(mask, 127, 255, cv2.THRESH_BINARY)
+        src = mask[dy1 + cy - ry1:dy2 + cy - ry1, dx1 + cx - rx1:dx2 + cx - rx1]
+        dst = canvas[dy1:dy2, dx1:dx2]
+        cv2.bitwise_or(dst, src, dst=dst)
+        return canvas
+
+
+def _visible_keypoints(keypoints, img_h, img_w):
+    """可见关键点 {下标: (x, y)}，坐标限制在图像内"""
+    visible = {}
+    for idx, kpt in enumerate(keypoints):
+        if len(kpt) >= 3 and kpt[2] > KEYPOINT_CONF:
+            x, y = int(kpt[0]), int(kpt[1])
+            visible[idx] = (max(0, min(x, img_w - 1)), max(0, min(y, img_h - 1)))
+    return visible
+
+
+def _roi_rect(bbox, points, img_h, img_w, margin):
+    """bbox 与关键点范围的并集外扩 margin，限制在图像内"""
+    xs, ys = [], []
+    if bbox:
+        x1, y1, x2, y2 = bbox
+        xs += [int(x1), int(x2)]
+        ys += [int(y1), int(y2)]
+    if points:
+        pts = np.array(points)
+        xs += [int(pts[:, 0].min()), int(pts[:, 0].max())]
+        ys += [int(pts[:, 1].min()), int(pts[:, 1].max())]
+    if not xs:
+        return 0, 0, 0, 0
+    x1 = max(0, min(xs) - margin)
+    y1 = max(0, min(ys) - margin)
+    x2 = min(img_w, max(xs) + margin + 1)
+    y2 = min(img_h, max(ys) + margin + 1)
+    return x1, y1, max(x1, x2), max(y1, y2)
+
+
+def _draw_bbox_ellipse(mask, bbox, ox, oy, scale):
+    x1, y1, x2, y2 = bbox
+    center_x = int((x1 + x2) / 2)
+    center_y = int((y1 + y2) / 2)
+    width = int(x2 - x1)
+    height = int(y2 - y1)
+    if scale == 1.0:
+        cv2.ellipse(mask, (center_x - ox, center_y - oy), (width // 2, height // 2), 0, 0, 360, 255, -1)
+    else:
+        cv2.ellipse(mask, (int((center_x - ox) * scale), int((center_y - oy) * scale)),
+                    (int(width // 2 * scale), int(height // 2 * scale)), 0, 0, 360, 255, -1)
+
+
+def rasterize_silhouette(keypoints, bbox, img_h, img_w, scale=1.0, margin=ROI_MARGIN):
+    """
+    从关键点创建人体轮廓，只在人物 ROI 内绘制
+    使用关键点连接和形态学操作来创建更准确的人形；关键点不足时用 bbox 椭圆
+    scale: ROI 的绘制分辨率 (1.0 = 原分辨率，与整帧绘制逐像素一致)
+    返回 Silhouette
+    """
+    visible = _visible_keypoints(keypoints, img_h, img_w) \
+        if keypoints is not None and len(keypoints) >= 17 else {}
+    use_keypoints = len(visible) >= MIN_VISIBLE_KEYPOINTS
+
+    rx1, ry1, rx2, ry2 = _roi_rect(bbox, list(visible.values()) if use_keypoints else None,
+                                   img_h, img_w, margin)
+    roi_w = max(1, int(round((rx2 - rx1) * scale)))
+    roi_h = max(1, int(round((ry2 - ry1) * scale)))
+    mask = np.zeros((roi_h, roi_w), dtype=np.uint8)
+
+    if not use_keypoints:
+        # 没有关键点或关键点太少，使用bbox创建椭圆
+        if bbox:
+            _draw_bbox_ellipse(mask, bbox, rx1, ry1, scale)
+        return Silhouette(mask, rx1, ry1, scale)
+
+    def local(pt):
+        if scale == 1.0:
+            return (pt[0] - rx1, pt[1] - ry1)
+        return (int((pt[0] - rx1) * scale), int((pt[1] - ry1) * scale))
+
+    def size(value):
+        return value if scale == 1.0 else max(1, int(round(value * scale)))
+
+    # 方法1: 为每个身体部位创建轮廓
+    for part_name, part_indices in BODY_PARTS.items():
+        part_points = [local(visible[idx]) for idx in part_indices if idx in visible]
+        if len(part_points) < 2:
+            continue
+        part_points = np.array(part_points, dtype=np.int32)
+
+        if part_name == 'head' and len(part_points) >= 3:
+            # 头部使用椭圆
+            min_x, min_y = part_points.min(axis=0)
+            max_x, max_y = part_points.max(axis=0)
+            center_x = (min_x + max_x) // 2
+            center_y = (min_y + max_y) // 2
+            width = max(size(20), max_x - min_x)
+            height = max(size(20), max_y - min_y)
+            cv2.ellipse(mask, (int(center_x), int(center_y)), (int(width // 2), int(height // 2)),
+                        0, 0, 360, 255, -1)
+        elif part_name == 'torso' and len(part_points) >= 3:
+            # 躯干使用凸包
+            hull = cv2.convexHull(part_points)
+            cv2.fillPoly(mask, [hull], 255)
+        else:
+            # 四肢使用连接线加宽度
+            if part_name in ('left_arm', 'right_arm'):
+                thickness = 25
+            elif part_name in ('left_leg', 'right_leg'):
+                thickness = 30
+            else:
+                thickness = 20
+            for i in range(len(part_points) - 1):
+                cv2.line(mask, tuple(part_points[i]), tuple(part_points[i + 1]), 255, size(thickness))
+            # 在关键点位置绘制圆
+            for pt in part_points:
+                cv2.circle(mask, tuple(pt), size(thickness // 2), 255, -1)
+
+    # 方法2: 所有关键点的凸包作为基础 (直接填充到同一张 mask 上，等价于 OR)
+    all_points = np.array([local(p) for p in visible.values()], dtype=np.int32)
+    if len(all_points) >= 3:
+        cv2.fillPoly(mask, [cv2.convexHull(all_points)], 255)
+
+    # 方法3: 形态学操作平滑和填充轮廓 (先膨胀再腐蚀填充小洞，再轻微腐蚀/膨胀平滑边缘)
+    kernel = _MORPH_KERNEL if scale >= 0.75 else np.ones((3, 3), np.uint8)
+    mask = cv2.morphologyEx(mask, cv2.MORPH_CLOSE, kernel, iterations=2)
+    mask = cv2.erode(mask, kernel, iterations=1)
+    mask = cv2.dilate(mask, kernel, iterations=1)
+    return Silhouette(mask, rx1, ry1, scale)
+
+
+class SilhouetteCache:
+    """
+    按 track_id 缓存当前帧的轮廓
+    同一帧内 (frame_id 相同) 同一轨迹、同一 bbox 只绘制一次；换帧后旧结果自动失效
+    """
+
+    def __init__(self, scale=1.0):
+        self.scale = scale
+        self._frame_id = None
+        self._entries = {}   # track_id -> (bbox, Silhouette)
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, person, img_h, img_w, frame_id=None):
+        """person: 含 'bbox' / 'keypoints' (可选 'track_id') 的检测结果"""
+        if frame_id != self._frame_id:
+            self._frame_id = frame_id
+            self._entries = {}
+
+        bbox = person.get('bbox')
+        key = person.get('track_id')
+        if key is not None and frame_id is not None:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == tuple(bbox or ()):
+                self.hits += 1
+                return entry[1]
+
+        self.misses += 1
+        sil = rasterize_silhouette(person.get('keypoints'), bbox, img_h, img_w, scale=self.scale)
+        if key is not None and frame_id is not None:
+            self._entries[key] = (tuple(bbox or ()), sil)
+        return sil
+
+    def combined_mask(self, persons, img_h, img_w, frame_id=None):
+        """所有人的轮廓合并成一张整帧 mask (只分配这一张整帧数组)"""
+        mask = np.zeros((img_h, img_w), dtype=np.uint8)
+        for person in persons:
+            self.get(person, img_h, img_w, frame_id).paste(mask)
+        return mask
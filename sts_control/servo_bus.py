@@ -0,0 +1,225 @@
+"""
+舵机总线线程 - 独占 STSServoSerial 串口
+- 视觉/追踪线程只把目标位置写进每个电机的“最新值”槽位，不碰串口、不等待
+- 总线线程按固定频率把有更新的槽位合并成一个 SYNC WRITE；发送前被覆盖的旧目标直接丢弃 (合并计数)
+- 每隔若干个周期插入一次批量遥测读取 (read_telemetry)，结果缓存供其他线程查询
+- 扭矩开关等一次性命令走有界队列 (COMMAND_QUEUE_SIZE)，在总线线程上按顺序执行
+- 统计: 实际循环频率、写入/遥测频率、队列深度、合并/丢弃数、超时周期
+"""
+import queue
+import threading
+import time
+
+
+class ServoBusManager:
+    """固定频率的舵机总线 I/O 线程"""
+
+    def __init__(self, driver, servo_ids=(1, 2, 3, 4), rate_hz=100, telemetry_every=5, queue_size=10):
+        """
+        Args:
+            driver: STSServoSerial (启动后只由总线线程使用)
+            servo_ids: 遥测读取的舵机 ID
+            rate_hz: 总线循环频率 (每周期最多一个 SYNC WRITE)
+            telemetry_every: 每隔多少个周期读一次遥测 (至少 1，等待到位和巡航都依赖遥测)
+            queue_size: 一次性命令队列长度
+        """
+        self.driver = driver
+        self.servo_ids = tuple(servo_ids)
+        self.rate_hz = rate_hz
+        self.period = 1.0 / rate_hz
+        self.telemetry_every = max(1, int(telemetry_every))
+
+        self._lock = threading.Lock()
+        self._goals = {}            # 舵机 ID -> (position, move_time, speed)，尚未发送的最新目标
+        self._telemetry = {}        # 舵机 ID -> ServoTelemetry
+        self._telemetry_time = {}   # 舵机 ID -> 读取时间 (time.monotonic)
+        self._commands = queue.Queue(maxsize=queue_size)
+
+        self.running = False
+        self._thread = None
+
+        # 统计
+        self.cycles = 0
+        self.goal_updates = 0
+        self.coalesced = 0          # 发送前被新目标覆盖的旧目标
+        self.sync_writes = 0
+        self.telemetry_reads = 0
+        self.telemetry_misses = 0   # 没有应答的舵机次数
+        self.commands_done = 0
+        self.commands_dropped = 0   # 队列已满被拒绝的命令
+        self.overruns = 0           # 一个周期的总线操作超过周期时长
+        self.errors = 0
+        self.bus_rate = 0.0         # 实际循环频率 (Hz)
+        self.write_rate = 0.0       # SYNC WRITE 频率 (Hz)
+        self.telemetry_rate = 0.0   # 遥测读取频率 (Hz)
+        self.busy_ms = 0.0          # 每周期总线操作耗时 (指数平均)
+        self._window_start = time.monotonic()
+        self._window_counts = (0, 0, 0)
+
+    # ------------------------------------------------------------
+    # 生命周期
+    # ------------------------------------------------------------
+    def start(self):
+        """启动总线线程"""
+        if self.running:
+            return self
+        self.running = True
+        self._window_start = time.monotonic()
+        self._thread = threading.Thread(target=self._loop, name="servo-bus", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self, flush=True, timeout=1.0):
+        """
+        停止总线线程；确认线程已退出后，flush=True 时在调用线程上发送剩余的命令和目标
+        返回 True 表示线程已退出 (之后可以直接使用 driver)；
+        超时仍未退出 (例如卡在一次读取里) 时不发送、返回 False，避免两个线程同时使用串口
+        """
+        self.running = False
+        thread = self._thread
+        if thread is not None and thread is not threading.current_thread():
+            thread.join(timeout=timeout)
+            if thread.is_alive():
+                print("⚠ 舵机总线线程未能及时退出，跳过剩余命令和目标")
+                return False
+        self._thread = None
+        if flush:
+            self._run_commands()
+            self._flush_goals()
+        return True
+
+    # ------------------------------------------------------------
+    # 其他线程调用 (不阻塞)
+    # ------------------------------------------------------------
+    def set_goal(self, servo_id, position, move_time=0, speed=0):
+        """更新一个电机的目标；上一个目标还没发送时被覆盖"""
+        self.set_goals({servo_id: (position, move_time, speed)})
+
+    def set_goals(self, targets):
+        """
+        更新多个电机的目标 (写入最新值槽位，下一个周期合并发送)
+        targets: {舵机 ID: (position, move_time, speed)}，与 sync_write_positions 相同
+        """
+        with self._lock:
+            for servo_id, goal in targets.items():
+                if servo_id in self._goals:
+                    self.coalesced += 1
+                self._goals[servo_id] = tuple(goal)
+                self.goal_updates += 1
+
+    def submit(self, method, *args, **kwargs):
+        """
+        把一次性命令 (driver 的方法名 + 参数) 放进队列，由总线线程按顺序执行
+        队列已满返回 False
+        """
+        try:
+            self._commands.put_nowait((method, args, kwargs))
+            return True
+        except queue.Full:
+            self.commands_dropped += 1
+            return False
+
+    def get_telemetry(self, servo_id, max_age=None):
+        """最近一次遥测 (ServoTelemetry)；没有或超过 max_age 秒返回 None"""
+        with self._lock:
+            telemetry = self._telemetry.get(servo_id)
+            timestamp = self._telemetry_time.get(servo_id, 0.0)
+        if telemetry is None or (max_age is not None and time.monotonic() - timestamp > max_age):
+            return None
+        return telemetry
+
+    def telemetry(self):
+        """所有舵机最近一次遥测 {舵机 ID: ServoTelemetry}"""
+        with self._lock:
+            return dict(self._telemetry)
+
+    def stats(self):
+        """总线统计 (供调试/叠加显示)"""
+        with self._lock:
+            pending = len(self._goals)
+        return {
+            'rate_hz': self.bus_rate,
+            'target_hz': self.rate_hz,
+            'write_hz': self.write_rate,
+            'telemetry_hz': self.telemetry_rate,
+            'queue_depth': self._commands.qsize(),
+            'pending_goals': pending,
+            'goal_updates': self.goal_updates,
+            'coalesced': self.coalesced,
+            'dropped': self.commands_dropped,
+            'overruns': self.overruns,
+            'telemetry_misses': self.telemetry_misses,
+            'busy_ms': self.busy_ms,
+            'errors': self.errors,
+        }
+
+    # ------------------------------------------------------------
+    # 总线线程
+    # ------------------------------------------------------------
+    def _loop(self):
+        next_tick = time.monotonic()
+        while self.running:
+            start = time.monotonic()
+            try:
+                self._run_commands()
+                self._flush_goals()
+                if self.cycles % self.telemetry_every == 0:
+                    self._read_telemetry()
+            except Exception as e:
+                self.errors += 1
+                if self.errors == 1 or self.errors % 100 == 0:
+                    print(f"Servo bus error ({self.errors}): {e}")
+            self.cycles += 1
+
+            now = time.monotonic()
+            self.busy_ms += 0.1 * ((now - start) * 1000.0 - self.busy_ms)
+            self._update_rates(now)
+
+            next_tick += self.period
+            delay = next_tick - now
+            if delay <= 0:
+                # 落后时不补发积压的周期，从现在重新计时
+                self.overruns += 1
+                next_tick = now
+                continue
+            time.sleep(delay)
+
+    def _run_commands(self):
+        while True:
+            try:
+                method, args, kwargs = self._commands.get_nowait()
+            except queue.Empty:
+                return
+            try:
+                getattr(self.driver, method)(*args, **kwargs)
+            except Exception as e:
+                print(f"⚠ 舵机命令 {method} 失败: {e}")
+            self.commands_done += 1
+
+    def _flush_goals(self):
+        with self._lock:
+            goals, self._goals = self._goals, {}
+        if goals:
+            self.driver.sync_write_positions(goals)
+            self.sync_writes += 1
+
+    def _read_telemetry(self):
+        telemetry = self.driver.read_telemetry(self.servo_ids)
+        now = time.monotonic()
+        with self._lock:
+            self._telemetry.update(telemetry)
+            for servo_id in telemetry:
+                self._telemetry_time[servo_id] = now
+        self.telemetry_reads += 1
+        self.telemetry_misses += len(self.servo_ids) - len(telemetry)
+
+    def _update_rates(self, now):
+        elapsed = now - self._window_start
+        if elapsed < 1.0:
+            return
+        cycles, writes, reads = self._window_counts
+        self.bus_rate = (self.cycles - cycles) / elapsed
+        self.write_rate = (self.sync_writes - writes) / elapsed
+        self.telemetry_rate = (self.telemetry_reads - reads) / elapsed
+        self._window_counts = (self.cycles, self.sync_writes, self.telemetry_reads)
+        self._window_start = now
@@ -0,0 +1,239 @@
+"""
+STS 舵机总线模拟器 - 协议级假串口
+用于没有机械臂的环境 (离线基准测试、CI)：
+- 实现 STSServoSerial 用到的 pyserial 接口 (write / read / in_waiting / reset_*_buffer / flush / close)
+- 解析 Feetech 数据包 (FF FF ID LEN INST PARAMS CHK)，按寄存器表应答 (PING / READ / WRITE / SYNC READ / SYNC WRITE)
+- 简单的运动模型：当前位置按运行速度向目标位置移动，到位前 Moving 标志为 1
+"""
+import time
+
+
+class SimulatedServo:
+    """单个舵机的寄存器表 + 运动模型"""
+
+    def __init__(self, servo_id, position=2048):
+        self.id = servo_id
+        self.regs = bytearray(256)
+        self.regs[0x05] = servo_id
+        self.regs[0x3E] = 120   # 12.0V
+        self.regs[0x3F] = 35    # 35°C
+        self._set_word(0x0B, 4095)  # 最大位置限制
+        self.position = float(position)
+        self._set_word(0x2A, position)
+        self._sync_present()
+
+    def _word(self, addr):
+        return self.regs[addr] | (self.regs[addr + 1] << 8)
+
+    def _set_word(self, addr, value):
+        value = int(value) & 0xFFFF
+        self.regs[addr] = value & 0xFF
+        self.regs[addr + 1] = (value >> 8) & 0xFF
+
+    def _sync_present(self, speed=0.0, moving=False):
+        self._set_word(0x38, int(round(self.position)))
+        # 速度寄存器 bit15 为方向位
+        speed_word = min(0x7FFF, int(abs(speed)))
+        if speed < 0:
+            speed_word |= 0x8000
+        self._set_word(0x3A, speed_word)
+        self.regs[0x42] = 1 if moving else 0
+
+    def step(self, dt, time_scale=1.0, max_speed=3000.0):
+        """按经过的时间推进运动模型"""
+        goal = self._word(0x2A)
+        torque_on = self.regs[0x28] == 1
+        error = goal - self.position
+        if not torque_on or abs(error) < 1.0:
+            if torque_on:
+                self.position = float(goal)
+            self._sync_present()
+            return
+
+        speed = self._word(0x2E) or max_speed  # 速度 0 = 最大速度
+        move_time = self._word(0x2C)
+        if move_time > 0:
+            # 指定运行时间 (ms) 时按时间换算速度
+            speed = max(speed, abs(error) * 1000.0 / move_time)
+        travel = min(abs(error), speed * dt * time_scale)
+        direction = 1.0 if error > 0 else -1.0
+        self.position += direction * travel
+        self._sync_present(speed=direction * speed, moving=abs(goal - self.position) >= 1.0)
+
+    def write(self, addr, data):
+        for i, value in enumerate(data):
+            if addr + i < len(self.regs):
+                self.regs[addr + i] = value
+        # 写 128 到扭矩寄存器 = 一键中点校准
+        if addr == 0x28 and data and data[0] == 128:
+            self.position = 2048.0
+            self._set_word(0x2A, 2048)
+            self.regs[0x28] = 1
+            self._sync_present()
+
+    def read(self, addr, length):
+        return bytes(self.regs[addr:addr + length])
+
+
+class SimulatedServoPort:
+    """
+    模拟的舵机总线串口，可直接注入 STSServoSerial(serial_port=...)
+    time_scale > 1 时舵机运动更快 (缩短基准测试里归位/等待停止的时间)
+    """
+
+    INST_PING = 0x01
+    INST_READ = 0x02
+    INST_WRITE = 0x03
+    INST_SYNC_READ = 0x82
+    INST_SYNC_WRITE = 0x83
+    BROADCAST_ID = 0xFE
+
+    def __init__(self, servo_ids=(1, 2, 3, 4), initial_positions=None, time_scale=1.0,
+                 timeout=0.5, sync_read=True):
+        """sync_read=False 时模拟不支持 SYNC READ 的固件 (不应答)"""
+        initial_positions = initial_positions or {}
+        self.sync_read_enabled = sync_read
+        self.servos = {sid: SimulatedServo(sid, initial_positions.get(sid, 2048)) for sid in servo_ids}
+        self.time_scale = time_scale
+        self.timeout = timeout
+        self.is_open = True
+
+        self._rx = bytearray()      # 主机待读的应答
+        self._tx = bytearray()      # 主机写入、尚未凑成完整包的数据
+        self._last_step = time.time()
+
+        # 统计
+        self.packets = 0
+        self.bytes_written = 0
+        self.bytes_read = 0
+        self.checksum_errors = 0
+        self.sync_writes = 0
+        self.sync_reads = 0
+
+    # ------------------------------------------------------------
+    # pyserial 接口
+    # ------------------------------------------------------------
+    @property
+    def in_waiting(self):
+        return len(self._rx)
+
+    def reset_input_buffer(self):
+        self._rx.clear()
+
+    def reset_output_buffer(self):
+        pass
+
+    def flush(self):
+        pass
+
+    def write(self, data):
+        self._advance()
+        self.bytes_written += len(data)
+        self._tx.extend(data)
+        self._process_tx()
+        return len(data)
+
+    def read(self, size=1):
+        self._advance()
+        if size and not self._rx:
+            # 与 pyserial 一致：没有数据时等满读超时 (舵机不应答)
+            time.sleep(self.timeout or 0)
+            return b''
+        data = bytes(self._rx[:size])
+        del self._rx[:size]
+        self.bytes_read += len(data)
+        return data
+
+    def close(self):
+        self.is_open = False
+
+    # ------------------------------------------------------------
+    # 协议处理
+    # ------------------------------------------------------------
+    def _advance(self):
+        now = time.time()
+        dt = now - self._last_step
+        self._last_step = now
+        for servo in self.servos.values():
+            servo.step(dt, self.time_scale)
+
+    @staticmethod
+    def _checksum(body):
+        return (~sum(body)) & 0xFF
+
+    def _reply(self, servo_id, params=b'', error=0):
+        length = len(params) + 2
+        body = bytes([servo_id, length, error]) + bytes(params)
+        self._rx.extend(b'\xff\xff' + body + bytes([self._checksum(body)]))
+
+    def _process_tx(self):
+        """按与 STSServoSerial._read_status_packet 相同的规则切包 (包头重新对齐、校验失败后移一字节)"""
+        tx = self._tx
+        while len(tx) >= 4:
+            # 找包头 (连续 0xFF 时取最后两个)
+            if tx[0] != 0xFF or tx[1] != 0xFF or tx[2] == 0xFF:
+                start = tx.find(b'\xff\xff', 1)
+                while 0 <= start < len(tx) - 2 and tx[start + 2] == 0xFF:
+                    start += 1
+                # 没找到包头时保留末尾的 0xFF，它可能是跨两次 write 的包头前半
+                drop = start if start > 0 else len(tx) - (1 if tx[-1] == 0xFF else 0)
+                del tx[:drop]
+                continue
+            length = tx[3]
+            if length < 2:
+                del tx[0]
+                continue
+            total = length + 4
+            if len(tx) < total:
+                return
+            body = bytes(tx[2:total - 1])
+            if self._checksum(body) != tx[total - 1]:
+                self.checksum_errors += 1
+                del tx[0]
+                continue
+            packet = bytes(tx[:total])
+            del tx[:total]
+            self.packets += 1
+            self._handle(packet[2], packet[4], packet[5:-1])
+
+    def _handle(self, servo_id, instruction, params):
+        if instruction == self.INST_WRITE and len(params) >= 1:
+            targets = self.servos.values() if servo_id == self.BROADCAST_ID else \
+                [self.servos[servo_id]] if servo_id in self.servos else []
+            for servo in targets:
+                servo.write(params[0], params[1:])
+            if servo_id in self.servos:
+                self._reply(servo_id)
+            return
+
+        if instruction == self.INST_SYNC_WRITE and len(params) >= 2:
+            # 起始地址, 每个舵机的数据长度, [ID 数据...]×N；不应答
+            addr, data_len = params[0], params[1]
+            chunk = data_len + 1
+            for i in range(2, len(params) - chunk + 1, chunk):
+                servo = self.servos.get(params[i])
+                if servo is not None:
+                    servo.write(addr, params[i + 1:i + chunk])
+            self.sync_writes += 1
+            return
+
+        if instruction == self.INST_SYNC_READ and len(params) >= 2:
+            # 起始地址, 数据长度, ID 列表；总线上的舵机按列表顺序依次应答
+            if not self.sync_read_enabled:
+                return  # 模拟不支持 SYNC READ 的旧固件
+            addr, data_len = params[0], params[1]
+            for sid in params[2:]:
+                servo = self.servos.get(sid)
+                if servo is not None:
+                    self._reply(sid, servo.read(addr, data_len))
+            self.sync_reads += 1
+            return
+
+        servo = self.servos.get(servo_id)
+        if servo is None:
+            return  # 总线上没有这个 ID，不应答
+
+        if instruction == self.INST_PING:
+            self._reply(servo_id)
+        elif instruction == self.INST_READ and len(params) >= 2:
+            self._reply(servo_id, servo.read(params[0], params[1]))
@@ -2,7 +2,42 @@
 STS3215 舵机驱动 - 基于 Feetech 协议
 """
 import serial
+import struct
 import time
+from collections import namedtuple
+
+
+# 遥测寄存器块 0x38 - 0x42: 位置 / 速度 / 负载 (各 2 字节)、电压、温度、异步写标志、状态、移动标志
+TELEMETRY_STRUCT = struct.Struct('<HHHBBBBB')
+
+
+def _signed(value, sign_bit):
+    """Feetech 的符号位表示: sign_bit 置位为负，其余位为大小"""
+    magnitude = value & ((1 << sign_bit) - 1)
+    return -magnitude if value & (1 << sign_bit) else magnitude
+
+
+# 应答包 FF FF ID LEN ERR PARAMS CHK 解析后的内容 (ERR 为舵机错误/状态位)
+StatusPacket = namedtuple('StatusPacket', ['id', 'error', 'params'])
+
+
+class ServoTelemetry(namedtuple('ServoTelemetry',
+                                ['id', 'position', 'speed', 'load', 'voltage', 'temperature', 'status', 'moving'])):
+    """一个舵机的遥测快照 (由 TELEMETRY_STRUCT 解包)"""
+
+    __slots__ = ()
+
+    @classmethod
+    def unpack(cls, servo_id, data):
+        position, speed, load, voltage, temperature, _, status, moving = TELEMETRY_STRUCT.unpack(data)
+        return cls(servo_id, _signed(position, 15), _signed(speed, 15), _signed(load, 10),
+                   voltage * 0.1, temperature, status, moving == 1)
+
+    @property
+    def faults(self):
+        """状态字节解码，与 read_status 的返回格式一致"""
+        return STSServoSerial.decode_status(self.status)
+
 
 class STSServoSerial:
     """STS 舵机串口通信类"""
@@ -11,6 +46,11 @@ class STSServoSerial:
     INST_PING = 0x01
     INST_READ = 0x02
     INST_WRITE = 0x03
+    INST_SYNC_READ = 0x82
+    INST_SYNC_WRITE = 0x83
+    
+    # 广播 ID (SYNC WRITE / SYNC READ 发往该 ID)
+    BROADCAST_ID = 0xFE
     
     # 寄存器地址（参考 STS3215 官方文档）
     REG_TORQUE_ENABLE = 0x28       # 扭矩开关
@@ -32,15 +72,43 @@ class STSServoSerial:
     REG_MAX_POSITION_L = 0x0B      # 最大位置限制
     REG_OFFSET_L = 0x1F            # 位置修正（中点偏移）
     
-    def __init__(self, port, baudrate=1000000, timeout=0.5):
-        """初始化串口"""
+    # 遥测块: 从当前位置到移动标志
+    TELEMETRY_LENGTH = REG_MOVING_FLAG - REG_PRESENT_POSITION_L + 1
+    
+    def __init__(self, port, baudrate=1000000, timeout=0.5, serial_port=None, servo_ids=(1, 2, 3, 4),
+                 response_timeout=0.02):
+        """
+        初始化串口
+        timeout: 写超时 (秒)
+        serial_port: 可注入一个已打开的类串口对象 (例如 sim_servo.SimulatedServoPort)，
+                     此时忽略 port/baudrate，用于无硬件测试
+        servo_ids: 总线上的舵机 ID (read_telemetry 默认读取这些)
+        response_timeout: 读请求等待应答的超时 (秒)；同时作为串口读超时，只在这里设置一次
+                          (pyserial 每次修改 timeout 都会重新配置串口)
+        """
+        self.servo_ids = tuple(servo_ids)
+        self.response_timeout = response_timeout
+        # None = 还没试过；固件不支持 SYNC READ 时置为 False，之后逐个 READ
+        self.sync_read_supported = None
+        
+        # 应答接收缓冲 (流式解析) 与统计
+        self._rx = bytearray()
+        self.checksum_errors = 0  # 校验和错误的帧
+        self.resyncs = 0          # 为重新对齐包头丢弃数据的次数
+        
+        if serial_port is not None:
+            self.serial = serial_port
+            if self.serial.timeout != response_timeout:
+                self.serial.timeout = response_timeout
+            return
         self.serial = serial.Serial(
             port=port,
             baudrate=baudrate,
             bytesize=serial.EIGHTBITS,
             parity=serial.PARITY_NONE,
             stopbits=serial.STOPBITS_ONE,
-            timeout=timeout
+            timeout=response_timeout,
+            write_timeout=timeout
         )
         time.sleep(0.1)
     
@@ -68,33 +136,27 @@ class STSServoSerial:
             return False
         return True
     
-    def _read_response(self, expected_length=6):
-        """读取响应"""
+    def _write_packet(self, servo_id, instruction, params):
+        """
+        只写出数据包：不清空缓冲、不等待 (用于没有应答的广播 / SYNC WRITE)
+        """
+        length = len(params) + 2
+        checksum = self._calculate_checksum(servo_id, length, instruction, params)
+        packet = bytes([0xFF, 0xFF, servo_id, length, instruction] + params + [checksum])
+        
         try:
-            if self.serial.in_waiting < expected_length:
-                time.sleep(0.05)
-            
-            if self.serial.in_waiting >= expected_length:
-                response = self.serial.read(expected_length)
-                if len(response) >= expected_length:
-                    return response
+            self.serial.write(packet)
+            self.serial.flush()
         except Exception as e:
-            print(f"读取失败: {e}")
-        return None
+            print(f"发送失败: {e}")
+            return False
+        return True
     
-    def ping(self, servo_id):
-        """Ping 舵机"""
-        for attempt in range(3):
-            self.serial.reset_input_buffer()
-            self.serial.reset_output_buffer()
-            time.sleep(0.05)
-            
-            if self._send_packet(servo_id, self.INST_PING, []):
-                response = self._read_response(6)
-                if response and len(response) >= 6:
-                    if response[0] == 0xFF and response[1] == 0xFF and response[2] == servo_id:
-                        return True
-            time.sleep(0.1)
+    def ping(self, servo_id, retries=3):
+        """Ping 舵机 (每次尝试最多等待 response_timeout)"""
+        for attempt in range(retries):
+            if self._transact(servo_id, self.INST_PING, [], [servo_id], 0):
+                return True
         return False
     
     def set_id(self, old_id, new_id):
@@ -153,20 +215,174 @@ class STSServoSerial:
         self._send_packet(servo_id, self.INST_WRITE, [self.REG_GOAL_POSITION_L] + values)
         time.sleep(0.01)
     
+    def sync_write(self, start_addr, data_len, data):
+        """
+        SYNC WRITE (0x83)：一个数据包同时写多个舵机的同一段寄存器
+        data: {舵机 ID: [data_len 个字节]}
+        包格式: FF FF FE LEN 83 起始地址 数据长度 [ID 数据...]×N CHK，LEN = (数据长度 + 1) × N + 4
+        """
+        params = [start_addr, data_len]
+        for servo_id, values in data.items():
+            if len(values) != data_len:
+                raise ValueError(f"Motor {servo_id}: 需要 {data_len} 字节，实际 {len(values)}")
+            params += [servo_id] + list(values)
+        if len(params) + 2 > 0xFF:
+            raise ValueError(f"SYNC WRITE 数据包过长 ({len(data)} 个舵机)")
+        return self._write_packet(self.BROADCAST_ID, self.INST_SYNC_WRITE, params)
+    
+    def sync_write_positions(self, targets):
+        """
+        一个数据包更新多个舵机的目标位置 (位置 / 运行时间 / 速度，与 set_position 相同的 6 字节)
+        targets: {舵机 ID: (position, move_time, speed)}
+        没有应答，也不插入等待，四个关节一帧只占约 0.4 ms 总线时间 (1 Mbps)
+        """
+        data = {}
+        for servo_id, (position, move_time, speed) in targets.items():
+            position = max(0, min(4095, int(position)))
+            move_time = max(0, min(65535, int(move_time)))
+            speed = max(0, min(4095, int(speed)))
+            data[servo_id] = [position & 0xFF, (position >> 8) & 0xFF,
+                              move_time & 0xFF, (move_time >> 8) & 0xFF,
+                              speed & 0xFF, (speed >> 8) & 0xFF]
+        if not data:
+            return True
+        return self.sync_write(self.REG_GOAL_POSITION_L, 6, data)
+    
+    # ------------------------------------------------------------
+    # 应答解析：按长度字段流式读取，校验包头 / 长度 / 校验和 / ID
+    # ------------------------------------------------------------
+    def _fill(self, size, deadline):
+        """
+        接收缓冲不足 size 字节时从串口只读缺少的部分，直到读满 (True) 或超过 deadline (False)
+        每次 read 最多阻塞一个串口读超时 (= response_timeout)，deadline 在两次 read 之间检查，
+        所以一次请求最多等待 timeout + response_timeout；应答到齐时立即返回
+        """
+        while len(self._rx) < size:
+            if time.monotonic() >= deadline:
+                return False
+            try:
+                chunk = self.serial.read(size - len(self._rx))
+            except Exception as e:
+                print(f"读取失败: {e}")
+                return False
+            if chunk:
+                self._rx.extend(chunk)
+        return True
+    
+    def _read_status_packet(self, data_len, deadline):
+        """
+        从串口读出下一个完整、校验正确的应答包 (FF FF ID LEN ERR PARAMS CHK)
+        - 包头不在缓冲开头时丢弃前面的字节重新对齐 (连续 0xFF 时取最后两个)
+        - LEN 必须等于 data_len + 2，否则视为错位，后移一字节重新找包头
+        - 校验和错误同样后移一字节，包内可能藏着真正的包头
+        超时返回 None
+        """
+        rx = self._rx
+        while True:
+            if not self._fill(4, deadline):
+                return None
+            if rx[0] != 0xFF or rx[1] != 0xFF or rx[2] == 0xFF:
+                start = rx.find(b'\xff\xff', 1)
+                while 0 <= start < len(rx) - 2 and rx[start + 2] == 0xFF:
+                    start += 1
+                # 没找到包头时保留末尾的 0xFF，它可能是下一个包头的前半
+                drop = start if start > 0 else len(rx) - (1 if rx[-1] == 0xFF else 0)
+                del rx[:drop]
+                self.resyncs += 1
+                continue
+            length = rx[3]
+            if length != data_len + 2:
+                del rx[0]
+                self.resyncs += 1
+                continue
+            if not self._fill(length + 4, deadline):
+                return None
+            if (~sum(rx[2:length + 3])) & 0xFF != rx[length + 3]:
+                del rx[0]
+                self.checksum_errors += 1
+                continue
+            packet = StatusPacket(rx[2], rx[4], bytes(rx[5:length + 3]))
+            del rx[:length + 4]
+            return packet
+    
+    def _transact(self, servo_id, instruction, params, reply_ids, data_len, timeout=None):
+        """
+        发送一个有应答的请求，收集 reply_ids 中各舵机的应答 (参数长度 data_len)
+        只在发送前清一次残留 (例如之前 WRITE 的应答)，不插入固定等待，不修改串口超时；
+        最多等待 timeout (默认 response_timeout，界限见 _fill)，全部应答到齐立即返回
+        返回 {舵机 ID: StatusPacket}，其他 ID 的包丢弃
+        """
+        timeout = self.response_timeout if timeout is None else timeout
+        pending = set(reply_ids)
+        replies = {}
+        try:
+            self.serial.reset_input_buffer()
+        except Exception as e:
+            print(f"发送失败: {e}")
+            return replies
+        self._rx.clear()
+        if not self._write_packet(servo_id, instruction, params):
+            return replies
+        
+        deadline = time.monotonic() + timeout
+        while pending:
+            packet = self._read_status_packet(data_len, deadline)
+            if packet is None:
+                break
+            if packet.id in pending:
+                pending.discard(packet.id)
+                replies[packet.id] = packet
+        return replies
+    
+    # ------------------------------------------------------------
+    # 寄存器读取 / 批量遥测 (SYNC READ)
+    # ------------------------------------------------------------
+    def sync_read(self, start_addr, data_len, servo_ids, timeout=None):
+        """
+        SYNC READ (0x82)：一个请求读取多个舵机的同一段寄存器，舵机按 ID 顺序依次应答
+        包格式: FF FF FE LEN 82 起始地址 数据长度 ID1 ID2 ... CHK，LEN = N + 4
+        返回 {舵机 ID: 数据}，没有应答的 ID 不在结果中
+        """
+        servo_ids = list(servo_ids)
+        replies = self._transact(self.BROADCAST_ID, self.INST_SYNC_READ, [start_addr, data_len] + servo_ids,
+                                 servo_ids, data_len, timeout)
+        return {sid: replies[sid].params for sid in servo_ids if sid in replies}
+    
+    def read_block(self, servo_id, start_addr, data_len, timeout=None):
+        """单个舵机 READ 一段连续寄存器 (不插入等待)，失败返回 None"""
+        reply = self._transact(servo_id, self.INST_READ, [start_addr, data_len], [servo_id], data_len, timeout)
+        return reply[servo_id].params if servo_id in reply else None
+    
+    def read_telemetry(self, servo_ids=None, timeout=None):
+        """
+        一次总线往返读取所有舵机的 位置 / 速度 / 负载 / 电压 / 温度 / 状态 / 移动标志
+        返回 {舵机 ID: ServoTelemetry}，读取失败的舵机不在结果中
+        优先 SYNC READ；固件不支持时 (第一次请求没有任何应答) 改为逐个 READ 同一寄存器块，
+        部分舵机漏答时只对这些舵机补读
+        """
+        servo_ids = list(self.servo_ids if servo_ids is None else servo_ids)
+        blocks = {}
+        if self.sync_read_supported is not False:
+            blocks = self.sync_read(self.REG_PRESENT_POSITION_L, self.TELEMETRY_LENGTH, servo_ids, timeout)
+        synced = bool(blocks)
+        for servo_id in servo_ids:
+            if servo_id not in blocks:
+                block = self.read_block(servo_id, self.REG_PRESENT_POSITION_L, self.TELEMETRY_LENGTH, timeout)
+                if block is not None:
+                    blocks[servo_id] = block
+        if self.sync_read_supported is None and blocks:
+            # 逐个 READ 有应答而 SYNC READ 没有 -> 固件不支持
+            self.sync_read_supported = synced
+            if not synced:
+                print("⚠ SYNC READ 无应答，遥测改为逐个 READ")
+        return {sid: ServoTelemetry.unpack(sid, blocks[sid]) for sid in servo_ids if sid in blocks}
+    
     def get_position(self, servo_id):
         """读取当前位置"""
-        self.serial.reset_input_buffer()
-        self.serial.reset_output_buffer()
-        time.sleep(0.05)
-        
-        if self._send_packet(servo_id, self.INST_READ, [self.REG_PRESENT_POSITION_L, 2]):
-            response = self._read_response(8)
-            if response and len(response) >= 8:
-                pos_l = response[5]
-                pos_h = response[6]
-                position = pos_l | (pos_h << 8)
-                return position
-        return -1
+        data = self.read_block(servo_id, self.REG_PRESENT_POSITION_L, 2)
+        if data is None:
+            return -1
+        return data[0] | (data[1] << 8)
     
     def clear_position_limits(self, servo_id):
         """清除位置限制（设为 0-4095）"""
@@ -207,40 +423,24 @@ class STSServoSerial:
     
     def is_moving(self, servo_id):
         """检查电机是否正在移动"""
-        self.serial.reset_input_buffer()
-        self.serial.reset_output_buffer()
-        time.sleep(0.05)
-        
-        if self._send_packet(servo_id, self.INST_READ, [self.REG_MOVING_FLAG, 1]):
-            response = self._read_response(7)
-            if response and len(response) >= 7:
-                return response[5] == 1
-        return None
+        data = self.read_block(servo_id, self.REG_MOVING_FLAG, 1)
+        if data is None:
+            return None
+        return data[0] == 1
     
     def read_voltage(self, servo_id):
         """读取电压（单位：0.1V）"""
-        self.serial.reset_input_buffer()
-        self.serial.reset_output_buffer()
-        time.sleep(0.05)
-        
-        if self._send_packet(servo_id, self.INST_READ, [self.REG_PRESENT_VOLTAGE, 1]):
-            response = self._read_response(7)
-            if response and len(response) >= 7:
-                voltage = response[5] * 0.1  # 转换为伏特
-                return voltage
-        return None
+        data = self.read_block(servo_id, self.REG_PRESENT_VOLTAGE, 1)
+        if data is None:
+            return None
+        return data[0] * 0.1  # 转换为伏特
     
     def read_temperature(self, servo_id):
         """读取温度（单位：°C）"""
-        self.serial.reset_input_buffer()
-        self.serial.reset_output_buffer()
-        time.sleep(0.05)
-        
-        if self._send_packet(servo_id, self.INST_READ, [self.REG_PRESENT_TEMPERATURE, 1]):
-            response = self._read_response(7)
-            if response and len(response) >= 7:
-                return response[5]
-        return None
+        data = self.read_block(servo_id, self.REG_PRESENT_TEMPERATURE, 1)
+        if data is None:
+            return None
+        return data[0]
     
     def read_status(self, servo_id):
         """
@@ -248,23 +448,21 @@ class STSServoSerial:
         返回: {'Voltage': bool, 'Sensor': bool, 'Temperature': bool, 
                'Current': bool, 'Angle': bool, 'Overload': bool}
         """
-        self.serial.reset_input_buffer()
-        self.serial.reset_output_buffer()
-        time.sleep(0.05)
-        
-        if self._send_packet(servo_id, self.INST_READ, [self.REG_SERVO_STATUS, 1]):
-            response = self._read_response(7)
-            if response and len(response) >= 7:
-                status_byte = response[5]
-                return {
-                    'Voltage': bool(status_byte & 0x01),
-                    'Sensor': bool(status_byte & 0x02),
-                    'Temperature': bool(status_byte & 0x04),
-                    'Current': bool(status_byte & 0x08),
-                    'Angle': bool(status_byte & 0x10),
-                    'Overload': bool(status_byte & 0x20)
-                }
-        return None
+        data = self.read_block(servo_id, self.REG_SERVO_STATUS, 1)
+        if data is None:
+            return None
+        return self.decode_status(data[0])
+    
+    @staticmethod
+    def decode_status(status_byte):
+        return {
+            'Voltage': bool(status_byte & 0x01),
+            'Sensor': bool(status_byte & 0x02),
+            'Temperature': bool(status_byte & 0x04),
+            'Current': bool(status_byte & 0x08),
+            'Angle': bool(status_byte & 0x10),
+            'Overload': bool(status_byte & 0x20)
+        }
     
     def close(self):
         """关闭串口"""
@@ -0,0 +1,64 @@
+"""
+追踪目标预测 (alpha-beta 滤波，常速度模型)
+- 视觉线程在每帧到达时用采集时间戳更新测量 (10-15 Hz，且有推理延迟)
+- 控制线程在任意时刻取预测位置：上一次滤波位置 + 速度 × 经过时间
+- 外推时长有上限 (max_extrapolation)，超过后保持在上限处，不会因为推理卡顿一直往外推
+- 测量间隔过长或换了目标时重置速度，避免用两个不相关的位置估计速度
+"""
+
+
+class AlphaBetaPredictor:
+    """二维 alpha-beta 滤波器 (像素坐标)"""
+
+    def __init__(self, alpha=(1.0, 0.8), beta=0.1, max_extrapolation=0.15, max_gap=0.5):
+        """
+        Args:
+            alpha: 位置校正系数 (x, y)，1.0 = 完全相信测量
+            beta: 速度校正系数，越大速度响应越快但越抖
+            max_extrapolation: 最多向前外推的秒数
+            max_gap: 两次测量间隔超过该秒数时重置速度
+        """
+        self.alpha = alpha
+        self.beta = beta
+        self.max_extrapolation = max_extrapolation
+        self.max_gap = max_gap
+        self.reset()
+
+    def reset(self):
+        self.x = None
+        self.y = None
+        self.vx = 0.0
+        self.vy = 0.0
+        self.timestamp = 0.0
+
+    def update(self, x, y, timestamp):
+        """加入一次测量 (timestamp: 帧的采集时间)，返回滤波后的位置"""
+        dt = timestamp - self.timestamp
+        if self.x is None or dt > self.max_gap:
+            self.x, self.y = float(x), float(y)
+            self.vx = self.vy = 0.0
+            self.timestamp = timestamp
+            return self.x, self.y
+        if dt <= 0:
+            # 乱序或同一时刻的测量：只校正位置
+            dt = 0.0
+
+        alpha_x, alpha_y = self.alpha
+        px = self.x + self.vx * dt
+        py = self.y + self.vy * dt
+        rx = x - px
+        ry = y - py
+        self.x = px + alpha_x * rx
+        self.y = py + alpha_y * ry
+        if dt > 0:
+            self.vx += self.beta * rx / dt
+            self.vy += self.beta * ry / dt
+            self.timestamp = timestamp
+        return self.x, self.y
+
+    def predict(self, timestamp):
+        """预测 timestamp 时刻的位置；还没有测量时返回 None"""
+        if self.x is None:
+            return None
+        horizon = max(0.0, min(self.max_extrapolation, timestamp - self.timestamp))
+        return self.x + self.vx * horizon, self.y + self.vy * horizon
@@ -0,0 +1,247 @@
+"""
+STS 应答解析检查 (不需要硬件)
+用假串口按脚本回放应答字节，检查 STSServoSerial 的流式解析：
+包头重新对齐、长度字段、校验和、舵机 ID、分段到达、超时
+运行: python tests/check_sts_parser.py
+"""
+import sys
+import time
+
+sys.path.append('sts_control')
+from sts_driver import STSServoSerial
+from sim_servo import SimulatedServoPort
+
+
+def status_packet(servo_id, params=b'', error=0):
+    """构造应答包 FF FF ID LEN ERR PARAMS CHK"""
+    body = bytes([servo_id, len(params) + 2, error]) + bytes(params)
+    return b'\xff\xff' + body + bytes([(~sum(body)) & 0xFF])
+
+
+class FakeSerial:
+    """
+    脚本化的假串口：每次 write 之后把下一段预设应答放进接收缓冲
+    应答可以是 bytes，或 (延迟秒数, bytes) 表示写入后过一段时间才到达
+    chunk: 每次 read 最多返回的字节数 (模拟数据分段到达)
+    read 在没有数据时像 pyserial 一样等待 timeout
+    timeout_changes: 修改 timeout 的次数 (pyserial 每次修改都会重新配置串口)
+    """
+
+    def __init__(self, replies=(), chunk=None, timeout=0.5):
+        self.replies = list(replies)
+        self.chunk = chunk
+        self._timeout = timeout
+        self.timeout_changes = 0
+        self.is_open = True
+        self.rx = bytearray()
+        self.written = []
+        self.read_sizes = []
+        self._late = None  # (到达时间, 数据)
+
+    @property
+    def timeout(self):
+        return self._timeout
+
+    @timeout.setter
+    def timeout(self, value):
+        self._timeout = value
+        self.timeout_changes += 1
+
+    def reset_input_buffer(self):
+        self.rx.clear()
+
+    def reset_output_buffer(self):
+        pass
+
+    def flush(self):
+        pass
+
+    def write(self, data):
+        self.written.append(bytes(data))
+        if self.replies:
+            reply = self.replies.pop(0)
+            if isinstance(reply, tuple):
+                self._late = (time.monotonic() + reply[0], reply[1])
+            else:
+                self.rx.extend(reply)
+        return len(data)
+
+    def read(self, size=1):
+        self.read_sizes.append(size)
+        if not self.rx and self._late is not None:
+            wait = self._late[0] - time.monotonic()
+            if wait <= self.timeout:
+                time.sleep(max(0.0, wait))
+                self.rx.extend(self._late[1])
+                self._late = None
+        if not self.rx:
+            if self.timeout:
+                time.sleep(self.timeout)
+            return b''
+        n = min(size, self.chunk or size, len(self.rx))
+        data = bytes(self.rx[:n])
+        del self.rx[:n]
+        return data
+
+    def close(self):
+        self.is_open = False
+
+
+POSITION = bytes([0x00, 0x08])  # 2048
+
+
+def make_driver(replies, **kwargs):
+    port = FakeSerial(replies, **kwargs)
+    return STSServoSerial(None, serial_port=port, response_timeout=0.02), port
+
+
+# ------------------------------------------------------------
+# 检查项
+# ------------------------------------------------------------
+def check_clean_reply():
+    driver, _ = make_driver([status_packet(1, POSITION)])
+    assert driver.get_position(1) == 2048
+
+
+def check_leading_garbage():
+    driver, _ = make_driver([b'\x00\x13\xff\x42' + status_packet(1, POSITION)])
+    assert driver.get_position(1) == 2048
+    assert driver.resyncs > 0
+
+
+def check_extra_header_bytes():
+    driver, _ = make_driver([b'\xff' + status_packet(1, POSITION)])
+    assert driver.get_position(1) == 2048
+
+
+def check_bad_checksum_skipped():
+    bad = bytearray(status_packet(1, bytes([0x34, 0x12])))
+    bad[-1] ^= 0x5A
+    driver, _ = make_driver([bytes(bad) + status_packet(1, POSITION)])
+    assert driver.get_position(1) == 2048
+    assert driver.checksum_errors == 1
+
+
+def check_other_id_ignored():
+    driver, _ = make_driver([status_packet(2, bytes([0x34, 0x12])) + status_packet(1, POSITION)])
+    assert driver.get_position(1) == 2048
+
+
+def check_stale_write_ack_ignored():
+    # 之前 WRITE 的应答 (无参数, LEN = 2) 排在读应答前面
+    driver, _ = make_driver([status_packet(1) + status_packet(1, POSITION)])
+    assert driver.get_position(1) == 2048
+
+
+def check_byte_by_byte_arrival():
+    driver, _ = make_driver([b'\x07' + status_packet(1, POSITION)], chunk=1)
+    assert driver.get_position(1) == 2048
+
+
+def check_reads_only_length_field():
+    # 后面多出来的包不应被读走：解析器只读长度字段给出的字节数
+    trailing = status_packet(3, POSITION)
+    driver, port = make_driver([status_packet(1, POSITION) + trailing])
+    assert driver.get_position(1) == 2048
+    assert bytes(port.rx) == trailing, port.read_sizes
+
+
+def check_timeout_without_reply():
+    driver, port = make_driver([], timeout=0.5)
+    start = time.monotonic()
+    assert driver.get_position(1) == -1
+    elapsed = time.monotonic() - start
+    # 最多 timeout + 一个串口读超时
+    assert elapsed < 2 * driver.response_timeout + 0.01, f"{elapsed * 1000:.1f} ms"
+
+
+def check_port_timeout_set_once():
+    # 串口超时只在初始化时设置一次，请求之间不再反复修改 (每次修改都会重新配置串口)
+    driver, port = make_driver([status_packet(1, POSITION)] * 5 + [b''] * 5)
+    for _ in range(10):
+        driver.get_position(1)
+    driver.read_telemetry([1, 2], timeout=0.05)
+    assert port.timeout == driver.response_timeout
+    assert port.timeout_changes == 1, port.timeout_changes
+
+
+def check_long_timeout_waits_for_late_reply():
+    # 单次请求的 timeout 可以长于串口读超时：读不到数据时继续等到 deadline
+    driver, _ = make_driver([(0.05, status_packet(1, POSITION))])
+    assert driver.read_block(1, STSServoSerial.REG_PRESENT_POSITION_L, 2, timeout=0.2) == POSITION
+    driver, _ = make_driver([(0.05, status_packet(1, POSITION))])
+    assert driver.read_block(1, STSServoSerial.REG_PRESENT_POSITION_L, 2) is None
+
+
+def check_truncated_reply():
+    driver, _ = make_driver([status_packet(1, POSITION)[:-2]])
+    assert driver.get_position(1) == -1
+
+
+def check_sync_read_missing_servo():
+    data = {sid: bytes([sid, 0]) for sid in (1, 2, 4)}
+    replies = b''.join(status_packet(sid, data[sid]) for sid in (1, 2, 4))
+    driver, port = make_driver([replies])
+    result = driver.sync_read(STSServoSerial.REG_PRESENT_POSITION_L, 2, [1, 2, 3, 4])
+    assert result == data, result
+    assert port.written[0][2] == STSServoSerial.BROADCAST_ID
+
+
+def check_error_byte_preserved():
+    driver, _ = make_driver([status_packet(1, bytes([0x01]), error=0x20)])
+    reply = driver._transact(1, STSServoSerial.INST_READ, [STSServoSerial.REG_MOVING_FLAG, 1], [1], 1)
+    assert reply[1].error == 0x20 and reply[1].params == b'\x01'
+
+
+def check_ping():
+    driver, _ = make_driver([status_packet(5)])
+    assert driver.ping(5)
+
+
+def check_simulated_bus():
+    driver = STSServoSerial(None, serial_port=SimulatedServoPort(initial_positions={2: 1000}))
+    telemetry = driver.read_telemetry()
+    assert sorted(telemetry) == [1, 2, 3, 4]
+    assert telemetry[2].position == 1000 and not telemetry[2].moving
+    assert driver.get_position(3) == 2048
+    assert driver.checksum_errors == 0 and driver.resyncs == 0
+
+
+CHECKS = [
+    check_clean_reply,
+    check_leading_garbage,
+    check_extra_header_bytes,
+    check_bad_checksum_skipped,
+    check_other_id_ignored,
+    check_stale_write_ack_ignored,
+    check_byte_by_byte_arrival,
+    check_reads_only_length_field,
+    check_timeout_without_reply,
+    check_port_timeout_set_once,
+    check_long_timeout_waits_for_late_reply,
+    check_truncated_reply,
+    check_sync_read_missing_servo,
+    check_error_byte_preserved,
+    check_ping,
+    check_simulated_bus,
+]
+
+
+def main():
+    failed = 0
+    for check in CHECKS:
+        try:
+            check()
+            print(f"  ✓ {check.__name__}")
+        except AssertionError as e:
+            failed += 1
+            print(f"  ✗ {check.__name__}: {e}")
+    print("-" * 50)
+    if failed:
+        print(f"✗ {failed}/{len(CHECKS)} 项失败")
+        sys.exit(1)
+    print(f"✓ 全部 {len(CHECKS)} 项通过")
+
+
+if __name__ == "__main__":
+    main()
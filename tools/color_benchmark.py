@@ -0,0 +1,131 @@
+"""
+服装主色提取基准测试
+对比原 sklearn KMeans 路径和 color_engine 的 numpy 路径：
+- 每帧耗时 (逐 ROI KMeans / 逐 ROI 均值 / 整帧批量 / 直方图多簇)
+- 与 KMeans 路径的标签一致率和置信度最大误差
+
+默认使用合成的上/下半身 ROI (带噪声的纯色块 + 椭圆人形 mask)，
+也可以用 --source 指定视频或图片目录，从真实画面里随机裁剪 ROI
+
+用法:
+    python tools/color_benchmark.py --people 8 --frames 100
+    python tools/color_benchmark.py --source clip.mp4
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import cv2
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import color_engine
+
+
+def synthetic_region(rng):
+    """一个带噪声的纯色 ROI 和椭圆人形 mask"""
+    h, w = rng.integers(80, 400), rng.integers(60, 250)
+    base = rng.integers(0, 256, 3)
+    noise = rng.uniform(3, 50)
+    img = np.clip(base + rng.normal(0, noise, (h, w, 3)), 0, 255).astype(np.uint8)
+    mask = np.zeros((h, w), dtype=np.uint8)
+    cv2.ellipse(mask, (w // 2, h // 2), (w // 3, h // 2), 0, 0, 360, 255, -1)
+    return img, mask
+
+
+def frame_regions(frames, rng, people):
+    """从真实画面中随机裁剪 ROI (mask 同样用椭圆人形)"""
+    frame = frames[rng.integers(len(frames))]
+    fh, fw = frame.shape[:2]
+    regions = []
+    for _ in range(people * 2):
+        h, w = rng.integers(60, max(61, fh // 3)), rng.integers(40, max(41, fw // 6))
+        y, x = rng.integers(0, fh - h), rng.integers(0, fw - w)
+        roi = frame[y:y + h, x:x + w]
+        mask = np.zeros((h, w), dtype=np.uint8)
+        cv2.ellipse(mask, (w // 2, h // 2), (w // 3, h // 2), 0, 0, 360, 255, -1)
+        regions.append((roi, mask))
+    return regions
+
+
+def load_frames(source, max_frames=200):
+    frames = []
+    if os.path.isdir(source):
+        for name in sorted(os.listdir(source))[:max_frames]:
+            img = cv2.imread(os.path.join(source, name))
+            if img is not None:
+                frames.append(img)
+    else:
+        cap = cv2.VideoCapture(source)
+        while len(frames) < max_frames:
+            ret, frame = cap.read()
+            if not ret:
+                break
+            frames.append(frame)
+        cap.release()
+    return frames
+
+
+def main():
+    parser = argparse.ArgumentParser(description='服装主色提取基准测试')
+    parser.add_argument('--people', type=int, default=8, help='每帧人数 (每人上/下半身各一个 ROI)')
+    parser.add_argument('--frames', type=int, default=100, help='测试帧数')
+    parser.add_argument('--source', help='可选：视频文件或图片目录')
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    source_frames = load_frames(args.source) if args.source else None
+    if args.source and not source_frames:
+        print(f"✗ 无法读取: {args.source}")
+        return
+
+    batches = []
+    for _ in range(args.frames):
+        if source_frames:
+            batches.append(frame_regions(source_frames, rng, args.people))
+        else:
+            batches.append([synthetic_region(rng) for _ in range(args.people * 2)])
+
+    paths = {
+        'mean (per ROI)': lambda regions: [color_engine.dominant_color(r, m, mode='mean') for r, m in regions],
+        'mean (batch)': color_engine.dominant_colors_batch,
+        'histogram': lambda regions: [color_engine.dominant_color(r, m, mode='histogram') for r, m in regions],
+    }
+    if color_engine.SKLEARN_AVAILABLE:
+        paths = dict([('kmeans (legacy)', lambda regions: [color_engine.dominant_color(r, m, mode='kmeans')
+                                                          for r, m in regions])] + list(paths.items()))
+    else:
+        print("⚠ scikit-learn 未安装，跳过 KMeans 对比")
+
+    outputs = {}
+    timings = {}
+    for name, fn in paths.items():
+        fn(batches[0])  # 预热
+        t0 = time.perf_counter()
+        outputs[name] = [fn(regions) for regions in batches]
+        timings[name] = (time.perf_counter() - t0) * 1000.0 / len(batches)
+
+    reference = outputs.get('kmeans (legacy)')
+    total_rois = sum(len(regions) for regions in batches)
+
+    print("\n" + "=" * 70)
+    print(f"{args.frames} 帧 × {args.people * 2} ROI ({'真实画面' if source_frames else '合成'})")
+    print("-" * 70)
+    print(f"{'路径':<20}{'ms/帧':>10}{'标签一致':>12}{'置信度最大误差':>18}")
+    for name in paths:
+        agree, max_conf = '-', '-'
+        if reference is not None:
+            pairs = [(a, b) for frame_a, frame_b in zip(outputs[name], reference)
+                     for a, b in zip(frame_a, frame_b)]
+            agree = f"{sum(a[0] == b[0] for a, b in pairs) / total_rois * 100:.1f}%"
+            max_conf = f"{max(abs(a[1] - b[1]) for a, b in pairs):.2e}"
+        print(f"{name:<20}{timings[name]:>10.2f}{agree:>12}{max_conf:>18}")
+    print("=" * 70)
+    print("注: histogram 是多簇模式，取占比最大的颜色簇，与单簇均值不一致是预期行为")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,285 @@
+"""
+导出 ONNX / OpenVINO 模型并验证与 PyTorch 路径的一致性
+- YOLOv8n-pose / YOLOv8n-seg: ultralytics export (固定 imgsz × imgsz 输入，不含 NMS)
+- HSEmotion enet_b0_8_best_vgaf: torch.onnx.export (动态 batch，输出 8 类 logits)
+- --openvino 时另外生成 OpenVINO IR (*_openvino_model/)
+- --verify 在录制片段上分别用 torch 后端和导出的模型跑 detect_persons / get_segmentation_mask / 情绪识别，
+  输出逐帧对比的精度差异和耗时；任一模型超出阈值时返回非零退出码
+
+用法:
+    python tools/export_models.py
+    python tools/export_models.py --openvino --models pose seg
+    python tools/export_models.py --skip-export --verify clip.mp4 --frames 100
+    python tools/export_models.py --skip-export --verify clip.mp4 --backend onnx --precision int8 --threads 4
+"""
+
+import argparse
+import json
+import os
+import shutil
+import sys
+import time
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT)
+
+from face_roi import face_box_from_keypoints
+from inference_backend import MODEL_NAMES, EMOTION_IMG_SIZE, YoloRuntimeModel, RuntimeEmotionRecognizer
+from resolution_report import load_frames, compare, fmt
+
+MODEL_DIR = os.path.join(ROOT, 'models')
+
+# 验证阈值的默认值
+MIN_RECALL = 0.95
+MIN_BOX_IOU = 0.9
+MAX_KEYPOINT_ERROR = 0.02
+MIN_MASK_IOU = 0.9
+MIN_EMOTION_AGREEMENT = 0.9
+
+
+# ------------------------------------------------------------
+# 导出
+# ------------------------------------------------------------
+def _move_into_model_dir(path):
+    """ultralytics 把导出结果放在 .pt 旁边；.pt 不在 models/ 下时移动过去"""
+    target = os.path.join(MODEL_DIR, os.path.basename(os.path.normpath(path)))
+    if os.path.abspath(path) == os.path.abspath(target):
+        return target
+    if os.path.isdir(target):
+        shutil.rmtree(target)
+    elif os.path.exists(target):
+        os.remove(target)
+    shutil.move(path, target)
+    return target
+
+
+def export_yolo(kind, imgsz, openvino):
+    from ultralytics import YOLO
+
+    name = MODEL_NAMES[kind]
+    pt_path = os.path.join(MODEL_DIR, f"{name}.pt")
+    if not os.path.exists(pt_path):
+        pt_path = f"{name}.pt"   # ultralytics 会自动下载
+    model = YOLO(pt_path)
+    paths = [_move_into_model_dir(model.export(format='onnx', imgsz=imgsz, simplify=True))]
+    if openvino:
+        paths.append(_move_into_model_dir(model.export(format='openvino', imgsz=imgsz)))
+    return paths
+
+
+def export_emotion(openvino):
+    import torch
+    # person_analysis 里给 torch.load 打了补丁，HSEmotion 的权重才能加载
+    from person_analysis import HSEMOTION_AVAILABLE
+    if not HSEMOTION_AVAILABLE:
+        raise RuntimeError("hsemotion not installed")
+    from hsemotion.facial_emotions import HSEmotionRecognizer
+
+    name = MODEL_NAMES['emotion']
+    recognizer = HSEmotionRecognizer(model_name=name, device='cpu')
+    model = recognizer.model.eval()
+    onnx_path = os.path.join(MODEL_DIR, f"{name}.onnx")
+    dummy = torch.randn(1, 3, EMOTION_IMG_SIZE, EMOTION_IMG_SIZE)
+    torch.onnx.export(model, dummy, onnx_path, opset_version=13,
+                      input_names=['input'], output_names=['logits'],
+                      dynamic_axes={'input': {0: 'batch'}, 'logits': {0: 'batch'}})
+    paths = [onnx_path]
+    if openvino:
+        import openvino as ov
+        ir_dir = os.path.join(MODEL_DIR, f"{name}_openvino_model")
+        os.makedirs(ir_dir, exist_ok=True)
+        xml_path = os.path.join(ir_dir, f"{name}.xml")
+        ov.save_model(ov.convert_model(onnx_path), xml_path, compress_to_fp16=False)
+        paths.append(ir_dir)
+    return paths
+
+
+# ------------------------------------------------------------
+# 验证
+# ------------------------------------------------------------
+def face_crops(frame, persons):
+    """按关键点推算的人脸框裁剪情绪模型输入 (外扩 20%，与 process_frame 一致)"""
+    h, w = frame.shape[:2]
+    crops = []
+    for person in persons:
+        box = face_box_from_keypoints(person['keypoints'], h, w)
+        if box is None:
+            continue
+        fx1, fy1, fx2, fy2 = box
+        pad_x, pad_y = int((fx2 - fx1) * 0.2), int((fy2 - fy1) * 0.2)
+        crop = frame[max(0, fy1 - pad_y):min(h, fy2 + pad_y), max(0, fx1 - pad_x):min(w, fx2 + pad_x)]
+        if crop.size > 0:
+            crops.append(crop.copy())
+    return crops
+
+
+def run_pass(analyzer, frames, crops):
+    """逐帧跑检测、分割和情绪，返回 (每帧结果, 情绪输出, 各模型平均耗时 ms)"""
+    analyzer.reset_state()
+    outputs, emotions = [], []
+    times = {'pose': [], 'seg': [], 'emotion': []}
+    for frame, frame_crops in zip(frames, crops):
+        analyzer.frame_counter += 1
+        t0 = time.perf_counter()
+        persons = analyzer.detect_persons(frame)
+        t1 = time.perf_counter()
+        mask = analyzer.get_segmentation_mask(frame) if analyzer.segmentation_enabled else None
+        t2 = time.perf_counter()
+        times['pose'].append(t1 - t0)
+        times['seg'].append(t2 - t1)
+        if frame_crops and analyzer.emotion_detector is not None:
+            labels, scores = analyzer.emotion_detector.predict_multi_emotions(frame_crops, logits=False)
+            times['emotion'].append(time.perf_counter() - t2)
+            emotions.append((labels, np.asarray(scores)))
+        else:
+            emotions.append(None)
+        outputs.append({
+            'results': [{'bbox': p['bbox'], 'keypoints': p['keypoints'], 'age': None} for p in persons],
+            'mask': mask,
+        })
+    # 跳过第一帧的预热
+    mean_ms = {k: 1000.0 * float(np.mean(v[1:] if len(v) > 1 else v)) if v else None
+               for k, v in times.items()}
+    return outputs, emotions, mean_ms
+
+
+def compare_emotions(reference, candidate):
+    agree, total, max_diff = 0, 0, 0.0
+    for ref, cand in zip(reference, candidate):
+        if ref is None or cand is None:
+            continue
+        total += len(ref[0])
+        agree += sum(a == b for a, b in zip(ref[0], cand[0]))
+        max_diff = max(max_diff, float(np.abs(ref[1] - cand[1]).max()))
+    if total == 0:
+        return {'faces': 0, 'agreement': None, 'max_prob_diff': None}
+    return {'faces': total, 'agreement': agree / total, 'max_prob_diff': max_diff}
+
+
+def verify(args):
+    from person_analysis import CompletePersonFaceAnalyzer
+
+    frames = load_frames(args.verify, args.frames)
+    if not frames:
+        print(f"✗ 无法读取: {args.verify}")
+        return 1
+    h, w = frames[0].shape[:2]
+    print(f"✓ 读取 {len(frames)} 帧 ({w}x{h})")
+
+    reference_analyzer = CompletePersonFaceAnalyzer(detection_mode='separate', backend='torch')
+    candidate_analyzer = CompletePersonFaceAnalyzer(detection_mode='separate', backend=args.backend,
+                                                    precision=args.precision, num_threads=args.threads)
+    for analyzer in (reference_analyzer, candidate_analyzer):
+        analyzer.enable_effects = False
+        analyzer.segmentation_enabled = analyzer.yolo_seg_model is not None
+
+    # 回退到 PyTorch 的模型不参与对比
+    runtime = {
+        'pose': isinstance(candidate_analyzer.yolo_model, YoloRuntimeModel),
+        'seg': isinstance(candidate_analyzer.yolo_seg_model, YoloRuntimeModel),
+        'emotion': isinstance(candidate_analyzer.emotion_detector, RuntimeEmotionRecognizer),
+    }
+    for kind, loaded in runtime.items():
+        if not loaded:
+            print(f"  ⚠ {MODEL_NAMES[kind]}: 没有加载 {args.backend} 模型，跳过对比")
+
+    # 两边用同一组人脸裁剪 (来自参考路径的关键点)
+    print("\n参考: torch...")
+    reference_analyzer.reset_state()
+    crops = []
+    for frame in frames:
+        reference_analyzer.frame_counter += 1
+        crops.append(face_crops(frame, reference_analyzer.detect_persons(frame)))
+    reference, ref_emotions, ref_ms = run_pass(reference_analyzer, frames, crops)
+    print(f"候选: {args.backend} ({args.precision})...")
+    candidate, cand_emotions, cand_ms = run_pass(candidate_analyzer, frames, crops)
+
+    accuracy = compare(reference, candidate)
+    accuracy.update(compare_emotions(ref_emotions, cand_emotions))
+
+    checks = []
+    if runtime['pose']:
+        checks += [('recall', accuracy['recall'], args.min_recall, '>='),
+                   ('box_iou', accuracy['box_iou'], args.min_box_iou, '>='),
+                   ('keypoint_error', accuracy['keypoint_error'], args.max_keypoint_error, '<=')]
+    if runtime['seg']:
+        checks.append(('mask_iou', accuracy['mask_iou'], args.min_mask_iou, '>='))
+    if runtime['emotion']:
+        checks.append(('emotion_agreement', accuracy['agreement'], args.min_emotion_agreement, '>='))
+
+    print("\n" + "=" * 60)
+    print(f"{'耗时 (ms)':<20}{'torch':>12}{args.backend:>12}")
+    print("-" * 60)
+    for kind in ('pose', 'seg', 'emotion'):
+        print(f"{kind:<20}{fmt(ref_ms[kind], '.1f'):>12}{fmt(cand_ms[kind], '.1f'):>12}")
+    print("-" * 60)
+    failed = False
+    for name, value, limit, op in checks:
+        ok = value is not None and (value >= limit if op == '>=' else value <= limit)
+        failed |= not ok
+        print(f"{'✓' if ok else '✗'} {name:<20}{fmt(value, '.4f'):>10}   ({op} {limit})")
+    print(f"  precision           {fmt(accuracy['precision'], '.4f'):>10}")
+    print(f"  emotion faces       {accuracy['faces']:>10}   max_prob_diff {fmt(accuracy['max_prob_diff'], '.4f')}")
+    print("=" * 60)
+
+    if args.json:
+        report = {'source': args.verify, 'frames': len(frames), 'backend': args.backend,
+                  'precision': args.precision, 'threads': args.threads, 'runtime_models': runtime,
+                  'times_ms': {'torch': ref_ms, args.backend: cand_ms}, 'accuracy': accuracy,
+                  'passed': not failed}
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+        print(f"✓ 报告已保存: {args.json}")
+    return 1 if failed else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description='导出 ONNX/OpenVINO 模型并验证一致性')
+    parser.add_argument('--models', nargs='+', choices=list(MODEL_NAMES), default=list(MODEL_NAMES))
+    parser.add_argument('--imgsz', type=int, default=640, help='YOLO 导出的输入边长')
+    parser.add_argument('--openvino', action='store_true', help='另外导出 OpenVINO IR')
+    parser.add_argument('--skip-export', action='store_true', help='只验证已导出的模型')
+    parser.add_argument('--verify', default=None, help='用于验证的视频文件或图片目录')
+    parser.add_argument('--frames', type=int, default=100, help='验证最多读取的帧数')
+    parser.add_argument('--backend', choices=['onnx', 'openvino'], default='onnx')
+    parser.add_argument('--precision', choices=['fp32', 'int8'], default='fp32')
+    parser.add_argument('--threads', type=int, default=0, help='推理线程数 (0 = 运行时默认)')
+    parser.add_argument('--min-recall', type=float, default=MIN_RECALL)
+    parser.add_argument('--min-box-iou', type=float, default=MIN_BOX_IOU)
+    parser.add_argument('--max-keypoint-error', type=float, default=MAX_KEYPOINT_ERROR,
+                        help='关键点平均误差上限 (按人体框对角线归一化)')
+    parser.add_argument('--min-mask-iou', type=float, default=MIN_MASK_IOU)
+    parser.add_argument('--min-emotion-agreement', type=float, default=MIN_EMOTION_AGREEMENT)
+    parser.add_argument('--json', default=None, help='把验证结果写入 JSON 文件')
+    args = parser.parse_args()
+
+    # 模型按相对路径 models/ 查找 (先把命令行里的路径转成绝对路径)
+    if args.verify:
+        args.verify = os.path.abspath(args.verify)
+    if args.json:
+        args.json = os.path.abspath(args.json)
+    os.chdir(ROOT)
+    os.makedirs(MODEL_DIR, exist_ok=True)
+
+    if not args.skip_export:
+        for kind in args.models:
+            print(f"导出 {MODEL_NAMES[kind]}...")
+            try:
+                if kind == 'emotion':
+                    paths = export_emotion(args.openvino)
+                else:
+                    paths = export_yolo(kind, args.imgsz, args.openvino)
+                for path in paths:
+                    print(f"  ✓ {os.path.relpath(path, ROOT)}")
+            except Exception as e:
+                print(f"  ✗ 导出失败: {e}")
+
+    if args.verify:
+        return verify(args)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
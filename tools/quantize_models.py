@@ -0,0 +1,385 @@
+"""
+INT8 训练后量化 (YOLOv8n-pose / YOLOv8n-seg)
+- 校准帧来自画廊自己录制的片段 (视频文件或图片目录，与 replay.py / tools/replay_benchmark.py 相同的回放格式)，
+  每 --stride 帧取一帧，经过与推理时完全相同的 letterbox 预处理
+- onnxruntime.quantization.quantize_static: QDQ 格式，权重按通道 INT8，激活 UINT8；
+  检测头 (/model.22/) 里卷积以外的节点 (DFL、框/关键点解码、Concat、Sigmoid) 默认保持 FP32，
+  它们把像素坐标和 0-1 分数拼在同一个张量里，按张量量化会把分数精度吃掉
+- 输出 models/<名称>_int8.onnx，INFERENCE_PRECISION = 'int8' 时分析器自动加载 (onnx / openvino 后端都可以)
+- 在与校准帧错开的评估帧上对比 FP32 和 INT8 (以 FP32 输出作为参考标注):
+    姿态: 框 AP50 / AP50-95，关键点 OKS AP50 / AP50-95
+    分割: 实例 mask AP50 / AP50-95，合并后人物 mask 的 IoU
+    每帧耗时 (含前后处理) 的均值 / p95 和加速比
+  用于按现场决定 INT8 的精度损失是否可以接受
+
+用法:
+    python tools/export_models.py --models pose seg        # 先导出 FP32 ONNX
+    python tools/quantize_models.py --source gallery_clip.mp4
+    python tools/quantize_models.py --source recorded_frames/ --models pose --calib-frames 300 --stride 3
+    python tools/quantize_models.py --source clip.mp4 --skip-quantize --threads 4 --json logs/int8_report.json
+"""
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT)
+
+import onnx
+from onnxruntime.quantization import (CalibrationDataReader, CalibrationMethod, QuantFormat, QuantType,
+                                      quantize_static)
+from onnxruntime.quantization.shape_inference import quant_pre_process
+
+from inference_backend import MODEL_NAMES, DEFAULT_CONF, RuntimeSession, YoloRuntimeModel, letterbox_blob
+from replay import ReplaySource
+
+MODEL_DIR = os.path.join(ROOT, 'models')
+
+CALIBRATION_METHODS = {
+    'minmax': CalibrationMethod.MinMax,
+    'entropy': CalibrationMethod.Entropy,
+    'percentile': CalibrationMethod.Percentile,
+}
+
+# COCO 关键点 OKS 的 sigma
+OKS_SIGMAS = np.array([.26, .25, .25, .35, .35, .79, .79, .72, .72, .62, .62,
+                       1.07, 1.07, .87, .87, .89, .89]) / 10.0
+# AP50-95 的相似度阈值
+AP_THRESHOLDS = np.linspace(0.5, 0.95, 10)
+
+
+# ------------------------------------------------------------
+# 校准
+# ------------------------------------------------------------
+def sample_frames(source, flip, stride, offset, max_frames):
+    """从回放源中每 stride 帧取第 offset 帧，最多 max_frames 帧 (逐帧读取，不占内存)"""
+    replay = ReplaySource(source, flip=flip).start()
+    index = taken = 0
+    try:
+        while taken < max_frames:
+            ret, frame, _, _ = replay.read()
+            if not ret:
+                break
+            if index % stride == offset:
+                taken += 1
+                yield frame
+            index += 1
+    finally:
+        replay.release()
+
+
+class ReplayCalibrationReader(CalibrationDataReader):
+    """把录制片段的帧按推理时的 letterbox 预处理后喂给校准器"""
+
+    def __init__(self, input_name, input_hw, source, flip, stride, max_frames):
+        self.input_name = input_name
+        self.input_hw = input_hw
+        self._frames = sample_frames(source, flip, stride, 0, max_frames)
+        self.count = 0
+
+    def get_next(self):
+        frame = next(self._frames, None)
+        if frame is None:
+            return None
+        self.count += 1
+        blob, _ = letterbox_blob(frame, self.input_hw)
+        return {self.input_name: blob}
+
+
+def quantize_model(fp32_path, int8_path, args):
+    """校准 + 静态量化，返回实际使用的校准帧数"""
+    with tempfile.TemporaryDirectory(prefix='quant_') as tmp_dir:
+        # 形状推断 + 图优化，量化前的推荐预处理；失败时直接量化原模型
+        prepared_path = os.path.join(tmp_dir, 'prepared.onnx')
+        try:
+            quant_pre_process(fp32_path, prepared_path)
+        except Exception as e:
+            print(f"  ⚠ 量化预处理失败 ({e})，直接量化原模型")
+            prepared_path = fp32_path
+
+        model = onnx.load(prepared_path)
+        model_input = model.graph.input[0]
+        dims = [d.dim_value for d in model_input.type.tensor_type.shape.dim]
+        input_hw = (dims[2] or args.imgsz, dims[3] or args.imgsz)
+
+        exclude = []
+        if not args.quantize_head:
+            exclude = [n.name for n in model.graph.node
+                       if n.name.startswith(args.head_prefix) and n.op_type != 'Conv']
+        print(f"  校准: 每 {args.stride} 帧取 1 帧，最多 {args.calib_frames} 帧，方法 {args.calibrate}；"
+              f"保持 FP32 的节点 {len(exclude)} 个")
+
+        reader = ReplayCalibrationReader(model_input.name, input_hw, args.source, args.flip,
+                                         args.stride, args.calib_frames)
+        quantize_static(prepared_path, int8_path, reader,
+                        quant_format=QuantFormat.QDQ,
+                        activation_type=QuantType.QUInt8,
+                        weight_type=QuantType.QInt8,
+                        per_channel=True,
+                        calibrate_method=CALIBRATION_METHODS[args.calibrate],
+                        nodes_to_exclude=exclude)
+    return reader.count
+
+
+# ------------------------------------------------------------
+# 精度 (以 FP32 输出为参考标注的 AP)
+# ------------------------------------------------------------
+def box_iou_matrix(a, b):
+    """(P, 4) × (G, 4) -> (P, G)"""
+    a, b = np.asarray(a, dtype=float).reshape(-1, 4), np.asarray(b, dtype=float).reshape(-1, 4)
+    ix1 = np.maximum(a[:, None, 0], b[None, :, 0])
+    iy1 = np.maximum(a[:, None, 1], b[None, :, 1])
+    ix2 = np.minimum(a[:, None, 2], b[None, :, 2])
+    iy2 = np.minimum(a[:, None, 3], b[None, :, 3])
+    inter = np.clip(ix2 - ix1, 0, None) * np.clip(iy2 - iy1, 0, None)
+    area_a = (a[:, 2] - a[:, 0]) * (a[:, 3] - a[:, 1])
+    area_b = (b[:, 2] - b[:, 0]) * (b[:, 3] - b[:, 1])
+    union = area_a[:, None] + area_b[None, :] - inter
+    return np.where(union > 0, inter / np.maximum(union, 1e-9), 0.0)
+
+
+def oks_matrix(pred_kpts, gt_kpts, gt_boxes, visible_conf=0.5):
+    """
+    关键点相似度 (COCO OKS)，(P, 17, 3) × (G, 17, 3) -> (P, G)
+    参考标注只统计置信度 > visible_conf 的关键点；面积用框面积 × 0.53 近似 (与 ultralytics 验证一致)
+    """
+    pred_kpts = np.asarray(pred_kpts, dtype=float).reshape(-1, 17, 3)
+    gt_kpts = np.asarray(gt_kpts, dtype=float).reshape(-1, 17, 3)
+    gt_boxes = np.asarray(gt_boxes, dtype=float).reshape(-1, 4)
+    area = (gt_boxes[:, 2] - gt_boxes[:, 0]) * (gt_boxes[:, 3] - gt_boxes[:, 1]) * 0.53
+    d2 = ((pred_kpts[:, None, :, :2] - gt_kpts[None, :, :, :2]) ** 2).sum(axis=-1)     # (P, G, 17)
+    e = d2 / ((2 * OKS_SIGMAS) ** 2 * (area[None, :, None] + 1e-9) * 2)
+    visible = gt_kpts[None, :, :, 2] > visible_conf
+    count = visible.sum(axis=-1)
+    return np.where(count > 0, (np.exp(-e) * visible).sum(axis=-1) / np.maximum(count, 1), 0.0)
+
+
+def mask_iou_matrix(pred_masks, gt_masks):
+    """(P, h, w) × (G, h, w) bool -> (P, G)"""
+    if len(pred_masks) == 0 or len(gt_masks) == 0:
+        return np.zeros((len(pred_masks), len(gt_masks)))
+    p = np.asarray(pred_masks, dtype=np.float32).reshape(len(pred_masks), -1)
+    g = np.asarray(gt_masks, dtype=np.float32).reshape(len(gt_masks), -1)
+    inter = p @ g.T
+    union = p.sum(axis=1)[:, None] + g.sum(axis=1)[None, :] - inter
+    return np.where(union > 0, inter / np.maximum(union, 1e-9), 0.0)
+
+
+class APAccumulator:
+    """逐帧累积 (预测分数, 预测 × 参考 相似度矩阵)，按 COCO 101 点插值计算 AP"""
+
+    def __init__(self):
+        self.frames = []
+        self.num_gt = 0
+
+    def add(self, scores, similarity):
+        self.frames.append((np.asarray(scores, dtype=float), np.asarray(similarity, dtype=float)))
+        self.num_gt += similarity.shape[1]
+
+    def ap(self, threshold):
+        if self.num_gt == 0:
+            return None
+        scores, hits = [], []
+        for frame_scores, similarity in self.frames:
+            matched = np.zeros(similarity.shape[1], dtype=bool)
+            # 每帧内按分数从高到低贪心匹配
+            for i in np.argsort(-frame_scores):
+                tp = False
+                if similarity.shape[1]:
+                    candidates = np.where(matched, -1.0, similarity[i])
+                    j = int(np.argmax(candidates))
+                    if candidates[j] >= threshold:
+                        matched[j] = True
+                        tp = True
+                scores.append(frame_scores[i])
+                hits.append(tp)
+        if not scores:
+            return 0.0
+        order = np.argsort(-np.asarray(scores), kind='stable')
+        tp = np.cumsum(np.asarray(hits)[order])
+        fp = np.cumsum(~np.asarray(hits)[order])
+        recall = tp / self.num_gt
+        precision = tp / np.maximum(tp + fp, 1)
+        # 精度包络 + 101 点插值
+        precision = np.maximum.accumulate(precision[::-1])[::-1]
+        points = np.linspace(0, 1, 101)
+        idx = np.searchsorted(recall, points, side='left')
+        return float(np.mean([precision[i] if i < len(precision) else 0.0 for i in idx]))
+
+    def summary(self):
+        if self.num_gt == 0:
+            return {'ap50': None, 'ap50_95': None, 'references': 0}
+        return {'ap50': self.ap(0.5),
+                'ap50_95': float(np.mean([self.ap(t) for t in AP_THRESHOLDS])),
+                'references': self.num_gt}
+
+
+# ------------------------------------------------------------
+# 评估
+# ------------------------------------------------------------
+def timed(fn, *args, **kwargs):
+    t0 = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return result, time.perf_counter() - t0
+
+
+def latency_summary(samples):
+    # 跳过第一帧的预热
+    samples = np.asarray(samples[1:] if len(samples) > 1 else samples) * 1000.0
+    if len(samples) == 0:
+        return {'mean_ms': None, 'p95_ms': None}
+    return {'mean_ms': float(samples.mean()), 'p95_ms': float(np.percentile(samples, 95))}
+
+
+def evaluate(kind, fp32_model, int8_model, args):
+    """在评估帧上对比 FP32 和 INT8，返回报告"""
+    times = {'fp32': [], 'int8': []}
+    box_ap, kpt_ap, mask_ap = APAccumulator(), APAccumulator(), APAccumulator()
+    union_ious = []
+    frames = 0
+    # 评估帧与校准帧错开半个步长
+    for frame in sample_frames(args.source, args.flip, args.stride, args.stride // 2, args.eval_frames):
+        frames += 1
+        if kind == 'pose':
+            ref, t_ref = timed(fp32_model.pose, frame)
+            cand, t_cand = timed(int8_model.pose, frame)
+        else:
+            ref, t_ref = timed(fp32_model.instance_masks, frame)
+            cand, t_cand = timed(int8_model.instance_masks, frame)
+        times['fp32'].append(t_ref)
+        times['int8'].append(t_cand)
+
+        ref = [r for r in ref if r[1] > args.ref_conf]
+        cand = [c for c in cand if c[1] > DEFAULT_CONF]
+        cand_scores = [c[1] for c in cand]
+        box_ap.add(cand_scores, box_iou_matrix([c[0] for c in cand], [r[0] for r in ref]))
+        if kind == 'pose':
+            kpt_ap.add(cand_scores, oks_matrix([c[2] for c in cand], [r[2] for r in ref], [r[0] for r in ref]))
+        else:
+            mask_ap.add(cand_scores, mask_iou_matrix([c[2] for c in cand], [r[2] for r in ref]))
+            # 合并后的人物 mask (分析器实际使用的输出)
+            ref_union = np.any([r[2] for r in ref], axis=0) if ref else None
+            cand_union = np.any([c[2] for c in cand], axis=0) if cand else None
+            if ref_union is None and cand_union is None:
+                union_ious.append(1.0)
+            elif ref_union is None or cand_union is None:
+                union_ious.append(0.0)
+            else:
+                union = np.logical_or(ref_union, cand_union).sum()
+                union_ious.append(np.logical_and(ref_union, cand_union).sum() / union if union else 1.0)
+
+    report = {'frames': frames, 'box': box_ap.summary(),
+              'latency': {prec: latency_summary(samples) for prec, samples in times.items()}}
+    if kind == 'pose':
+        report['keypoints'] = kpt_ap.summary()
+    else:
+        report['mask'] = mask_ap.summary()
+        report['mask']['union_iou'] = float(np.mean(union_ious)) if union_ious else None
+    fp32_ms, int8_ms = report['latency']['fp32']['mean_ms'], report['latency']['int8']['mean_ms']
+    report['speedup'] = fp32_ms / int8_ms if fp32_ms and int8_ms else None
+    return report
+
+
+def fmt(value, spec):
+    return '-' if value is None else format(value, spec)
+
+
+def print_report(kind, report):
+    name = MODEL_NAMES[kind]
+    print("\n" + "=" * 64)
+    print(f"{name}: INT8 对比 FP32 ({report['frames']} 帧评估)")
+    print("-" * 64)
+    rows = [('box', report['box'])]
+    rows.append(('keypoints (OKS)', report['keypoints']) if kind == 'pose' else ('mask', report['mask']))
+    print(f"{'':<18}{'AP50':>10}{'AP50-95':>10}{'参考实例':>10}")
+    for label, ap in rows:
+        print(f"{label:<18}{fmt(ap['ap50'], '.3f'):>10}{fmt(ap['ap50_95'], '.3f'):>10}{ap['references']:>10}")
+    if kind == 'seg':
+        print(f"{'union mask IoU':<18}{fmt(report['mask']['union_iou'], '.3f'):>10}")
+    print("-" * 64)
+    print(f"{'每帧耗时 (ms)':<18}{'mean':>10}{'p95':>10}")
+    for prec in ('fp32', 'int8'):
+        lat = report['latency'][prec]
+        print(f"{prec:<18}{fmt(lat['mean_ms'], '.1f'):>10}{fmt(lat['p95_ms'], '.1f'):>10}")
+    print(f"加速比: {fmt(report['speedup'], '.2f')}x")
+    print("=" * 64)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='YOLOv8 INT8 训练后量化和精度/耗时对比')
+    parser.add_argument('--source', required=True, help='录制的视频文件或图片目录 (校准 + 评估)')
+    parser.add_argument('--models', nargs='+', choices=['pose', 'seg'], default=['pose', 'seg'])
+    parser.add_argument('--flip', action='store_true', help='水平镜像 (录的是摄像头原始画面时使用)')
+    parser.add_argument('--calib-frames', type=int, default=200, help='最多使用的校准帧数')
+    parser.add_argument('--eval-frames', type=int, default=100, help='最多使用的评估帧数')
+    parser.add_argument('--stride', type=int, default=5, help='每隔多少帧取一帧 (相邻帧几乎相同)')
+    parser.add_argument('--calibrate', choices=list(CALIBRATION_METHODS), default='minmax')
+    parser.add_argument('--quantize-head', action='store_true', help='检测头的解码部分也量化 (不推荐)')
+    parser.add_argument('--head-prefix', default='/model.22/', help='检测头节点名前缀')
+    parser.add_argument('--imgsz', type=int, default=640, help='模型输入为动态尺寸时使用的边长')
+    parser.add_argument('--ref-conf', type=float, default=0.5, help='FP32 输出作为参考标注的置信度阈值')
+    parser.add_argument('--threads', type=int, default=0, help='评估时的推理线程数 (0 = 运行时默认)')
+    parser.add_argument('--skip-quantize', action='store_true', help='只评估已有的 *_int8.onnx')
+    parser.add_argument('--min-ap', type=float, default=None,
+                        help='关键点/mask AP50-95 的下限，低于时返回非零退出码')
+    parser.add_argument('--json', default=None, help='把报告写入 JSON 文件')
+    args = parser.parse_args()
+    args.stride = max(1, args.stride)
+
+    source = ReplaySource(args.source)
+    opened = source.isOpened()
+    source.release()
+    if not opened:
+        print(f"✗ 无法打开回放源: {args.source}")
+        return 1
+
+    reports = {}
+    failed = False
+    for kind in args.models:
+        name = MODEL_NAMES[kind]
+        fp32_path = os.path.join(MODEL_DIR, f"{name}.onnx")
+        int8_path = os.path.join(MODEL_DIR, f"{name}_int8.onnx")
+        if not os.path.exists(fp32_path):
+            print(f"✗ 找不到 {os.path.relpath(fp32_path, ROOT)}，先运行 tools/export_models.py")
+            failed = True
+            continue
+
+        if not args.skip_quantize:
+            print(f"\n量化 {name}...")
+            t0 = time.time()
+            count = quantize_model(fp32_path, int8_path, args)
+            print(f"  ✓ {os.path.relpath(int8_path, ROOT)} ({count} 帧校准，{time.time() - t0:.1f}s)")
+        elif not os.path.exists(int8_path):
+            print(f"✗ 找不到 {os.path.relpath(int8_path, ROOT)}")
+            failed = True
+            continue
+
+        fp32_model = YoloRuntimeModel(RuntimeSession(fp32_path, 'onnx', args.threads), kind, args.imgsz)
+        int8_model = YoloRuntimeModel(RuntimeSession(int8_path, 'onnx', args.threads), kind, args.imgsz)
+        report = evaluate(kind, fp32_model, int8_model, args)
+        report['size_mb'] = {'fp32': os.path.getsize(fp32_path) / 1e6, 'int8': os.path.getsize(int8_path) / 1e6}
+        reports[name] = report
+        print_report(kind, report)
+
+        if args.min_ap is not None:
+            quality = report['keypoints' if kind == 'pose' else 'mask']['ap50_95']
+            if quality is None or quality < args.min_ap:
+                print(f"✗ {name}: AP50-95 {fmt(quality, '.3f')} < {args.min_ap}")
+                failed = True
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump({'source': args.source, 'calibrate': args.calibrate, 'stride': args.stride,
+                       'models': reports}, f, indent=2, ensure_ascii=False)
+        print(f"✓ 报告已保存: {args.json}")
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,168 @@
+"""
+离线回放基准测试
+把录好的视频 (或图片目录) 送进完整的 GalleryView 流水线，不需要摄像头、窗口和机械臂：
+- 分析: process_frame / 分割 mask
+- 渲染: apply_visual_effects / create_glitch_frame / create_composite_view
+- 追踪: AdvancedTracker 连接模拟舵机总线 (sts_control/sim_servo.py)
+输出每个 profiler 区间的耗时和等效 FPS、端到端 FPS、内存峰值和分配统计，
+用于在 CPU-only 的 Linux 机器上比较改动前后的性能
+
+用法:
+    python tools/replay_benchmark.py --source clip.mp4 --frames 300
+    python tools/replay_benchmark.py --source frames_dir/ --mode serial --trace-alloc
+    python tools/replay_benchmark.py --source clip.mp4 --json logs/bench.json
+"""
+
+import argparse
+import gc
+import json
+import os
+import resource
+import sys
+import time
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT)
+sys.path.append(os.path.join(ROOT, 'sts_control'))
+
+from main import GalleryView
+from profiler import profiler
+from replay import ReplaySource
+from sim_servo import SimulatedServoPort
+from sts_driver import STSServoSerial
+
+
+def build_servo_driver(time_scale):
+    """连接模拟总线的 STSServoSerial (与真实机械臂相同的协议路径)"""
+    port = SimulatedServoPort(servo_ids=(1, 2, 3, 4), time_scale=time_scale)
+    return STSServoSerial(None, serial_port=port), port
+
+
+def print_spans(spans, elapsed, frames):
+    print(f"\n{'STAGE':<28}{'count':>7}{'mean':>9}{'p50':>9}{'p95':>9}{'max':>9}{'FPS':>9}")
+    print("-" * 80)
+    for name, s in sorted(spans.items(), key=lambda kv: -kv[1]['mean']):
+        fps = 1000.0 / s['mean'] if s['mean'] > 0 else 0.0
+        print(f"{name:<28}{s['count']:>7}{s['mean']:>9.2f}{s['p50']:>9.2f}"
+              f"{s['p95']:>9.2f}{s['max']:>9.2f}{fps:>9.1f}")
+    print("-" * 80)
+    e2e_fps = frames / elapsed if elapsed > 0 else 0.0
+    print(f"端到端: {frames} 帧 / {elapsed:.2f}s = {e2e_fps:.2f} FPS")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='离线回放基准测试')
+    parser.add_argument('--source', required=True, help='视频文件或图片目录')
+    parser.add_argument('--frames', type=int, default=None, help='最多处理多少帧 (默认整段)')
+    parser.add_argument('--mode', choices=['serial', 'pipeline'], default='pipeline',
+                        help='串行执行或分级流水线 (流水线使用 block 策略，保证每帧都处理)')
+    parser.add_argument('--flip', action='store_true', help='水平镜像 (录的是摄像头原始画面时使用)')
+    parser.add_argument('--loop', action='store_true', help='回放结束后从头循环 (配合 --frames)')
+    parser.add_argument('--no-tracker', action='store_true', help='不启动 AdvancedTracker')
+    parser.add_argument('--servo-time-scale', type=float, default=20.0,
+                        help='模拟舵机运动加速倍数 (缩短归位/等待停止)')
+    parser.add_argument('--detection-mode', choices=['separate', 'fused'], default=None,
+                        help='运行时切换检测模式 (pose_only 需要在构造分析器时选择)')
+    parser.add_argument('--inference-long-edge', type=int, default=None)
+    parser.add_argument('--trace-alloc', action='store_true',
+                        help='用 tracemalloc 统计 Python 分配 (有额外开销，FPS 会偏低)')
+    parser.add_argument('--top', type=int, default=10, help='显示前 N 个分配位置')
+    parser.add_argument('--json', default=None, help='把结果写入 JSON 文件')
+    args = parser.parse_args()
+
+    source = ReplaySource(args.source, flip=args.flip, loop=args.loop, max_frames=args.frames)
+    if not source.isOpened():
+        print(f"✗ 无法打开回放源: {args.source}")
+        return 1
+
+    servo_port = None
+    driver = None
+    if not args.no_tracker:
+        driver, servo_port = build_servo_driver(args.servo_time_scale)
+
+    gallery = GalleryView(source=source, headless=True, tracker_driver=driver,
+                          enable_tracker=not args.no_tracker)
+    gallery.pipeline_enabled = args.mode == 'pipeline'
+    gallery.pipeline_policy = 'block'
+    if args.detection_mode is not None:
+        gallery.analyzer.detection_mode = args.detection_mode
+    if args.inference_long_edge is not None:
+        gallery.analyzer.inference_long_edge = args.inference_long_edge
+
+    # 统计窗口覆盖整段回放，不定期导出
+    profiler.configure(enabled=True, window=max(300, args.frames or 10000), dump_interval=0)
+    profiler.reset()
+
+    if args.trace_alloc:
+        tracemalloc.start(1)
+    gc_before = [s['collections'] for s in gc.get_stats()]
+
+    t0 = time.time()
+    gallery.run(max_frames=args.frames)
+    elapsed = time.time() - t0
+
+    gc_after = [s['collections'] for s in gc.get_stats()]
+    snap = profiler.snapshot()
+    frames = gallery.frames_displayed
+
+    print("\n" + "=" * 80)
+    print(f"回放基准测试: {args.source}  模式: {args.mode}")
+    print("=" * 80)
+    print_spans(snap['spans'], elapsed, frames)
+
+    report = {
+        'source': args.source,
+        'mode': args.mode,
+        'frames': frames,
+        'elapsed_s': elapsed,
+        'e2e_fps': frames / elapsed if elapsed > 0 else 0.0,
+        'spans': snap['spans'],
+        'counters': snap['counters'],
+        'capture': source.get_stats(),
+        'frame_pool': gallery.frame_pool.stats(),
+        'gc_collections': [b - a for a, b in zip(gc_before, gc_after)],
+        # Linux 下 ru_maxrss 单位是 KB
+        'max_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0,
+    }
+
+    print(f"\n内存峰值 (RSS): {report['max_rss_mb']:.1f} MB")
+    print(f"GC 回收次数 (gen0/1/2): {report['gc_collections']}")
+    pool = report['frame_pool']
+    print(f"帧缓冲池: 分配 {pool['allocated']} 块, 复用 {pool['reused']} 次")
+
+    if args.trace_alloc:
+        current, peak = tracemalloc.get_traced_memory()
+        stats = tracemalloc.take_snapshot().statistics('lineno')
+        tracemalloc.stop()
+        report['python_alloc'] = {
+            'current_mb': current / 1e6,
+            'peak_mb': peak / 1e6,
+            'top': [{'where': str(s.traceback), 'size_kb': s.size / 1024.0, 'count': s.count}
+                    for s in stats[:args.top]],
+        }
+        print(f"Python 分配: 当前 {current / 1e6:.1f} MB, 峰值 {peak / 1e6:.1f} MB")
+        print(f"\n{'分配位置':<60}{'KB':>10}{'块数':>10}")
+        for entry in report['python_alloc']['top']:
+            print(f"{entry['where'][-60:]:<60}{entry['size_kb']:>10.1f}{entry['count']:>10}")
+
+    if servo_port is not None:
+        report['servo_bus'] = {
+            'packets': servo_port.packets,
+            'bytes_written': servo_port.bytes_written,
+            'bytes_read': servo_port.bytes_read,
+            'checksum_errors': servo_port.checksum_errors,
+        }
+        print(f"\n模拟舵机总线: {servo_port.packets} 包, "
+              f"写 {servo_port.bytes_written} B, 读 {servo_port.bytes_read} B")
+
+    if args.json:
+        os.makedirs(os.path.dirname(os.path.abspath(args.json)), exist_ok=True)
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+        print(f"✓ 结果已写入 {args.json}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,223 @@
+"""
+推理分辨率对比报告
+在录制的视频 (或图片目录) 上分别用采集分辨率和降采样分辨率跑一遍分析器，
+输出各阶段耗时和相对采集分辨率的精度差异：
+- 人体框: IoU>0.5 匹配的召回率/准确率、平均 IoU
+- 关键点: 按人体框对角线归一化的平均误差
+- 分割 mask: 整帧 IoU
+- 人脸: 数量差异、年龄差异
+
+用法:
+    python tools/resolution_report.py --source clip.mp4 --sizes 640 480 --frames 200
+    python tools/resolution_report.py --source recorded_frames/ --json report.json
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+
+import cv2
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from person_analysis import CompletePersonFaceAnalyzer
+
+STAGES = ['resize', 'detect', 'faces', 'attributes', 'segmentation']
+
+
+def load_frames(source, max_frames):
+    """读取视频文件或图片目录，返回帧列表"""
+    frames = []
+    if os.path.isdir(source):
+        names = sorted(n for n in os.listdir(source)
+                       if n.lower().endswith(('.jpg', '.jpeg', '.png', '.bmp')))
+        for name in names[:max_frames]:
+            img = cv2.imread(os.path.join(source, name))
+            if img is not None:
+                frames.append(img)
+    else:
+        cap = cv2.VideoCapture(source)
+        while len(frames) < max_frames:
+            ret, frame = cap.read()
+            if not ret:
+                break
+            frames.append(frame)
+        cap.release()
+    return frames
+
+
+def box_iou(a, b):
+    ix1, iy1 = max(a[0], b[0]), max(a[1], b[1])
+    ix2, iy2 = min(a[2], b[2]), min(a[3], b[3])
+    inter = max(0, ix2 - ix1) * max(0, iy2 - iy1)
+    area_a = max(0, a[2] - a[0]) * max(0, a[3] - a[1])
+    area_b = max(0, b[2] - b[0]) * max(0, b[3] - b[1])
+    union = area_a + area_b - inter
+    return inter / union if union > 0 else 0.0
+
+
+def mask_iou(a, b):
+    if a is None and b is None:
+        return 1.0
+    if a is None or b is None:
+        return 0.0
+    a = a > 0
+    b = b > 0
+    union = np.logical_or(a, b).sum()
+    if union == 0:
+        return 1.0
+    return np.logical_and(a, b).sum() / union
+
+
+def run_pass(analyzer, frames, long_edge):
+    """用指定推理分辨率跑完所有帧，返回每帧结果和耗时"""
+    analyzer.reset_state()
+    analyzer.inference_long_edge = long_edge
+    outputs = []
+    for frame in frames:
+        t0 = time.time()
+        _, results = analyzer.process_frame(frame.copy())
+        mask = analyzer.get_segmentation_mask(frame)
+        total = time.time() - t0
+        stage_times = dict(analyzer.stage_times)
+        stage_times['total'] = total
+        outputs.append({
+            'results': [{
+                'bbox': r['bbox'],
+                'keypoints': None if r['keypoints'] is None else np.array(r['keypoints']),
+                'age': r['face']['age'] if r.get('face') else None,
+            } for r in results],
+            'mask': mask,
+            'times': stage_times,
+        })
+    return outputs
+
+
+def compare(reference, candidate):
+    """逐帧对比候选分辨率和参考分辨率的结果"""
+    matched = ref_total = cand_total = 0
+    ious, kpt_errors, mask_ious, face_diffs, age_diffs = [], [], [], [], []
+
+    for ref, cand in zip(reference, candidate):
+        ref_total += len(ref['results'])
+        cand_total += len(cand['results'])
+        used = set()
+        for r in ref['results']:
+            best_j, best_iou = -1, 0.5
+            for j, c in enumerate(cand['results']):
+                if j in used:
+                    continue
+                iou = box_iou(r['bbox'], c['bbox'])
+                if iou > best_iou:
+                    best_j, best_iou = j, iou
+            if best_j < 0:
+                continue
+            used.add(best_j)
+            matched += 1
+            ious.append(best_iou)
+            c = cand['results'][best_j]
+
+            if r['keypoints'] is not None and c['keypoints'] is not None:
+                x1, y1, x2, y2 = r['bbox']
+                diag = max(1.0, np.hypot(x2 - x1, y2 - y1))
+                # 只比较两次都可见的关键点
+                visible = (r['keypoints'][:, 2] > 0.5) & (c['keypoints'][:, 2] > 0.5)
+                if visible.any():
+                    d = np.linalg.norm(r['keypoints'][visible, :2] - c['keypoints'][visible, :2], axis=1)
+                    kpt_errors.append(float(d.mean() / diag))
+
+            if r['age'] is not None and c['age'] is not None:
+                age_diffs.append(abs(r['age'] - c['age']))
+
+        face_diffs.append(abs(sum(r['age'] is not None for r in ref['results']) -
+                              sum(c['age'] is not None for c in cand['results'])))
+        mask_ious.append(mask_iou(ref['mask'], cand['mask']))
+
+    def mean(values):
+        return float(np.mean(values)) if values else None
+
+    return {
+        'recall': matched / ref_total if ref_total else None,
+        'precision': matched / cand_total if cand_total else None,
+        'box_iou': mean(ious),
+        'keypoint_error': mean(kpt_errors),
+        'mask_iou': mean(mask_ious),
+        'face_count_diff': mean(face_diffs),
+        'age_diff': mean(age_diffs),
+    }
+
+
+def summarize_times(outputs):
+    """各阶段平均耗时 (ms)，跳过第一帧的预热"""
+    samples = outputs[1:] if len(outputs) > 1 else outputs
+    return {stage: 1000.0 * float(np.mean([o['times'].get(stage, 0.0) for o in samples]))
+            for stage in STAGES + ['total']}
+
+
+def fmt(value, spec):
+    return '-' if value is None else format(value, spec)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='推理分辨率精度/耗时对比')
+    parser.add_argument('--source', required=True, help='录制的视频文件或图片目录')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[640, 480], help='要对比的推理长边')
+    parser.add_argument('--frames', type=int, default=300, help='最多读取的帧数')
+    parser.add_argument('--mode', default='separate', choices=['separate', 'fused', 'pose_only'])
+    parser.add_argument('--json', help='把报告另存为 JSON')
+    args = parser.parse_args()
+
+    frames = load_frames(args.source, args.frames)
+    if not frames:
+        print(f"✗ 无法读取: {args.source}")
+        return
+    h, w = frames[0].shape[:2]
+    print(f"✓ 读取 {len(frames)} 帧 ({w}x{h})")
+
+    analyzer = CompletePersonFaceAnalyzer(detection_mode=args.mode)
+    analyzer.enable_effects = False
+    analyzer.segmentation_enabled = analyzer.yolo_seg_model is not None
+
+    print("\n参考: 采集分辨率...")
+    reference = run_pass(analyzer, frames, None)
+    report = {'source': args.source, 'frames': len(frames), 'resolution': [w, h],
+              'reference': {'times_ms': summarize_times(reference)}, 'candidates': {}}
+
+    for size in args.sizes:
+        print(f"候选: 长边 {size}...")
+        outputs = run_pass(analyzer, frames, size)
+        report['candidates'][str(size)] = {
+            'times_ms': summarize_times(outputs),
+            'accuracy': compare(reference, outputs),
+        }
+
+    # 耗时表
+    print("\n" + "=" * 78)
+    print(f"{'阶段耗时 (ms)':<16}" + f"{'原始':>10}" + ''.join(f"{s:>10}" for s in args.sizes))
+    print("-" * 78)
+    for stage in STAGES + ['total']:
+        row = f"{stage:<16}" + f"{report['reference']['times_ms'][stage]:>10.1f}"
+        row += ''.join(f"{report['candidates'][str(s)]['times_ms'][stage]:>10.1f}" for s in args.sizes)
+        print(row)
+
+    # 精度表
+    print("-" * 78)
+    metrics = [('recall', '.3f'), ('precision', '.3f'), ('box_iou', '.3f'),
+               ('keypoint_error', '.4f'), ('mask_iou', '.3f'),
+               ('face_count_diff', '.2f'), ('age_diff', '.2f')]
+    for name, spec in metrics:
+        row = f"{name:<16}" + f"{'-':>10}"
+        row += ''.join(f"{fmt(report['candidates'][str(s)]['accuracy'][name], spec):>10}" for s in args.sizes)
+        print(row)
+    print("=" * 78)
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+        print(f"✓ 报告已保存: {args.json}")
+
+
+if __name__ == '__main__':
+    main()
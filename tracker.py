@@ -12,6 +12,7 @@ import sys
 import time
 import numpy as np
 import math
+import threading
 
 # 在导入 ultralytics 之前保存原始的 cv2 函数
 _cv2_imshow = cv2.imshow
@@ -20,6 +21,8 @@ _cv2_destroyAllWindows = cv2.destroyAllWindows
 
 sys.path.append('sts_control')
 from sts_driver import STSServoSerial
+from servo_bus import ServoBusManager
+from target_predictor import AlphaBetaPredictor
 from ultralytics import YOLO
 
 # 恢复原始的 cv2 函数
@@ -40,20 +43,29 @@ MOTOR_CALIBRATION = {
 }
 
 class AdvancedTracker:
-    def __init__(self, port="COM4", camera_id=0, use_internal_camera=True, load_model=True):
+    def __init__(self, port="COM4", camera_id=0, use_internal_camera=True, load_model=True, driver=None,
+                 headless=False, bus_rate_hz=100, telemetry_every=5, command_queue_size=10,
+                 control_hz=100, gain_reference_hz=12.0, predictor_beta=0.1, max_extrapolation=0.15):
         print("="*40)
         print("Advanced Tracker 2.7")
         print("策略: 智能找脸 + 自动补位 + 归位后全域搜索 + 部位扫描")
         print("="*40)
         
-        # 初始化驱动
+        # 初始化驱动 (可注入外部驱动，例如连接模拟总线的 STSServoSerial)
         print("连接电机...")
-        try:
-            self.driver = STSServoSerial(port, 1000000)
-            print("✓ 电机已连接")
-        except Exception as e:
-            print(f"✗ 电机连接失败: {e}")
-            self.driver = None
+        if driver is not None:
+            self.driver = driver
+            print("✓ 使用外部电机驱动")
+        else:
+            try:
+                self.driver = STSServoSerial(port, 1000000)
+                print("✓ 电机已连接")
+            except Exception as e:
+                print(f"✗ 电机连接失败: {e}")
+                self.driver = None
+        
+        # 无界面模式：不绘制调试画面 (不复制整帧，process_frame 返回 None)
+        self.headless = headless
         
         # 初始化摄像头
         self.cap = None
@@ -74,8 +86,13 @@ class AdvancedTracker:
         else:
             print("跳过模型加载 (使用外部结果模式)")
         
-        # 初始化电机
+        # 串口从一开始就交给总线线程，初始化/归位也只通过总线 (目标、遥测、一次性命令队列)
+        # process_frame 只把目标写进总线的最新值槽位，SYNC WRITE / 遥测由总线线程按固定频率完成
+        self.bus = None
         if self.driver:
+            self.bus = ServoBusManager(self.driver, servo_ids=(1, 2, 3, 4), rate_hz=bus_rate_hz,
+                                       telemetry_every=telemetry_every, queue_size=command_queue_size).start()
+            print(f"✓ 舵机总线线程已启动 ({bus_rate_hz} Hz)")
             self._init_motors()
         
         # 画面尺寸
@@ -106,8 +123,9 @@ class AdvancedTracker:
         # 状态变量
         self.tracking_mode = "NONE" 
         self.active_target_index = None # 当前正在追踪的人物索引 (对外接口)
+        self.active_track_id = None     # 当前锁定的人物 track_id (人物顺序变化时按 ID 重新定位)
         self.last_control_time = 0
-        self.control_hz = 100
+        self.control_hz = control_hz
         
         # 多人切换
         self.current_person_index = 0
@@ -139,52 +157,120 @@ class AdvancedTracker:
         self.last_scan_switch_time = 0
         self.scan_switch_interval = 2.0 # 识别到部位后，打量2秒再切换
         
-    def _wait_for_stop(self, motor_id, timeout=10.0):
-        """等待电机停止移动"""
+        # --- 固定频率控制线程 ---
+        # process_frame (视觉线程) 只更新带采集时间戳的测量和当前模式；
+        # 控制线程每个周期外推目标位置、计算增量并写入总线，运动不再跟着 10-15 Hz 的推理帧率跳变
+        # 增益是按每个视觉帧调校的，控制周期的增量按 dt × gain_reference_hz 折算
+        self.gain_reference_hz = gain_reference_hz
+        self.target_predictor = AlphaBetaPredictor(alpha=(self.alpha_x, self.alpha_y), beta=predictor_beta,
+                                                   max_extrapolation=max_extrapolation)
+        self._predictor_key = None
+        self.control_state = {'mode': "NONE", 'follow': False, 'size_factor': 0.25, 'tracking': False}
+        self._control_lock = threading.Lock()
+        self.control_rate = 0.0
+        self.control_overruns = 0
+        self.control_errors = 0
+        self._control_running = False
+        self._control_thread = None
+        if self.bus:
+            self._start_control_thread()
+        
+    def _wait_for_stop(self, motor_ids, timeout=10.0):
+        """等待电机停止移动 (motor_ids: 单个 ID 或 ID 列表，使用总线线程缓存的遥测)"""
+        if isinstance(motor_ids, int):
+            motor_ids = [motor_ids]
+        # 只认目标发出之后读到的遥测：先等目标发出 (一个总线周期) 再等过一个遥测周期
+        telemetry_period = self.bus.period * self.bus.telemetry_every
+        max_age = 1.5 * telemetry_period
         start_time = time.time()
-        time.sleep(0.1) # 给指令发送一点时间
+        time.sleep(max_age + 2 * self.bus.period)
         while True:
             if time.time() - start_time > timeout:
-                print(f"  ⚠️ Motor {motor_id} 等待超时")
+                print(f"  ⚠️ Motor {', '.join(map(str, motor_ids))} 等待超时")
                 break
             
-            is_moving = self.driver.is_moving(motor_id)
-            if is_moving is False: # 明确返回 False 才算停止
+            telemetry = [self.bus.get_telemetry(motor_id, max_age=max_age) for motor_id in motor_ids]
+            # 明确读到所有电机都停止才算停止；遥测缺失或过期时继续等
+            if all(t is not None and not t.moving for t in telemetry):
                 break
-            if is_moving is None: # 读取失败，忽略本次
-                pass
                 
-            time.sleep(0.1)
+            time.sleep(telemetry_period)
 
     def _init_motors(self):
         print("\n初始化电机...")
         for motor_id in [1, 2, 3, 4]:
-            self.driver.set_torque_enable(motor_id, True)
+            self.bus.submit('set_torque_enable', motor_id, True)
         time.sleep(0.5)
         print("归中 (speed=400, 等待到位)...")
         
         # Motor 1
-        self.driver.set_position(1, 2048, speed=400, move_time=0)
+        self.bus.set_goal(1, 2048, speed=400)
         self._wait_for_stop(1)
 
         # Motor 2
-        self.driver.set_position(2, 2048, speed=400, move_time=0)
+        self.bus.set_goal(2, 2048, speed=400)
         self._wait_for_stop(2)
 
         # Motor 3
-        self.driver.set_position(3, 2048, speed=400, move_time=0)
+        self.bus.set_goal(3, 2048, speed=400)
         self._wait_for_stop(3)
 
         # Motor 4
-        self.driver.set_position(4, 2048, speed=400, move_time=0)
+        self.bus.set_goal(4, 2048, speed=400)
         self._wait_for_stop(4)
         
         print("✓ Ready\n")
 
+    # ------------------------------------------------------------
+    # 固定频率控制线程
+    # ------------------------------------------------------------
+    def _start_control_thread(self):
+        self._control_running = True
+        self._control_thread = threading.Thread(target=self._control_loop, name="tracker-control", daemon=True)
+        self._control_thread.start()
+        print(f"✓ 控制线程已启动 ({self.control_hz} Hz)")
+
+    def _stop_control_thread(self):
+        self._control_running = False
+        if self._control_thread is not None and self._control_thread.is_alive():
+            self._control_thread.join(timeout=1.0)
+        self._control_thread = None
+
+    def _control_loop(self):
+        period = 1.0 / self.control_hz
+        last_time = time.time()
+        next_tick = time.monotonic()
+        window_start, window_ticks, ticks = next_tick, 0, 0
+        while self._control_running:
+            current_time = time.time()
+            # 线程被拖慢时不一次补一大步
+            dt = min(current_time - last_time, 0.1)
+            last_time = current_time
+            try:
+                self._control_step(current_time, dt)
+            except Exception as e:
+                self.control_errors += 1
+                if self.control_errors == 1 or self.control_errors % 100 == 0:
+                    print(f"Tracker control error ({self.control_errors}): {e}")
+            ticks += 1
+
+            now = time.monotonic()
+            if now - window_start >= 1.0:
+                self.control_rate = (ticks - window_ticks) / (now - window_start)
+                window_start, window_ticks = now, ticks
+            next_tick += period
+            delay = next_tick - now
+            if delay <= 0:
+                self.control_overruns += 1
+                next_tick = now
+                continue
+            time.sleep(delay)
+
     def get_tracking_target(self, results):
         """返回目标坐标，同时返回当前人的关键点数据供扫描使用"""
         all_people_keypoints = []
         all_people_conf = [] # 存储每个人(Box)的置信度
+        track_ids = [] # 每个人的 track_id (仅字典结果提供)
 
         if not results: return (None, None, "NONE", 0.0, None, 0.0)
         
@@ -202,19 +288,26 @@ class AdvancedTracker:
         elif isinstance(results, list) and len(results) > 0 and isinstance(results[0], dict):
             valid_people = []
             valid_conf = []
+            valid_track_ids = []
             for r in results:
                 if 'keypoints' in r and r['keypoints'] is not None:
                     valid_people.append(r['keypoints'])
                     valid_conf.append(r.get('person_conf', 0.0)) # 获取 person_analyzer 里的 person_conf
+                    valid_track_ids.append(r.get('track_id'))
             if not valid_people: return (None, None, "NONE", 0.0, None, 0.0)
             all_people_keypoints = valid_people
             all_people_conf = valid_conf
+            track_ids = valid_track_ids
         else:
             return (None, None, "NONE", 0.0, None, 0.0)
 
         num_people = len(all_people_keypoints)
         if num_people == 0: return (None, None, "NONE", 0.0, None, 0.0)
 
+        # 按 track_id 重新定位锁定的人 (检测顺序每帧都可能变化)
+        if self.active_track_id is not None and self.active_track_id in track_ids:
+            self.current_person_index = track_ids.index(self.active_track_id)
+
         current_time = time.time()
         if current_time - self.last_switch_time > self.switch_interval:
             if num_people > 1:
@@ -250,6 +343,8 @@ class AdvancedTracker:
 
         kp = all_people_keypoints[target_idx]
         person_label = f"P{target_idx+1}"
+        if target_idx < len(track_ids):
+            self.active_track_id = track_ids[target_idx]
         
         # 统一降低阈值到 0.3，提高追踪稳定性
         nose = kp[0]
@@ -305,6 +400,8 @@ class AdvancedTracker:
             
             if len(other_nose) >= 3 and other_nose[2] > 0.3:
                 self.current_person_index = i
+                if i < len(track_ids):
+                    self.active_track_id = track_ids[i]
                 print(f"⚠️ 当前目标无效，自动切换到 P{i+1}")
                 return (other_nose[0], other_nose[1], f"FACE P{i+1} (AUTO)", other_nose[2], other_kp, other_size)
                 
@@ -496,7 +593,11 @@ class AdvancedTracker:
         cv2.putText(frame, status_text, (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 0.7, color, 2)
         return frame
 
-    def process_frame(self, frame, external_results=None):
+    def process_frame(self, frame, external_results=None, frame_ts=None):
+        """
+        视觉更新：选目标、切换模式、更新目标测量 (frame_ts: 帧的采集时间，用于补偿推理延迟)
+        电机控制在控制线程 (_control_step) 里按固定频率进行
+        """
         # 1. 自动更新画面尺寸和中心点 (适配 1920x1080 或其他分辨率)
         h, w = frame.shape[:2]
         if w != self.frame_width or h != self.frame_height:
@@ -507,6 +608,7 @@ class AdvancedTracker:
             # print(f"[Tracker] Resolution updated to {w}x{h}, Center: ({self.center_x}, {self.center_y})")
 
         current_time = time.time()
+        measured_time = frame_ts if frame_ts else current_time
         
         if external_results is not None:
             results = external_results
@@ -532,7 +634,8 @@ class AdvancedTracker:
             self.search_start_time = 0 
             
             # --- 主动观察模式逻辑 ---
-            target_id = mode.split()[-1]
+            # 有 track_id 时按身份判断是否换人，否则按标签 (P1/P2...)
+            target_id = self.active_track_id if self.active_track_id is not None else mode.split()[-1]
             if target_id != self.last_target_id:
                 self.stable_since = current_time
                 self.last_target_id = target_id
@@ -597,13 +700,14 @@ class AdvancedTracker:
                     self.last_scan_switch_time = current_time
                     # 这一帧保持原目标(脸/身体)，下一帧处理新部位 
 
-            # 更新平滑坐标
-            if self.smooth_x is None:
-                self.smooth_x = tx
-                self.smooth_y = ty
-            else:
-                self.smooth_x = self.alpha_x * tx + (1 - self.alpha_x) * self.smooth_x
-                self.smooth_y = self.alpha_y * ty + (1 - self.alpha_y) * self.smooth_y
+            # 更新平滑坐标 (alpha-beta 滤波，控制线程据此外推)
+            # 换人或换观察部位时目标点跳变，重置速度估计
+            predictor_key = (target_id, mode)
+            with self._control_lock:
+                if predictor_key != self._predictor_key:
+                    self._predictor_key = predictor_key
+                    self.target_predictor.reset()
+                self.smooth_x, self.smooth_y = self.target_predictor.update(tx, ty, measured_time)
 
         else:
             # 无目标
@@ -662,7 +766,10 @@ class AdvancedTracker:
                     self.smooth_x = None 
                     mode = "WAITING"
 
-        annotated_frame = self.draw_ui(frame.copy(), self.smooth_x, self.smooth_y, mode, conf)
+        # 调试画面画在副本上 (传入的帧可能是与其他线程共享的只读视图)
+        annotated_frame = None
+        if not self.headless:
+            annotated_frame = self.draw_ui(frame.copy(), self.smooth_x, self.smooth_y, mode, conf)
         
         # 检测从非追踪模式切换到追踪模式 (Soft Start Logic)
         is_tracking_now = any(k in mode for k in ["FACE", "BODY", "HIPS", "OBSERVING", "LOST"])
@@ -672,107 +779,127 @@ class AdvancedTracker:
         if is_tracking_now and was_searching:
             self.tracking_transition_start = current_time
         
-        if self.driver:
-            self.last_control_time = current_time
-            
-            if (tx is not None or mode == "LOST(FOLLOW)") and self.smooth_x is not None:
-                # 传入 size_factor (如果丢失目标，使用默认 0.25)
-                current_size = size_factor if tx is not None else 0.25
-                res = self.calculate_motor_increments(self.smooth_x, self.smooth_y, current_size)
-                if res:
-                    d1, d2, d3, d4 = res
-                    self.update_motor_targets(d1, d2, d3, d4)
-            
-            elif mode == "RESETTING":
-                k_return = 0.15 
-                for mid in [2, 3, 4]:
-                     target_pos = 2048
-                     if mid == 2: self.motor2_target += (target_pos - self.motor2_target) * k_return
-                     elif mid == 3: self.motor3_target += (target_pos - self.motor3_target) * k_return
-                     elif mid == 4: self.motor4_target += (target_pos - self.motor4_target) * k_return
-                     current = [0,0,self.motor2_target,self.motor3_target,self.motor4_target][mid]
-                     if abs(current - target_pos) < 100:
-                         if mid==2: self.motor2_target = target_pos
-                         elif mid==3: self.motor3_target = target_pos
-                         elif mid==4: self.motor4_target = target_pos
-
-            elif mode == "SEARCHING":
-                self.motor2_target = 2048
-                self.motor3_target = 2048
-                self.motor4_target = 2048
-                
-                # --- 优化 Motor 1 巡航：闭环往返 ---
-                cal1 = MOTOR_CALIBRATION[1]
-                limit_min = min(cal1['min'], cal1['max'])
-                limit_max = max(cal1['min'], cal1['max'])
-                
-                range_span = limit_max - limit_min
-                cruise_min = limit_min + range_span * 0.2
-                cruise_max = limit_max - range_span * 0.2
+        # 交给控制线程 (电机目标只在控制线程里修改)
+        with self._control_lock:
+            self.control_state = {
+                'mode': mode,
+                'follow': (tx is not None or mode == "LOST(FOLLOW)") and self.smooth_x is not None,
+                'size_factor': size_factor if tx is not None else 0.25,  # 丢失目标时使用默认 0.25
+                'tracking': is_tracking_now,
+            }
+        
+        self.last_mode = mode
+        return annotated_frame
+
+    def _control_step(self, current_time, dt):
+        """控制线程的一个周期：外推目标 -> 计算增量 -> 写入总线"""
+        with self._control_lock:
+            state = self.control_state
+            target = self.target_predictor.predict(current_time) if state['follow'] else None
+        mode = state['mode']
+        # 增益按每个视觉帧调校，折算到本周期
+        scale = dt * self.gain_reference_hz
+        
+        self.last_control_time = current_time
+        
+        if target is not None:
+            res = self.calculate_motor_increments(target[0], target[1], state['size_factor'])
+            if res:
+                d1, d2, d3, d4 = (d * scale for d in res)
+                self.update_motor_targets(d1, d2, d3, d4)
+        
+        elif mode == "RESETTING":
+            # 每帧回归 15%，折算到本周期
+            k_return = 1.0 - (1.0 - 0.15) ** scale
+            for mid in [2, 3, 4]:
+                 target_pos = 2048
+                 if mid == 2: self.motor2_target += (target_pos - self.motor2_target) * k_return
+                 elif mid == 3: self.motor3_target += (target_pos - self.motor3_target) * k_return
+                 elif mid == 4: self.motor4_target += (target_pos - self.motor4_target) * k_return
+                 current = [0,0,self.motor2_target,self.motor3_target,self.motor4_target][mid]
+                 if abs(current - target_pos) < 100:
+                     if mid==2: self.motor2_target = target_pos
+                     elif mid==3: self.motor3_target = target_pos
+                     elif mid==4: self.motor4_target = target_pos
+
+        elif mode == "SEARCHING":
+            self.motor2_target = 2048
+            self.motor3_target = 2048
+            self.motor4_target = 2048
+            
+            # --- 优化 Motor 1 巡航：闭环往返 ---
+            cal1 = MOTOR_CALIBRATION[1]
+            limit_min = min(cal1['min'], cal1['max'])
+            limit_max = max(cal1['min'], cal1['max'])
+            
+            range_span = limit_max - limit_min
+            cruise_min = limit_min + range_span * 0.2
+            cruise_max = limit_max - range_span * 0.2
+            
+            # 初始化状态变量 (使用 setattr 避免修改 __init__)
+            if not hasattr(self, 'search_target_pos'):
+                self.search_target_pos = cruise_max
+                self.search_stop_start_time = 0
+                self.last_check_time = 0
+            
+            # 每 0.5 秒检查一次是否到达
+            if current_time - getattr(self, 'last_check_time', 0) > 0.5:
+                self.last_check_time = current_time
                 
-                # 初始化状态变量 (使用 setattr 避免修改 __init__)
-                if not hasattr(self, 'search_target_pos'):
-                    self.search_target_pos = cruise_max
-                    self.search_stop_start_time = 0
-                    self.last_check_time = 0
+                # 检查是否在移动
+                is_moving = False
+                if self.bus:
+                    # 总线线程定期读取的遥测缓存，控制线程不访问串口
+                    telemetry = self.bus.get_telemetry(1, max_age=0.5)
+                    # 如果读取失败，假设还在动以防卡死
+                    is_moving = telemetry.moving if telemetry is not None else True
                 
-                # 每 0.5 秒检查一次是否到达
-                if current_time - getattr(self, 'last_check_time', 0) > 0.5:
-                    self.last_check_time = current_time
-                    
-                    # 检查是否在移动
-                    is_moving = False
-                    if self.driver:
-                        is_moving = self.driver.is_moving(1)
-                        # 如果读取失败(None)，假设还在动以防卡死
-                        if is_moving is None: is_moving = True
+                if not is_moving:
+                    # 已停止
+                    if self.search_stop_start_time == 0:
+                        self.search_stop_start_time = current_time
                     
-                    if not is_moving:
-                        # 已停止
-                        if self.search_stop_start_time == 0:
-                            self.search_stop_start_time = current_time
-                        
-                        # 停够 1 秒了吗？
-                        if current_time - self.search_stop_start_time > 1.0:
-                            # 切换方向
-                            if abs(self.search_target_pos - cruise_max) < 100:
-                                self.search_target_pos = cruise_min
-                            else:
-                                self.search_target_pos = cruise_max
-                            self.search_stop_start_time = 0 # 重置计时
-                    else:
-                        # 还在动
-                        self.search_stop_start_time = 0
-                
-                self.motor1_target = self.search_target_pos
-
-            self.update_motor_targets(0, 0, 0, 0)
-            
-            # 默认追踪速度
-            move_time = 0    
-            target_speed = 1500
-            
-            # [NEW] 追踪初期的平滑加速 (Soft Start)
-            # 防止从巡航(500)突然切到追踪(1500)时的猛冲
-            if is_tracking_now:
-                elapsed = current_time - getattr(self, 'tracking_transition_start', 0)
-                ramp_duration = 1.5 # 1.5秒缓冲期
-                if elapsed < ramp_duration:
-                    # 从 500 线性加速到 1500
-                    ratio = elapsed / ramp_duration
-                    target_speed = 500 + int((1500 - 500) * ratio)
-            
-            # 如果是 SEARCHING，使用极慢速度实现平滑匀速运动
-            if mode == "SEARCHING":
-                target_speed = 500 
+                    # 停够 1 秒了吗？
+                    if current_time - self.search_stop_start_time > 1.0:
+                        # 切换方向
+                        if abs(self.search_target_pos - cruise_max) < 100:
+                            self.search_target_pos = cruise_min
+                        else:
+                            self.search_target_pos = cruise_max
+                        self.search_stop_start_time = 0 # 重置计时
+                else:
+                    # 还在动
+                    self.search_stop_start_time = 0
             
-            self.driver.set_position(1, int(self.motor1_target), speed=target_speed, move_time=move_time)
-            self.driver.set_position(2, int(self.motor2_target), speed=target_speed, move_time=move_time)
-            self.driver.set_position(3, int(self.motor3_target), speed=target_speed, move_time=move_time)
-            self.driver.set_position(4, int(self.motor4_target), speed=target_speed, move_time=move_time)
+            self.motor1_target = self.search_target_pos
+
+        self.update_motor_targets(0, 0, 0, 0)
         
-        self.last_mode = mode
-        return annotated_frame
+        # 默认追踪速度
+        move_time = 0    
+        target_speed = 1500
+        
+        # [NEW] 追踪初期的平滑加速 (Soft Start)
+        # 防止从巡航(500)突然切到追踪(1500)时的猛冲
+        if state['tracking']:
+            elapsed = current_time - getattr(self, 'tracking_transition_start', 0)
+            ramp_duration = 1.5 # 1.5秒缓冲期
+            if elapsed < ramp_duration:
+                # 从 500 线性加速到 1500
+                ratio = elapsed / ramp_duration
+                target_speed = 500 + int((1500 - 500) * ratio)
+        
+        # 如果是 SEARCHING，使用极慢速度实现平滑匀速运动
+        if mode == "SEARCHING":
+            target_speed = 500 
+        
+        # 写入总线的最新值槽位，总线线程下一个周期把四个关节合并成一个 SYNC WRITE
+        self.bus.set_goals({
+            1: (self.motor1_target, move_time, target_speed),
+            2: (self.motor2_target, move_time, target_speed),
+            3: (self.motor3_target, move_time, target_speed),
+            4: (self.motor4_target, move_time, target_speed),
+        })
 
     def run(self):
         print("开始追踪...")
@@ -783,7 +910,8 @@ class AdvancedTracker:
                 if not ret: break
                 frame = cv2.flip(frame, 1)
                 annotated_frame = self.process_frame(frame)
-                cv2.imshow('Advanced Tracking', annotated_frame)
+                if annotated_frame is not None:
+                    cv2.imshow('Advanced Tracking', annotated_frame)
                 if cv2.waitKey(1) & 0xFF == ord('q'): break
         except KeyboardInterrupt: pass
         finally: self.close()
@@ -794,41 +922,51 @@ class AdvancedTracker:
         
         if not self.driver:
             print("驱动未连接，跳过电机归位")
-            if self.cap: self.cap.release()
-            cv2.destroyAllWindows()
+            if self.cap:
+                self.cap.release()
+                cv2.destroyAllWindows()
             print("✓ 系统已关闭")
             return
 
+        # 先停控制线程，归位流程仍然通过总线线程 (目标槽位 + 遥测)，最后停总线
+        self._stop_control_thread()
+        print(f"控制线程: {self.control_rate:.0f} Hz, 超时周期 {self.control_overruns}")
+        
         print("所有电机 -> 中点 (speed=400)...")
         
-        # 并行发送指令让所有电机回中点
-        for motor_id in [1, 2, 3, 4]:
-            self.driver.set_position(motor_id, 2048, speed=400, move_time=0)
+        # 一个 SYNC WRITE 让所有电机同时回中点
+        self.bus.set_goals({motor_id: (2048, 0, 400) for motor_id in [1, 2, 3, 4]})
         
         # 等待所有电机停止
-        for motor_id in [1, 2, 3, 4]:
-            self._wait_for_stop(motor_id)
+        self._wait_for_stop([1, 2, 3, 4])
         
         print("归位到 Home 点...")
         # Motor 4 -> home
-        self.driver.set_position(4, MOTOR_CALIBRATION[4]['home'], speed=400, move_time=0)
+        self.bus.set_goal(4, MOTOR_CALIBRATION[4]['home'], speed=400)
         self._wait_for_stop(4)
         
         # Motor 3 -> home
-        self.driver.set_position(3, MOTOR_CALIBRATION[3]['home'], speed=400, move_time=0)
+        self.bus.set_goal(3, MOTOR_CALIBRATION[3]['home'], speed=400)
         self._wait_for_stop(3)
         
         # Motor 2 -> home
-        self.driver.set_position(2, MOTOR_CALIBRATION[2]['home'], speed=400, move_time=0)
+        self.bus.set_goal(2, MOTOR_CALIBRATION[2]['home'], speed=400)
         self._wait_for_stop(2)
             
         print("失能电机...")
         for motor_id in [1, 2, 3, 4]:
-            self.driver.set_torque_enable(motor_id, False)
-            
-        self.driver.close()
-        if self.cap: self.cap.release()
-        cv2.destroyAllWindows()
+            self.bus.submit('set_torque_enable', motor_id, False)
+        
+        # stop() 确认总线线程退出后才在本线程执行剩余的命令；线程没退出时不再碰串口
+        stats = self.bus.stats()
+        if self.bus.stop():
+            self.driver.close()
+        print(f"舵机总线: {stats['rate_hz']:.0f} Hz, 合并 {stats['coalesced']} 个过期目标, "
+              f"超时周期 {stats['overruns']}")
+        # 只有内置摄像头模式 (run) 会打开窗口
+        if self.cap:
+            self.cap.release()
+            cv2.destroyAllWindows()
         print("✓ 系统已关闭")
 
 if __name__ == "__main__":
@@ -4,6 +4,8 @@ import random
 import time
 from ultralytics import YOLO
 
+from profiler import profiler
+
 class GlitchArtEffect:
     def __init__(self, canvas_width=1920, canvas_height=1080):
         self.canvas_width = canvas_width
@@ -250,6 +252,7 @@ class GlitchArtEffect:
             
         return styled
 
+    @profiler.timed('glitch.frame')
     def create_glitch_frame(self, frame, results, target_person_idx=None):
         # 计算时间差 (dt) 用于动画
         current_time = time.time()
@@ -317,6 +320,7 @@ class GlitchArtEffect:
                         # 这里只是为了背景，keypoints 在后面提取
                         
         # === 绘制动态背景 ===
+        t_background = time.perf_counter()
         if best_person is not None:
              # 获取人物 BBox
              bbox = None
@@ -348,6 +352,7 @@ class GlitchArtEffect:
         
         # 绘制背景UI (在背景图之上)
         self.draw_background_ui(canvas)
+        profiler.record('glitch.background', time.perf_counter() - t_background)
         
         # 如果没有检测到人，显示"NO SIGNAL"
         if len(results) == 0:
@@ -607,6 +612,7 @@ class GlitchArtEffect:
                                     (255, 255, 255), 1, cv2.LINE_AA)
             
             # 3. 画图 (Layer 2)
+            t_parts = time.perf_counter()
             for part in final_parts:
                 # 去掉ID后缀显示: LEFT_EYE_0 -> LEFT_EYE
                 display_label = part['label'].rsplit('_', 1)[0]
@@ -657,6 +663,7 @@ class GlitchArtEffect:
                             canvas[target_y1:target_y2, target_x1:target_x2] = roi[src_y1:src_y2, src_x1:src_x2]
                     except Exception as e:
                         pass
+            profiler.record('glitch.parts', time.perf_counter() - t_parts)
         
         self.frame_count += 1
         return canvas